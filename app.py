@@ -18,21 +18,26 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-from src.alert_mcp.db import init_db
-from src.alert_mcp_server.app import create_demo
-
 def main():
     try:
+        from src.alert_mcp.db import init_db, init_archive_db
+        from src.alert_mcp import metrics, retention, working_set
+
         # Initialize the database
         logger.info("Initializing database...")
         init_db()
+        init_archive_db()
+        working_set.start()
+        retention.start_worker()
 
-        # Create and launch the demo
+        # Create and launch the demo. Gradio takes seconds to import, so it is
+        # only loaded here, once we know the app is really starting.
         logger.info("Creating Gradio app...")
+        from src.alert_mcp_server.app import create_demo
         demo = create_demo()
 
         logger.info("Launching server...")
-        demo.launch(mcp_server=True)
+        demo.launch(mcp_server=True, app_kwargs={"routes": [metrics.metrics_route()]})
     except Exception as e:
         logger.error(f"Failed to launch app: {e}", exc_info=True)
         sys.exit(1)
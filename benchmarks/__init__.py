@@ -0,0 +1,10 @@
+"""
+Benchmarks for the alert tools. Run from the repository root, e.g.
+
+    python -m benchmarks.run --sizes 10000 1000000
+"""
+import os
+
+# The benchmarks bind their own engines. Keep the app's default database in
+# memory so importing it does not create files in the working directory.
+os.environ.setdefault("DB_FILE_PATH", ":memory:")
@@ -0,0 +1,113 @@
+"""
+Compares the two ways get_open_alerts can be serialized:
+
+    orm   ORM Alert objects -> AlertRead.from_orm -> .json() per row
+    fast  Core column tuples -> dicts -> one json.dumps (get_open_alert_rows)
+
+Both produce the same JSON; the benchmark checks that too.
+
+    python benchmarks/bench_serialization.py                 # 1k, 100k and 1M rows
+    python benchmarks/bench_serialization.py --sizes 1000 50000 --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy.orm import sessionmaker
+
+from src.alert_mcp import mcp_tools
+from src.alert_mcp.cache import result_cache
+from src.alert_mcp.db import init_db, make_engine
+from src.alert_mcp.models import Alert, SEVERITY_RANK
+
+SEVERITIES = list(SEVERITY_RANK)
+
+def populate(engine, rows: int, batch: int = 50000):
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for start in range(0, rows, batch):
+            conn.execute(Alert.__table__.insert(), [
+                {
+                    "provider_id": i % 500,
+                    "credential_id": i,
+                    "severity": SEVERITIES[i % 3],
+                    "severity_rank": SEVERITY_RANK[SEVERITIES[i % 3]],
+                    "window_days": 30,
+                    "message": f"Credential {i} for provider {i % 500} expires in 30 days",
+                    "channel": "ui",
+                    "created_at": now - timedelta(seconds=i),
+                    "last_seen_at": now - timedelta(seconds=i),
+                    "occurrence_count": 1,
+                }
+                for i in range(start, min(start + batch, rows))
+            ])
+
+def orm_path(db) -> str:
+    alerts = mcp_tools.get_open_alerts(db)
+    return "[" + ",".join([a.json() for a in alerts]) + "]"
+
+def fast_path(db) -> str:
+    return mcp_tools.dump_json(mcp_tools.get_open_alert_rows(db))
+
+def timed(fn, session_factory, repeat: int):
+    samples = []
+    output = None
+    for _ in range(repeat):
+        db = session_factory()
+        try:
+            start = time.perf_counter()
+            output = fn(db)
+            samples.append(time.perf_counter() - start)
+        finally:
+            db.close()
+    return samples, output
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    # Measure the serialization itself, not the read cache
+    result_cache.maxsize = 0
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.sizes:
+            engine = make_engine(os.path.join(tmp, f"bench_{rows}.db"))
+            init_db(bind=engine)
+            populate(engine, rows)
+            session_factory = sessionmaker(bind=engine)
+
+            orm_samples, orm_output = timed(orm_path, session_factory, args.repeat)
+            fast_samples, fast_output = timed(fast_path, session_factory, args.repeat)
+            if orm_output != fast_output:
+                print(f"{rows} rows: outputs differ", file=sys.stderr)
+                return 1
+
+            result = {
+                "rows": rows,
+                "orm_seconds": statistics.median(orm_samples),
+                "fast_seconds": statistics.median(fast_samples),
+                "bytes": len(fast_output.encode()),
+            }
+            result["speedup"] = result["orm_seconds"] / result["fast_seconds"]
+            results.append(result)
+            print(
+                f"{rows:>9} rows  orm {result['orm_seconds']:8.3f}s  "
+                f"fast {result['fast_seconds']:8.3f}s  x{result['speedup']:.1f}",
+                file=sys.stderr
+            )
+            engine.dispose()
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
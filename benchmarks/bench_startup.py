@@ -0,0 +1,141 @@
+"""
+Cold-start time of the servers, each measured in a fresh interpreter:
+
+    import_main     import src.alert_mcp.main (the FastAPI/MCP app)
+    first_request   import it, run the lifespan (schema setup) and serve
+                    GET /health, on a new database file
+    warm_restart    the same against a database already at SCHEMA_VERSION
+    import_app      import the root app.py (the Gradio Space entry point)
+
+Each scenario runs --repeat times and the median is compared with its
+budget in milliseconds. The script exits non-zero when a median is over
+budget, or when an import pulls in a module that should only load on
+demand (Gradio, the mcp package), so it can gate CI.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 10 --budget first_request=1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# About twice the medians on a developer laptop; override with --budget
+BUDGETS_MS = {
+    "import_main": 1500,
+    "first_request": 2000,
+    "warm_restart": 2000,
+    "import_app": 500,
+}
+
+# Modules each scenario must not have imported by the time it is done
+LAZY_MODULES = {
+    "import_main": ["gradio", "mcp.server.fastmcp"],
+    "first_request": ["gradio", "mcp.server.fastmcp"],
+    "warm_restart": ["gradio", "mcp.server.fastmcp"],
+    "import_app": ["gradio", "fastapi", "sqlalchemy"],
+}
+
+_SERVE = """
+from fastapi.testclient import TestClient
+from src.alert_mcp.main import app
+with TestClient(app) as client:
+    assert client.get("/health").status_code == 200
+"""
+
+SCRIPTS = {
+    "import_main": "import src.alert_mcp.main",
+    "first_request": _SERVE,
+    "warm_restart": _SERVE,
+    "import_app": "import app",
+}
+
+# Wraps a scenario: times it and reports which of the lazy modules got loaded
+_HARNESS = """
+import json, sys, time
+start = time.perf_counter()
+exec(compile({script!r}, "<{name}>", "exec"))
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+def run_scenario(name: str, db_path: str) -> Dict:
+    code = _HARNESS.format(script=SCRIPTS[name], name=name, lazy=LAZY_MODULES[name])
+    env = dict(os.environ, DB_FILE_PATH=db_path, ALERT_RETENTION_INTERVAL_SECONDS="0")
+    env.pop("ARCHIVE_DB_FILE_PATH", None)
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{name} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure(repeat: int, budgets: Dict[str, float], scenarios: Optional[List[str]] = None) -> List[Dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in scenarios or list(SCRIPTS):
+            samples, loaded = [], set()
+            for i in range(repeat):
+                if name == "warm_restart":
+                    db_path = os.path.join(tmp, "warm.db")
+                    if i == 0:
+                        # Create the schema once; only the restarts are timed
+                        run_scenario("first_request", db_path)
+                else:
+                    db_path = os.path.join(tmp, f"{name}_{i}.db")
+                run = run_scenario(name, db_path)
+                samples.append(run["ms"])
+                loaded.update(run["loaded"])
+            median = statistics.median(samples)
+            results.append({
+                "scenario": name,
+                "median_ms": median,
+                "max_ms": max(samples),
+                "budget_ms": budgets[name],
+                "over_budget": median > budgets[name],
+                "eagerly_loaded": sorted(loaded),
+            })
+    return results
+
+def _parse_budget(value: str):
+    name, _, ms = value.partition("=")
+    if name not in BUDGETS_MS or not ms:
+        raise argparse.ArgumentTypeError(f"expected one of {', '.join(BUDGETS_MS)} as NAME=MS")
+    return name, float(ms)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCRIPTS))
+    parser.add_argument("--budget", type=_parse_budget, action="append", default=[], metavar="NAME=MS")
+    parser.add_argument("--output", help="also write the results here as JSON")
+    args = parser.parse_args(argv)
+
+    budgets = dict(BUDGETS_MS, **dict(args.budget))
+    results = measure(args.repeat, budgets, args.scenarios)
+    failed = False
+    for r in results:
+        problems = []
+        if r["over_budget"]:
+            problems.append("OVER BUDGET")
+        if r["eagerly_loaded"]:
+            problems.append("imported " + ", ".join(r["eagerly_loaded"]))
+        failed = failed or bool(problems)
+        print(
+            f"{r['scenario']:<14} median {r['median_ms']:8.1f}ms  max {r['max_ms']:8.1f}ms  "
+            f"budget {r['budget_ms']:8.1f}ms  {'  '.join(problems)}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Compares two benchmarks.run result files.
+
+    python -m benchmarks.compare before.json after.json
+
+Prints p50, p99 and throughput for every (rows, tool, mode) present in both,
+with the change relative to the first file. Exits non-zero if any p50 got
+slower by more than --threshold (default 20%), so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+def _load(path: str):
+    with open(path) as f:
+        report = json.load(f)
+    return {(r["rows"], r["tool"], r["mode"]): r for r in report["results"]}
+
+def _change(before: float, after: float) -> float:
+    return (after - before) / before if before else 0.0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    before = _load(args.before)
+    after = _load(args.after)
+    regressions = 0
+    print(f"{'rows':>9} {'tool':<20} {'mode':<7} {'p50 ms':>18} {'p99 ms':>18} {'ops/s':>18}")
+    for key in sorted(set(before) & set(after)):
+        b, a = before[key], after[key]
+        p50 = _change(b["latency_ms"]["p50"], a["latency_ms"]["p50"])
+        p99 = _change(b["latency_ms"]["p99"], a["latency_ms"]["p99"])
+        ops = _change(b["throughput_ops_s"], a["throughput_ops_s"])
+        flag = ""
+        if p50 > args.threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        rows, tool, mode = key
+        print(
+            f"{rows:>9} {tool:<20} {mode:<7} "
+            f"{a['latency_ms']['p50']:>10.3f} {p50:>+7.0%} "
+            f"{a['latency_ms']['p99']:>10.3f} {p99:>+7.0%} "
+            f"{a['throughput_ops_s']:>10.1f} {ops:>+7.0%}{flag}"
+        )
+    missing = set(before) ^ set(after)
+    if missing:
+        print(f"{len(missing)} results only in one of the files", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Fills an alerts database with a realistic synthetic history.
+
+The mix roughly follows what CredentialWatch sees in production:
+
+    - severity: 60% info, 30% warning, 10% critical
+    - providers: Zipf-distributed over --providers providers, so a few large
+      providers own most alerts
+    - resolved: --resolved-ratio of the alerts (default 80%) are resolved,
+      mostly within a couple of days of being raised
+    - created_at: spread over the last --days days
+    - a tenth of the open alerts have been re-raised a few times
+    - messages name one of a handful of credential kinds (DEA registration,
+      board certification, ...), for the full-text search
+
+The search index is filled by its triggers as rows go in; the summary
+counters and analytics rollups are rebuilt and planner statistics
+refreshed once the rows are in, so the result looks like a database that
+grew through the tools.
+
+    python -m benchmarks.datagen --rows 1000000 --output alerts_1m.db
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from src.alert_mcp import counters, rollups
+from src.alert_mcp.db import init_db, make_engine
+from src.alert_mcp.models import SEVERITY_RANK, alert_dedup_key
+
+SEVERITY_WEIGHTS = {"info": 0.6, "warning": 0.3, "critical": 0.1}
+CHANNEL_WEIGHTS = {"ui": 0.7, "email": 0.2, "sms": 0.1}
+WINDOWS = [7, 14, 30, 60, 90]
+CREDENTIAL_KINDS = [
+    "DEA registration", "State license", "Board certification",
+    "Malpractice insurance", "CDS registration", "Hospital privileges",
+]
+CREDENTIALS_PER_PROVIDER = 50
+
+COLUMNS = (
+    "provider_id", "credential_id", "severity", "severity_rank", "window_days", "message",
+    "channel", "created_at", "resolved_at", "resolution_note", "dedup_key",
+    "occurrence_count", "last_seen_at",
+)
+INSERT_SQL = (
+    f"INSERT INTO alerts ({', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in COLUMNS)})"
+)
+
+def _stamp(value: datetime) -> str:
+    # The text form SQLAlchemy's DateTime type stores on SQLite
+    return value.isoformat(sep=" ", timespec="microseconds")
+
+def zipf_cum_weights(n: int, s: float = 1.1):
+    return list(itertools.accumulate(1 / (k ** s) for k in range(1, n + 1)))
+
+def generate_rows(
+    rows: int,
+    seed: int = 0,
+    providers: int = 1000,
+    resolved_ratio: float = 0.8,
+    days: int = 365,
+    now: datetime = None
+):
+    """Yields alert rows as tuples in COLUMNS order, oldest first."""
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    provider_ids = range(1, providers + 1)
+    provider_weights = zipf_cum_weights(providers)
+    severities = list(SEVERITY_WEIGHTS)
+    severity_weights = list(itertools.accumulate(SEVERITY_WEIGHTS.values()))
+    channels = list(CHANNEL_WEIGHTS)
+    channel_weights = list(itertools.accumulate(CHANNEL_WEIGHTS.values()))
+    span = days * 86400.0
+    open_keys = set()
+
+    for i in range(rows):
+        provider_id = rng.choices(provider_ids, cum_weights=provider_weights)[0]
+        credential_id = provider_id * 1000 + rng.randrange(CREDENTIALS_PER_PROVIDER)
+        severity = rng.choices(severities, cum_weights=severity_weights)[0]
+        channel = rng.choices(channels, cum_weights=channel_weights)[0]
+        window_days = rng.choice(WINDOWS)
+        kind = CREDENTIAL_KINDS[credential_id % len(CREDENTIAL_KINDS)]
+        message = f"{kind} {credential_id} for provider {provider_id} expires in {window_days} days"
+        # Oldest first, like rows inserted over time, with some jitter
+        created_at = now - timedelta(seconds=span * (rows - i) / rows + rng.random())
+        key = alert_dedup_key(provider_id, credential_id, severity, window_days, message)
+        occurrence_count = 1
+        last_seen_at = created_at
+
+        if rng.random() < resolved_ratio:
+            resolved_at = min(created_at + timedelta(seconds=rng.expovariate(1 / 172800)), now)
+            resolution = "Renewed"
+        else:
+            resolved_at = None
+            resolution = None
+            if key in open_keys:
+                # Only one open alert per dedup key, as the tools guarantee
+                key = None
+            else:
+                open_keys.add(key)
+            if rng.random() < 0.1:
+                occurrence_count = rng.randint(2, 6)
+                last_seen_at = min(created_at + timedelta(hours=occurrence_count * 6), now)
+
+        yield (
+            provider_id, credential_id, severity, SEVERITY_RANK[severity], window_days, message,
+            channel, _stamp(created_at), _stamp(resolved_at) if resolved_at else None, resolution,
+            key, occurrence_count, _stamp(last_seen_at),
+        )
+
+def generate(engine, rows: int, batch_size: int = 50000, **options) -> float:
+    """Creates the schema and inserts `rows` alerts. Returns the elapsed seconds."""
+    start = time.perf_counter()
+    init_db(bind=engine)
+    generated = generate_rows(rows, **options)
+    while True:
+        batch = list(itertools.islice(generated, batch_size))
+        if not batch:
+            break
+        with engine.begin() as conn:
+            conn.exec_driver_sql(INSERT_SQL, batch)
+    with Session(bind=engine) as db:
+        counters.rebuild(db)
+        rollups.rebuild(db)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("ANALYZE")
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return time.perf_counter() - start
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a synthetic alerts database.")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--output", required=True, help="SQLite file to create")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--providers", type=int, default=1000)
+    parser.add_argument("--resolved-ratio", type=float, default=0.8)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.output):
+        print(f"{args.output} already exists", file=sys.stderr)
+        return 1
+    engine = make_engine(args.output)
+    elapsed = generate(
+        engine, args.rows, seed=args.seed, providers=args.providers,
+        resolved_ratio=args.resolved_ratio, days=args.days
+    )
+    engine.dispose()
+    print(f"Generated {args.rows} alerts in {elapsed:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
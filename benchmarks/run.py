@@ -0,0 +1,273 @@
+"""
+Latency and throughput of the four core alert tools at realistic data sizes.
+
+For every dataset size the alerts table is filled by benchmarks.datagen,
+then log_alert, get_open_alerts, mark_alert_resolved and summarize_alerts
+are each called --ops times in three ways:
+
+    direct   mcp_tools.* on a session, as the MCP tools do
+    api      the FastAPI REST routes, through a TestClient
+    gradio   the Gradio tool wrappers in alert_mcp_server.tools
+
+Results (per size, tool and mode: latency percentiles in milliseconds and
+throughput in operations per second) are written as JSON; compare two runs
+with benchmarks.compare.
+
+    python -m benchmarks.run                                  # 10k, 1M and 10M rows
+    python -m benchmarks.run --sizes 10000 --ops 200 --output before.json
+    python -m benchmarks.run --data-dir /tmp/alert-bench      # reuse generated data
+
+The read cache is disabled unless --cache is given, so reads measure the
+database and serialization rather than cache hits.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from src.alert_mcp import db as alert_db
+from src.alert_mcp import mcp_tools
+from src.alert_mcp.cache import result_cache
+from src.alert_mcp.main import app
+from src.alert_mcp_server import tools as gradio_tools
+
+from .datagen import generate
+
+TOOLS = ["log_alert", "get_open_alerts", "mark_alert_resolved", "summarize_alerts"]
+MODES = ["direct", "api", "gradio"]
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+
+def use_database(path: str):
+    """Points the app's writer and reader sessions at the SQLite file at `path`."""
+    engine = alert_db.make_engine(path)
+    read_engine = alert_db.make_engine(path, read_only=True, pool_size=alert_db.READ_POOL_SIZE)
+    alert_db.SessionLocal.configure(bind=engine)
+    alert_db.ReadSessionLocal.configure(bind=read_engine)
+    return engine, read_engine
+
+def open_alert_ids(engine, count: int, seed: int) -> List[int]:
+    with engine.connect() as conn:
+        ids = list(conn.execute(text("SELECT id FROM alerts WHERE resolved_at IS NULL")).scalars())
+    random.Random(seed).shuffle(ids)
+    return ids[:count]
+
+class Workload:
+    """Arguments for each call, drawn up front so every mode does the same work."""
+
+    def __init__(self, engine, ops: int, providers: int, seed: int):
+        rng = random.Random(seed)
+        self.providers = [rng.randint(1, providers) for _ in range(ops)]
+        self.windows = [rng.choice([None, 1, 7, 30]) for _ in range(ops)]
+        self.resolve_ids = open_alert_ids(engine, ops * len(MODES), seed)
+        self.run_id = f"{seed}-{time.time_ns()}"
+
+    def new_alert(self, mode: str, i: int) -> Dict:
+        return {
+            "provider_id": self.providers[i],
+            "credential_id": self.providers[i] * 1000,
+            "severity": ("info", "warning", "critical")[i % 3],
+            "window_days": 30,
+            # Unique, so every call inserts rather than coalescing
+            "message": f"benchmark {self.run_id} {mode} {i}",
+            "channel": "ui",
+        }
+
+    def resolve_id(self, mode: str, i: int) -> int:
+        return self.resolve_ids[MODES.index(mode) * len(self.providers) + i]
+
+def _check_response(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.url}: {response.status_code} {response.text[:200]}")
+
+def _check_wrapper(result):
+    if isinstance(result, dict) and "error" in result:
+        raise RuntimeError(result["error"])
+    if isinstance(result, list) and result and isinstance(result[0], dict) and "error" in result[0]:
+        raise RuntimeError(result[0]["error"])
+
+def operations(mode: str, workload: Workload, client: TestClient) -> Dict[str, Callable[[int], None]]:
+    """tool name -> callable running the i-th call of that tool in `mode`."""
+    if mode == "direct":
+        def session(factory, fn):
+            db = factory()
+            try:
+                return fn(db)
+            finally:
+                db.close()
+
+        return {
+            "log_alert": lambda i: session(
+                alert_db.SessionLocal, lambda db: mcp_tools.log_alert(db, **workload.new_alert(mode, i))
+            ),
+            "get_open_alerts": lambda i: session(
+                alert_db.ReadSessionLocal,
+                lambda db: mcp_tools.dump_json(
+                    mcp_tools.get_open_alert_rows(db, provider_id=workload.providers[i])
+                )
+            ),
+            "mark_alert_resolved": lambda i: session(
+                alert_db.SessionLocal,
+                lambda db: mcp_tools.mark_alert_resolved(db, workload.resolve_id(mode, i), "benchmark")
+            ),
+            "summarize_alerts": lambda i: session(
+                alert_db.ReadSessionLocal,
+                lambda db: mcp_tools.summarize_alerts(db, window_days=workload.windows[i])
+            ),
+        }
+    if mode == "api":
+        def summary_params(i):
+            window = workload.windows[i]
+            return {} if window is None else {"window_days": window}
+
+        return {
+            "log_alert": lambda i: _check_response(
+                client.post("/api/log_alert", json=workload.new_alert(mode, i))
+            ),
+            "get_open_alerts": lambda i: _check_response(
+                client.get("/api/alerts", params={"provider_id": workload.providers[i]})
+            ),
+            "mark_alert_resolved": lambda i: _check_response(
+                client.post(
+                    f"/api/alerts/{workload.resolve_id(mode, i)}/resolve",
+                    params={"resolution_note": "benchmark"}
+                )
+            ),
+            "summarize_alerts": lambda i: _check_response(client.get("/api/summary", params=summary_params(i))),
+        }
+    return {
+        "log_alert": lambda i: _check_wrapper(gradio_tools.log_alert(**workload.new_alert(mode, i))),
+        "get_open_alerts": lambda i: _check_wrapper(
+            gradio_tools.get_open_alerts(provider_id=workload.providers[i])
+        ),
+        "mark_alert_resolved": lambda i: _check_wrapper(
+            gradio_tools.mark_alert_resolved(workload.resolve_id(mode, i), "benchmark")
+        ),
+        "summarize_alerts": lambda i: _check_wrapper(
+            gradio_tools.summarize_alerts(window_days=workload.windows[i])
+        ),
+    }
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    index = min(len(sorted_samples) - 1, max(0, round(q / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+def measure(op: Callable[[int], None], ops: int, warmup: int) -> Dict:
+    for i in range(warmup):
+        op(i)
+    samples = []
+    start = time.perf_counter()
+    for i in range(warmup, warmup + ops):
+        t0 = time.perf_counter()
+        op(i)
+        samples.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - start
+    samples.sort()
+    return {
+        "ops": ops,
+        "latency_ms": {
+            "min": samples[0],
+            "p50": percentile(samples, 50),
+            "p90": percentile(samples, 90),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99),
+            "max": samples[-1],
+            "mean": statistics.fmean(samples),
+        },
+        "throughput_ops_s": ops / elapsed,
+    }
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--ops", type=int, default=200, help="timed calls per tool and mode")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--tools", nargs="+", choices=TOOLS, default=TOOLS)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--providers", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="keep generated databases here and reuse them across runs")
+    parser.add_argument("--cache", action="store_true", help="leave the read cache enabled")
+    parser.add_argument("--output", help="write results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # The test client logs every request at INFO; keep that out of the timings
+    logging.disable(logging.INFO)
+    if not args.cache:
+        result_cache.maxsize = 0
+    client = TestClient(app)
+    datasets = []
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        os.makedirs(data_dir, exist_ok=True)
+        for rows in args.sizes:
+            path = os.path.join(data_dir, f"alerts_{rows}_seed{args.seed}.db")
+            dataset = {"rows": rows, "seed": args.seed, "generate_seconds": None}
+            if not os.path.exists(path):
+                print(f"Generating {rows} alerts...", file=sys.stderr)
+                engine = alert_db.make_engine(path)
+                dataset["generate_seconds"] = generate(engine, rows, seed=args.seed, providers=args.providers)
+                engine.dispose()
+            datasets.append(dataset)
+            engine, read_engine = use_database(path)
+            alert_db.init_db(bind=engine)
+            result_cache.invalidate()
+            workload = Workload(engine, args.ops + args.warmup, args.providers, args.seed)
+
+            for mode in args.modes:
+                ops = operations(mode, workload, client)
+                for tool in args.tools:
+                    result = {"rows": rows, "tool": tool, "mode": mode}
+                    result.update(measure(ops[tool], args.ops, args.warmup))
+                    results.append(result)
+                    latency = result["latency_ms"]
+                    print(
+                        f"{rows:>9} {tool:<20} {mode:<7} p50 {latency['p50']:9.3f}ms  "
+                        f"p99 {latency['p99']:9.3f}ms  {result['throughput_ops_s']:9.1f} ops/s",
+                        file=sys.stderr
+                    )
+            engine.dispose()
+            read_engine.dispose()
+
+    report = json.dumps(
+        {"environment": environment(), "args": vars(args), "datasets": datasets, "results": results},
+        indent=2
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+In-process read-through cache for the read tools in mcp_tools.
+
+Entries are keyed by tool name and filter arguments and evicted LRU once
+the cache is full. Every committed write bumps a generation counter; an
+entry is only served if it was computed in the current generation, so a
+read can never return data older than the last write made by this process.
+
+The cache is per process: writes made by other processes (or directly
+against the database) are not seen until this process writes or the entry
+is evicted. Set ALERT_CACHE_SIZE=0 to disable it. The generation also
+gives the process's change sequence (see change_seq()), which versions
+responses for conditional reads and numbers the change feed's events.
+
+Results are stored pickled, and every hit unpickles a copy of its own, so
+a caller that modifies what it got back cannot change what later callers
+get. Unpickling is several times cheaper than copy.deepcopy of the same
+list of models, and still far cheaper than running the query again.
+"""
+import functools
+import inspect
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+ALERT_CACHE_SIZE = int(os.getenv("ALERT_CACHE_SIZE", "256"))
+
+class ResultCache:
+    def __init__(self, maxsize: int = ALERT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.generation = 0
+        # When the last write was committed (or the process started)
+        self.changed_at = time.time()
+        self._seq_base = time.time_ns() // 1000
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (found, value)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == self.generation:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, generation: int, value):
+        """Stores value computed while `generation` was current."""
+        with self._lock:
+            if generation != self.generation or self.maxsize <= 0:
+                return
+            self._entries[key] = (generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Called after every committed write; all current entries become stale."""
+        with self._lock:
+            self.generation += 1
+            self.changed_at = time.time()
+            self.invalidations += 1
+            self._entries.clear()
+
+    def change_seq(self) -> int:
+        """
+        A sequence number advanced by every committed write: the ETag and
+        since_seq of conditional reads, and the seq of change-feed events
+        (see next_seq()). It is the generation offset by the start time in
+        microseconds, so it keeps increasing across restarts instead of
+        starting over.
+        """
+        return self._seq_base + self.generation
+
+    def next_seq(self) -> int:
+        """
+        Advances change_seq() and returns the new value; the change feed
+        numbers its events with it (feed.change_feed). Like invalidate(),
+        entries computed before become stale.
+        """
+        with self._lock:
+            self.generation += 1
+            self.changed_at = time.time()
+            self._entries.clear()
+            return self._seq_base + self.generation
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def cached(self, fn: Callable) -> Callable:
+        """
+        Decorates a read tool taking `db` as its first argument. The key is
+        the function name plus every other argument except sessions (`db`,
+        `*_db`), lists as tuples; a session argument only contributes
+        whether it was passed. Every caller gets its own copy of the
+        result (see the module docstring). The undecorated function stays
+        available as `wrapper.uncached`.
+        """
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if self.maxsize <= 0:
+                return fn(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (fn.__name__,) + tuple(
+                (name, value is not None) if name.endswith("_db")
+                else (name, tuple(value) if isinstance(value, list) else value)
+                for name, value in bound.arguments.items() if name != "db"
+            )
+            found, payload = self.get(key)
+            if found:
+                return pickle.loads(payload)
+            generation = self.generation
+            value = fn(*args, **kwargs)
+            # Pickled before the caller gets the value, so later changes to it are not stored
+            self.put(key, generation, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            return value
+
+        wrapper.uncached = fn
+        return wrapper
+
+result_cache = ResultCache()
@@ -0,0 +1,131 @@
+"""
+Incrementally maintained alert counters (see models.AlertCounter).
+
+Write paths call record_created / record_resolved before committing, so the
+counters change atomically with the alerts they describe. rebuild() and
+verify() recompute them from the alerts table to repair or detect drift:
+
+    python -m src.alert_mcp.counters verify
+    python -m src.alert_mcp.counters rebuild
+"""
+import argparse
+import sys
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .cache import result_cache
+from .models import Alert, AlertCounter
+
+def bump(db: Session, created: Dict[Tuple[date, str], int], resolved: Dict[Tuple[date, str], int]):
+    """Adds the given per-(day, severity) deltas to the counters in one upsert."""
+    keys = set(created) | set(resolved)
+    if not keys:
+        return
+    stmt = sqlite_insert(AlertCounter).values([
+        {
+            "day": day,
+            "severity": severity,
+            "total": created.get((day, severity), 0),
+            "resolved": resolved.get((day, severity), 0),
+        }
+        for day, severity in sorted(keys)
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AlertCounter.day, AlertCounter.severity],
+        set_={
+            "total": AlertCounter.total + stmt.excluded.total,
+            "resolved": AlertCounter.resolved + stmt.excluded.resolved,
+        }
+    )
+    db.execute(stmt)
+
+def record_created(db: Session, alerts: Iterable[Tuple[datetime, str]]):
+    """alerts: (created_at, severity) of newly inserted alerts."""
+    bump(db, Counter((created_at.date(), severity) for created_at, severity in alerts), {})
+
+def record_resolved(db: Session, alerts: Iterable[Tuple[datetime, str]]):
+    """alerts: (created_at, severity) of alerts that went from open to resolved."""
+    bump(db, {}, Counter((created_at.date(), severity) for created_at, severity in alerts))
+
+def record_archived(db: Session, alerts: Iterable[Tuple[datetime, str]]):
+    """alerts: (created_at, severity) of resolved alerts moved out of the alerts table."""
+    removed = Counter((created_at.date(), severity) for created_at, severity in alerts)
+    negated = {key: -n for key, n in removed.items()}
+    bump(db, negated, negated)
+
+def _expected_counts(db: Session) -> Dict[Tuple[date, str], Tuple[int, int]]:
+    day = func.date(Alert.created_at)
+    rows = db.execute(
+        select(day, Alert.severity, func.count(Alert.id), func.count(Alert.resolved_at))
+        .group_by(day, Alert.severity)
+    )
+    return {
+        (date.fromisoformat(d), severity): (total, resolved)
+        for d, severity, total, resolved in rows
+    }
+
+def rebuild(db: Session) -> int:
+    """Recomputes every counter from the alerts table. Returns the number of buckets."""
+    expected = _expected_counts(db)
+    db.execute(delete(AlertCounter))
+    if expected:
+        db.execute(sqlite_insert(AlertCounter), [
+            {"day": day, "severity": severity, "total": total, "resolved": resolved}
+            for (day, severity), (total, resolved) in expected.items()
+        ])
+    db.commit()
+    result_cache.invalidate()
+    return len(expected)
+
+def verify(db: Session) -> List[str]:
+    """Compares the counters with the alerts table. Returns one line per drifted bucket."""
+    expected = _expected_counts(db)
+    actual = {
+        (c.day, c.severity): (c.total, c.resolved)
+        for c in db.query(AlertCounter)
+    }
+    drift = []
+    for key in sorted(set(expected) | set(actual)):
+        want = expected.get(key, (0, 0))
+        have = actual.get(key, (0, 0))
+        if want != have:
+            day, severity = key
+            drift.append(
+                f"{day} {severity}: counters total={have[0]} resolved={have[1]}, "
+                f"alerts total={want[0]} resolved={want[1]}"
+            )
+    return drift
+
+def main(argv=None) -> int:
+    from .db import init_db, shard_sessions
+
+    parser = argparse.ArgumentParser(description="Verify or rebuild the alert summary counters.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args(argv)
+
+    init_db()
+    # Every shard has its own counters
+    drifted = 0
+    for session_factory in shard_sessions:
+        db = session_factory()
+        try:
+            if args.command == "rebuild":
+                print(f"Rebuilt {rebuild(db)} counter buckets")
+                continue
+            drift = verify(db)
+            for line in drift:
+                print(line)
+            drifted += len(drift)
+        finally:
+            db.close()
+    if args.command == "verify":
+        print("Counters OK" if not drifted else f"{drifted} drifted buckets")
+    return 1 if drifted else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
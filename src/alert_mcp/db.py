@@ -1,23 +1,315 @@
+import asyncio
+import functools
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from .models import Base
+import weakref
+from typing import Optional
+
+import anyio
+from sqlalchemy import MetaData, create_engine, event, inspect, text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.pool import StaticPool
+from .models import (
+    Base, ArchiveBase, Alert, AlertCounter, AlertRollup, ALERT_SEARCH_DDL, ALERT_SEARCH_REBUILD,
+    SEVERITY_RANK, alert_dedup_key
+)
+from . import counters, metrics, rollups, shards
 
 # Default to a local file for development/sandbox, but prompt suggests /data/credentialwatch.db
 DEFAULT_DB_PATH = os.getenv("DB_FILE_PATH", "credentialwatch.db")
 DATABASE_URL = f"sqlite:///{DEFAULT_DB_PATH}"
-
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
+# Resolved alerts past their retention period are moved here (see retention.py)
+ARCHIVE_DB_PATH = os.getenv(
+    "ARCHIVE_DB_FILE_PATH",
+    ":memory:" if DEFAULT_DB_PATH in ("", ":memory:") else os.path.splitext(DEFAULT_DB_PATH)[0] + ".archive.db"
 )
+
+# SQLite tuning. WAL lets readers run concurrently with the (single) writer;
+# synchronous=NORMAL is durable across application crashes in WAL mode and
+# only risks the last transactions on power loss.
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "65536"))
+MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Threads async callers run database work on at once (see run_db): one per
+# read connection plus one for the writer, so a thread seldom has to wait
+# for a connection once it has a slot.
+DB_WORKER_THREADS = int(os.getenv("DB_WORKER_THREADS", str(READ_POOL_SIZE + 1)))
+
+def _is_memory_db(path: str) -> bool:
+    return path in ("", ":memory:")
+
+def make_engine(path: str, read_only: bool = False, pool_size: int = 1, name: Optional[str] = None):
+    """
+    Builds an engine for the SQLite file at `path`.
+
+    The writer engine (read_only=False) has exactly one pooled connection, so
+    every write in the process is serialized through it instead of fighting
+    over the database lock. Reader engines open the file read-only
+    (`mode=ro`) and can have several connections; in WAL mode they never
+    wait for the writer.
+
+    Statements and pool checkouts are recorded in metrics under `name`
+    (default "reader" or "writer").
+    """
+    name = name or ("reader" if read_only else "writer")
+    connect_args = {"check_same_thread": False, "factory": metrics.MetricsConnection}
+    if _is_memory_db(path):
+        # One shared connection, otherwise every checkout sees an empty database.
+        engine = create_engine(
+            "sqlite://",
+            connect_args=connect_args,
+            poolclass=StaticPool,
+        )
+    else:
+        if read_only:
+            url = f"sqlite:///file:{path}?mode=ro&uri=true"
+        else:
+            url = f"sqlite:///{path}"
+        engine = create_engine(
+            url,
+            connect_args=connect_args,
+            poolclass=metrics.timed_pool_class(name),
+            pool_size=pool_size,
+            max_overflow=0,
+        )
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            # journal_mode is persistent in the file, so the writer sets it
+            # once and read-only connections pick it up.
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        # Negative cache_size is in KiB rather than pages.
+        cursor.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    metrics.instrument_engine(engine, name)
+    return engine
+
+def shard_path(index: int) -> str:
+    """The SQLite file of shard `index`; DB_FILE_PATH itself unless sharded (see shards.py)."""
+    if shards.DB_SHARDS == 1 or _is_memory_db(DEFAULT_DB_PATH):
+        return DEFAULT_DB_PATH
+    root, ext = os.path.splitext(DEFAULT_DB_PATH)
+    return f"{root}.shard{index}{ext}"
+
+shard_engines = []
+shard_read_engines = []
+for _index in range(shards.DB_SHARDS):
+    _suffix = f".shard{_index}" if shards.DB_SHARDS > 1 else ""
+    _path = shard_path(_index)
+    _writer = make_engine(_path, name="writer" + _suffix)
+    if _is_memory_db(_path):
+        # A private in-memory database cannot be opened by a second connection.
+        _reader = _writer
+    else:
+        _reader = make_engine(_path, read_only=True, pool_size=READ_POOL_SIZE, name="reader" + _suffix)
+    metrics.register_pool("writer" + _suffix, _writer)
+    metrics.register_pool("reader" + _suffix, _reader)
+    shard_engines.append(_writer)
+    shard_read_engines.append(_reader)
+
+# The first shard's; the only ones unless sharded
+engine = shard_engines[0]
+read_engine = shard_read_engines[0]
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+shard_sessions = [SessionLocal] + [
+    sessionmaker(autocommit=False, autoflush=False, bind=e) for e in shard_engines[1:]
+]
+shard_read_sessions = [ReadSessionLocal] + [
+    sessionmaker(autocommit=False, autoflush=False, bind=e) for e in shard_read_engines[1:]
+]
+
+archive_engine = make_engine(ARCHIVE_DB_PATH, name="archive")
+ArchiveSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=archive_engine)
+
+# Bumped whenever a database created by an older release needs a migration.
+# Stored in the file itself via PRAGMA user_version.
+SCHEMA_VERSION = 7
+
+def _add_severity_rank(conn):
+    conn.exec_driver_sql(
+        "ALTER TABLE alerts ADD COLUMN severity_rank INTEGER NOT NULL DEFAULT 0"
+    )
+    cases = " ".join(f"WHEN '{name}' THEN {rank}" for name, rank in SEVERITY_RANK.items())
+    conn.exec_driver_sql(f"UPDATE alerts SET severity_rank = CASE severity {cases} ELSE 0 END")
+
+def _add_alert_counters(conn):
+    # Superseded by ix_alerts_created_window, created below by init_db
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_alerts_created_at_severity")
+    AlertCounter.__table__.create(bind=conn, checkfirst=True)
+    with Session(bind=conn) as session:
+        counters.rebuild(session)
+
+def _add_dedup_columns(conn):
+    conn.exec_driver_sql("ALTER TABLE alerts ADD COLUMN dedup_key VARCHAR")
+    conn.exec_driver_sql("ALTER TABLE alerts ADD COLUMN occurrence_count INTEGER NOT NULL DEFAULT 1")
+    conn.exec_driver_sql("ALTER TABLE alerts ADD COLUMN last_seen_at DATETIME")
+    conn.exec_driver_sql("UPDATE alerts SET last_seen_at = created_at")
+    # Existing duplicates among open alerts keep a NULL key (the unique index
+    # ignores NULLs); only the newest of them takes part in deduplication.
+    open_keys = set()
+    updates = []
+    rows = conn.exec_driver_sql(
+        "SELECT id, provider_id, credential_id, severity, window_days, message, resolved_at "
+        "FROM alerts ORDER BY id DESC"
+    )
+    for alert_id, provider_id, credential_id, severity, window_days, message, resolved_at in rows:
+        key = alert_dedup_key(provider_id, credential_id, severity, window_days, message)
+        if resolved_at is None:
+            if key in open_keys:
+                continue
+            open_keys.add(key)
+        updates.append({"id": alert_id, "key": key})
+    if updates:
+        conn.execute(text("UPDATE alerts SET dedup_key = :key WHERE id = :id"), updates)
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+def _add_alert_rollups(conn):
+    AlertRollup.__table__.create(bind=conn, checkfirst=True)
+    with Session(bind=conn) as session:
+        rollups.rebuild(session)
+
+def _add_alert_search(conn):
+    for statement in ALERT_SEARCH_DDL:
+        conn.exec_driver_sql(statement)
+    conn.exec_driver_sql(ALERT_SEARCH_REBUILD)
+
+def _make_alert_ids_autoincrement(conn):
+    # Without AUTOINCREMENT, SQLite hands out the highest id again once that
+    # alert was archived, and the archive already holds that id. SQLite
+    # cannot alter that on an existing table, so the table is rebuilt. The
+    # rows keep their ids, so the search index stays valid. init_db
+    # recreates the indexes, which are dropped together with the old table.
+    autoincrement = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alerts' AND sql LIKE '%AUTOINCREMENT%'"
+    ).scalar()
+    if autoincrement:
+        return
+    rebuilt = Alert.__table__.to_metadata(MetaData(), name="alerts_rebuild")
+    conn.execute(CreateTable(rebuilt))
+    columns = ", ".join(column.name for column in rebuilt.columns)
+    conn.exec_driver_sql(f"INSERT INTO alerts_rebuild ({columns}) SELECT {columns} FROM alerts")
+    conn.exec_driver_sql("DROP TABLE alerts")
+    # Renaming also renames the table's sqlite_sequence row, which the copy
+    # left at the highest id
+    conn.exec_driver_sql("ALTER TABLE alerts_rebuild RENAME TO alerts")
+    for statement in ALERT_SEARCH_DDL:
+        conn.exec_driver_sql(statement)
+
+# (version, migration) pairs, applied in order to existing databases whose
+# user_version is older than the target version.
+MIGRATIONS = [
+    (1, _add_severity_rank),
+    (2, _add_alert_counters),
+    (3, _add_dedup_columns),
+    (4, _add_alert_rollups),
+    (5, _add_alert_search),
+    # 6 only added ix_alerts_open_created, which init_db creates
+    (7, _make_alert_ids_autoincrement),
+]
+
+def init_db(bind=None, shard: int = 0):
+    """
+    Creates the schema, or migrates an existing database to SCHEMA_VERSION.
+    create_all() only creates missing tables, so indexes added to existing
+    tables are created explicitly. A database already at SCHEMA_VERSION is
+    left alone, so this costs one PRAGMA on every start but the first.
+    Without a bind, sets up every shard.
+    """
+    if bind is None:
+        for index, shard_engine in enumerate(shard_engines):
+            init_db(shard_engine, shard=index)
+        return
+    with bind.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION:
+            return
+    with bind.begin() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        if inspect(conn).has_table("alerts"):
+            for target, migrate in MIGRATIONS:
+                if version < target:
+                    migrate(conn)
+        Base.metadata.create_all(bind=conn)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+        if shard:
+            # AUTOINCREMENT ids continue from sqlite_sequence, so this shard's
+            # new alert ids start in its own range, and after any it holds
+            floor = shard * shards.ALERT_ID_STRIDE
+            conn.exec_driver_sql(
+                "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'alerts'", (floor,)
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO sqlite_sequence (name, seq) "
+                "SELECT 'alerts', max(?, (SELECT coalesce(max(id), 0) FROM alerts)) "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'alerts')",
+                (floor,)
+            )
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def init_archive_db(bind=None):
+    ArchiveBase.metadata.create_all(bind=bind if bind is not None else archive_engine)
 
 def get_db():
-    db = SessionLocal()
+    """
+    Session on the single writer connection (with DB_SHARDS > 1, a ShardSet
+    over the shards' writers). Use for anything that writes.
+    """
+    db = SessionLocal() if shards.DB_SHARDS == 1 else shards.ShardSet(shard_sessions)
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db():
+    """Session on the read-only connection pool (a ShardSet if sharded). Use for pure queries."""
+    db = ReadSessionLocal() if shards.DB_SHARDS == 1 else shards.ShardSet(shard_read_sessions)
     try:
         yield db
     finally:
         db.close()
+
+def get_archive_db():
+    """Session on the archive database."""
+    db = ArchiveSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# One limiter per event loop; anyio's limiters must not be shared between loops
+_limiters: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def _db_limiter() -> anyio.CapacityLimiter:
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = _limiters[loop] = anyio.CapacityLimiter(DB_WORKER_THREADS)
+    return limiter
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Awaits fn(*args, **kwargs), blocking database work, on a worker thread,
+    so the event loop keeps serving other requests and SSE streams in the
+    meantime. At most DB_WORKER_THREADS calls run at once; further callers
+    wait for a slot without holding a connection.
+    """
+    return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs), limiter=_db_limiter())
+
+def run_in_db_thread(fn):
+    """Decorator: makes the blocking fn a coroutine function running it via run_db."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_db(fn, *args, **kwargs)
+    return wrapper
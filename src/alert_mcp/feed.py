@@ -0,0 +1,209 @@
+"""
+In-process change feed for alerts.
+
+The write paths in mcp_tools publish one event per changed alert after their
+transaction commits. Every event gets a monotonically increasing sequence
+number and is kept in a bounded history, so consumers can resume from the
+last sequence number they saw instead of polling get_open_alerts:
+
+    - GET /api/alerts/events streams events as Server-Sent Events
+    - the MCP server exposes them as subscribable resources (main.py)
+
+The app's feed numbers its events from the read cache's change sequence
+(cache.ResultCache.change_seq), the one the ETags and the read tools'
+since_seq use, so a sequence number from any of them can be passed to any
+other. Writes that publish no event (archiving, say) advance it too, so
+event numbers have gaps.
+
+The feed lives in one process: with several workers each one only sees its
+own writes. A consumer asking for a sequence number the feed no longer has
+(or never had, e.g. one from before a restart) gets a "reset" event and
+should resynchronize with get_open_alerts.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from .cache import result_cache
+
+ALERT_FEED_HISTORY = int(os.getenv("ALERT_FEED_HISTORY", "10000"))
+# Events buffered per live subscriber before it is considered too slow and cut off
+ALERT_FEED_SUBSCRIBER_QUEUE = int(os.getenv("ALERT_FEED_SUBSCRIBER_QUEUE", "1000"))
+SSE_KEEPALIVE_SECONDS = 15.0
+
+@dataclass
+class ChangeEvent:
+    seq: int
+    type: str  # "created", "coalesced" or "resolved"
+    alert: Dict[str, Any]
+    at: float = field(default_factory=time.time)
+
+    def matches(self, provider_id: Optional[int] = None, severity: Optional[str] = None) -> bool:
+        if provider_id is not None and self.alert.get("provider_id") != provider_id:
+            return False
+        if severity is not None and self.alert.get("severity") != severity:
+            return False
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"seq": self.seq, "type": self.type, "alert": self.alert}
+
+class _Sequence:
+    """A feed's own numbering from 0, unless it is given another sequence."""
+
+    def __init__(self):
+        self._seq = 0
+
+    def change_seq(self) -> int:
+        return self._seq
+
+    def next_seq(self) -> int:
+        self._seq += 1
+        return self._seq
+
+class ChangeFeed:
+    def __init__(self, history: int = ALERT_FEED_HISTORY, sequence=None):
+        """
+        `sequence` numbers the events: an object with change_seq() (the
+        current number) and next_seq() (advances it and returns the new
+        one), like cache.ResultCache. It is only advanced under the feed's
+        lock, but may also be advanced elsewhere.
+        """
+        self._sequence = sequence if sequence is not None else _Sequence()
+        # Every event after first_seq is still in the history
+        self.first_seq = self._sequence.change_seq()
+        self._history: "deque[ChangeEvent]" = deque(maxlen=history)
+        self._subscribers: List[Callable[[ChangeEvent], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def last_seq(self) -> int:
+        return self._sequence.change_seq()
+
+    def publish(self, event_type: str, alert: Dict[str, Any]) -> ChangeEvent:
+        """Records an event and hands it to every subscriber (in the caller's thread)."""
+        with self._lock:
+            event = ChangeEvent(seq=self._sequence.next_seq(), type=event_type, alert=alert)
+            if len(self._history) == self._history.maxlen:
+                self.first_seq = self._history[0].seq
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(event)
+        return event
+
+    def subscribe(self, callback: Callable[[ChangeEvent], None]) -> Callable[[], None]:
+        """Registers a callback for new events. Returns a function that unsubscribes it."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def since(
+        self,
+        seq: int,
+        provider_id: Optional[int] = None,
+        severity: Optional[str] = None
+    ) -> Tuple[List[ChangeEvent], bool]:
+        """
+        Events after `seq` matching the filters, and whether that list is
+        complete. It is not when `seq` is older than the retained history or
+        newer than anything this process has published.
+        """
+        with self._lock:
+            history = list(self._history)
+            first_seq, last_seq = self.first_seq, self.last_seq
+        complete = first_seq <= seq <= last_seq
+        events = [e for e in history if e.seq > seq and e.matches(provider_id, severity)]
+        return events, complete
+
+    async def stream(
+        self,
+        since: Optional[int] = None,
+        provider_id: Optional[int] = None,
+        severity: Optional[str] = None
+    ) -> AsyncIterator[Optional[ChangeEvent]]:
+        """
+        Replays events after `since` (if given), then yields new ones as they
+        are published. Yields None when the history cannot cover `since` or
+        the consumer fell too far behind; the stream ends after that.
+        """
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[Optional[ChangeEvent]]" = asyncio.Queue()
+
+        def deliver(event: ChangeEvent):
+            if queue.qsize() >= ALERT_FEED_SUBSCRIBER_QUEUE:
+                event = None
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        # Subscribe before replaying so nothing published in between is lost
+        unsubscribe = self.subscribe(deliver)
+        try:
+            last = self.last_seq
+            if since is not None:
+                events, complete = self.since(since, provider_id, severity)
+                if not complete:
+                    yield None
+                    return
+                for event in events:
+                    yield event
+                last = max([since] + [e.seq for e in events])
+            while True:
+                event = await queue.get()
+                if event is None:
+                    yield None
+                    return
+                if event.seq > last and event.matches(provider_id, severity):
+                    last = event.seq
+                    yield event
+        finally:
+            unsubscribe()
+
+def format_sse(event: Optional[ChangeEvent], last_seq: int) -> str:
+    if event is None:
+        return f"event: reset\ndata: {json.dumps({'last_seq': last_seq})}\n\n"
+    return f"id: {event.seq}\nevent: {event.type}\ndata: {json.dumps(event.to_dict())}\n\n"
+
+async def sse_stream(
+    feed: ChangeFeed,
+    since: Optional[int] = None,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    keepalive: float = SSE_KEEPALIVE_SECONDS
+) -> AsyncIterator[str]:
+    """The feed as an SSE body, with a comment line every `keepalive` seconds."""
+    events = feed.stream(since=since, provider_id=provider_id, severity=severity)
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(events.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=keepalive)
+            if not done:
+                yield ": keepalive\n\n"
+                continue
+            try:
+                event = pending.result()
+            except StopAsyncIteration:
+                return
+            pending = None
+            yield format_sse(event, feed.last_seq)
+            if event is None:
+                return
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await events.aclose()
+
+change_feed = ChangeFeed(sequence=result_cache)
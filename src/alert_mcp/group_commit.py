@@ -0,0 +1,215 @@
+"""
+Group commit for log_alert.
+
+With ALERT_GROUP_COMMIT=1, log_alert calls from the MCP tools, the REST API
+and the Gradio wrappers hand their row to a background writer thread instead
+of committing it themselves. The writer collects pending rows until it has
+ALERT_GROUP_COMMIT_MAX_ROWS of them or ALERT_GROUP_COMMIT_WINDOW_MS have
+passed since the first one, upserts them with one executemany and commits
+once, so a burst of alerts costs one transaction instead of one each.
+
+A caller waits until the batch holding its row has committed and gets the
+same AlertRead back as from mcp_tools.log_alert. Callers passing
+fire_and_forget=True return as soon as the row is queued; a row still
+queued when the process dies is lost, so such emitters must re-send alerts
+they still see (deduplication coalesces the repeats).
+
+stop() (run on FastAPI shutdown and at interpreter exit) commits everything
+still queued before returning.
+
+When sharded, a batch is committed per shard, so a shard that fails to
+commit does not make the rows already committed on another shard go in
+(and coalesce) a second time when the failed rows are retried.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import metrics, mcp_tools, shards
+from .schemas import AlertRead
+
+logger = logging.getLogger(__name__)
+
+ALERT_GROUP_COMMIT = os.getenv("ALERT_GROUP_COMMIT", "0").lower() in ("1", "true", "yes")
+ALERT_GROUP_COMMIT_MAX_ROWS = int(os.getenv("ALERT_GROUP_COMMIT_MAX_ROWS", "200"))
+ALERT_GROUP_COMMIT_WINDOW_MS = float(os.getenv("ALERT_GROUP_COMMIT_WINDOW_MS", "5"))
+
+BATCH_ROWS = metrics.registry.register(metrics.Histogram(
+    "alert_group_commit_batch_rows", "Rows committed per group-commit batch.",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+))
+
+_STOP = object()
+
+class GroupCommitWriter:
+    def __init__(
+        self,
+        session_factory=None,
+        max_rows: int = ALERT_GROUP_COMMIT_MAX_ROWS,
+        window_ms: float = ALERT_GROUP_COMMIT_WINDOW_MS
+    ):
+        # Defaults to db.get_db(), looked up per batch
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.window = window_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def enqueue(
+        self,
+        provider_id: int,
+        severity: str,
+        window_days: int,
+        message: str,
+        credential_id: Optional[int] = None,
+        channel: str = "ui",
+        wait: bool = True
+    ) -> Optional[Future]:
+        """
+        Validates the alert like log_alert (raising ValueError) and queues it.
+        With wait=True returns a Future resolving to the committed AlertRead
+        (await it with asyncio.wrap_future); otherwise returns None.
+        """
+        alert = mcp_tools.validate_alert(
+            provider_id=provider_id,
+            severity=severity,
+            window_days=window_days,
+            message=message,
+            credential_id=credential_id,
+            channel=channel
+        )
+        row = dict(alert.dict(), created_at=datetime.utcnow())
+        future = Future() if wait else None
+        self._ensure_started()
+        self._queue.put((row, future))
+        return future
+
+    def submit(self, wait: bool = True, timeout: Optional[float] = None, **alert) -> Optional[AlertRead]:
+        """enqueue(), then block until the alert is committed if wait is set."""
+        future = self.enqueue(wait=wait, **alert)
+        return future.result(timeout) if future is not None else None
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="alert-group-commit", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Commits everything queued so far and stops the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+        # Rows queued after the stop marker, or while no thread was running
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.max_rows):
+            self._flush(leftover[start:start + self.max_rows])
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            stopping = False
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stopping:
+                return
+
+    def _flush(self, batch: List[Tuple[Dict[str, Any], Optional[Future]]]):
+        parts = self._by_shard(batch)
+        if len(parts) > 1:
+            for part in parts:
+                self._flush(part)
+            return
+        try:
+            results = self._commit([row for row, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                row, future = batch[0]
+                if future is not None:
+                    future.set_exception(e)
+                else:
+                    logger.error(f"Dropped queued alert {row}: {e}", exc_info=True)
+                return
+            # Retry one by one so a single bad row does not fail its batch
+            for item in batch:
+                self._flush([item])
+            return
+        BATCH_ROWS.observe(len(batch))
+        for (row, future), result in zip(batch, results):
+            if future is not None:
+                future.set_result(result)
+
+    def _session(self):
+        if self.session_factory is not None:
+            return self.session_factory()
+        # A ShardSet if sharded
+        from .db import get_db
+        return next(get_db())
+
+    def _by_shard(self, batch: List[Tuple[Dict[str, Any], Optional[Future]]]) -> List[list]:
+        """The batch split by the shard its rows go to; [batch] unless sharded."""
+        if self.session_factory is None:
+            shard_count = shards.DB_SHARDS
+        else:
+            db = self.session_factory()
+            shard_count = len(db) if isinstance(db, shards.ShardSet) else 1
+            db.close()
+        if shard_count == 1:
+            return [batch]
+        parts: Dict[int, list] = {}
+        for item in batch:
+            parts.setdefault(shards.shard_for_provider(item[0]["provider_id"], shard_count), []).append(item)
+        return list(parts.values())
+
+    def _commit(self, rows: List[Dict[str, Any]]) -> List[AlertRead]:
+        # The rows are all on one shard (see _flush), so this is one commit
+        db = self._session()
+        try:
+            by_key, _ = mcp_tools.upsert_alert_rows(db, rows)
+            db.commit()
+            return [AlertRead.from_orm(by_key[row["dedup_key"]]) for row in rows]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+writer = GroupCommitWriter()
+atexit.register(writer.stop)
+
+def log_alert(fire_and_forget: bool = False, **alert) -> Optional[AlertRead]:
+    """Queues the alert on the shared writer; see GroupCommitWriter.submit."""
+    return writer.submit(wait=not fire_and_forget, **alert)
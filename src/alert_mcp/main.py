@@ -1,40 +1,151 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Optional, List, Any
+from starlette.routing import Route
+from typing import Optional, List, Dict, Any, Tuple
+import argparse
+import asyncio
+import json
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from contextlib import asynccontextmanager
+import threading
 import uvicorn
-import mcp.types as types
-from mcp.server.fastmcp import FastMCP
 
-from .db import get_db, init_db
-from .schemas import AlertCreate, AlertRead, AlertSummary
-from . import mcp_tools
+from .db import (
+    DEFAULT_DB_PATH, _is_memory_db, get_db, get_read_db, get_archive_db, init_db, init_archive_db, run_db, run_in_db_thread
+)
+from .schemas import (
+    AlertCreate, AlertRead, AlertPage, AlertSearchPage, AlertSummary, AlertBulkResult, AlertBulkResolve,
+    AlertAnalytics, AlertAnalyticsQuery, BatchResult
+)
+from . import group_commit, metrics, mcp_tools, retention, working_set
+from .cache import result_cache
+from .feed import change_feed, sse_stream
+from .working_set import open_alert_index
 
-# Initialize DB
-init_db()
+# --- MCP Server ---
+# The FastMCP server (and the mcp package behind it) is only built by
+# get_mcp(), on the first request to /sse, so importing this module stays
+# cheap. The decorators below just record what to register on it.
 
-# Create MCP Server
-mcp = FastMCP("alert_mcp")
+_mcp_tools: List[Any] = []
+_mcp_resources: List[Tuple[str, Dict[str, Any], Any]] = []
+_mcp = None
+_mcp_lock = threading.Lock()
+
+def mcp_tool(fn):
+    _mcp_tools.append(fn)
+    return fn
+
+def mcp_resource(uri: str, **kwargs):
+    def decorator(fn):
+        _mcp_resources.append((uri, kwargs, fn))
+        return fn
+    return decorator
+
+# --- Conditional reads ---
+# The read routes send the change sequence (result_cache.change_seq(),
+# advanced by every committed write) as their ETag, and answer a matching
+# If-None-Match with 304 before touching the database; the MCP read tools
+# take it as since_seq. It is the sequence the change feed numbers its
+# events with, so an event's seq or a feed resource's last_seq is a valid
+# since_seq, and the other way round. It only counts this process's
+# writes, so serve() turns this off with several workers.
+ALERT_CONDITIONAL_GET = os.getenv("ALERT_CONDITIONAL_GET", "1").lower() in ("1", "true", "yes")
+
+def _validators() -> Dict[str, str]:
+    """ETag and Last-Modified of the data as of now; taken before reading it."""
+    if not ALERT_CONDITIONAL_GET:
+        return {}
+    validators = {"ETag": f'"{result_cache.change_seq()}"', "Cache-Control": "no-cache"}
+    if _last_write_second_over():
+        validators["Last-Modified"] = formatdate(int(result_cache.changed_at), usegmt=True)
+    return validators
+
+def _last_write_second_over() -> bool:
+    # Last-Modified has whole seconds, so it is only sent (and honoured) once
+    # the second of the last write is over: a later write then always falls
+    # in a later second, and is newer than any Last-Modified handed out.
+    return int(result_cache.changed_at) < int(time.time())
+
+def _not_modified(request: Request, validators: Dict[str, str]) -> Optional[Response]:
+    """A 304 response if the client's copy is still current, else None."""
+    if not validators:
+        return None
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        fresh = "*" in tags or validators["ETag"] in tags
+    else:
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return None
+        fresh = _last_write_second_over() and int(result_cache.changed_at) <= since
+    return Response(status_code=304, headers=validators) if fresh else None
+
+def _since_seq(since_seq: Optional[int], seq: int, result: str) -> str:
+    """
+    The MCP read tools' answer when called with since_seq: {"seq", "changed"}
+    plus the result (a JSON string) when it changed since since_seq.
+    Errors are returned as they are.
+    """
+    if since_seq is None or result.startswith("Error:"):
+        return result
+    return f'{{"seq":{seq},"changed":true,"result":{result}}}'
+
+def _unchanged_since(since_seq: Optional[int], seq: int) -> Optional[str]:
+    if ALERT_CONDITIONAL_GET and since_seq == seq:
+        return json.dumps({"seq": seq, "changed": False})
+    return None
 
 # --- MCP Tool Definitions ---
+# FastMCP calls plain functions on the event loop, so the tools doing
+# database work are coroutines running it on the DB worker threads
+# (db.run_db); a slow query then no longer holds up every other session.
 
-@mcp.tool()
-def log_alert(
+@mcp_tool
+@metrics.instrumented("mcp")
+async def log_alert(
     provider_id: int,
     severity: str,
     window_days: int,
     message: str,
     credential_id: Optional[int] = None,
-    channel: str = "ui"
+    channel: str = "ui",
+    fire_and_forget: bool = False
 ) -> str:
     """
     Log a new alert for CredentialWatch.
     Severity must be 'info', 'warning', or 'critical'.
+    fire_and_forget returns before the alert is committed (only when group
+    commit is enabled); re-send alerts that still apply, duplicates are coalesced.
     """
+    if group_commit.ALERT_GROUP_COMMIT:
+        try:
+            future = group_commit.writer.enqueue(
+                provider_id=provider_id,
+                credential_id=credential_id,
+                severity=severity,
+                window_days=window_days,
+                message=message,
+                channel=channel,
+                wait=not fire_and_forget
+            )
+        except ValueError as e:
+            return f"Error: {str(e)}"
+        if future is None:
+            return json.dumps({"queued": True})
+        return (await asyncio.wrap_future(future)).json()
+
     # Note: For MCP tools we manage the session manually within the tool
     # as they are not standard FastAPI routes dependent on the app dependency injection
     db = next(get_db())
     try:
-        alert = mcp_tools.log_alert(
+        alert = await run_db(
+            mcp_tools.log_alert,
             db=db,
             provider_id=provider_id,
             credential_id=credential_id,
@@ -49,24 +160,139 @@ def log_alert(
     finally:
         db.close()
 
-@mcp.tool()
+@mcp_tool
+@metrics.instrumented("mcp")
+@run_in_db_thread
+def log_alerts_bulk(alerts: List[Dict[str, Any]]) -> str:
+    """
+    Log many alerts in one call and one database transaction.
+    Each item takes the same fields as log_alert.
+    Returns the created ids and per-item validation errors (by index).
+    """
+    db = next(get_db())
+    try:
+        result = mcp_tools.log_alerts_bulk(db=db, alerts=alerts)
+        return result.json()
+    finally:
+        db.close()
+
+@mcp_tool
+@metrics.instrumented("mcp")
+@run_in_db_thread
 def get_open_alerts(
     provider_id: Optional[int] = None,
-    severity: Optional[str] = None
+    severity: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    max_message_chars: Optional[int] = None,
+    since_seq: Optional[int] = None
 ) -> str:
     """
     List open (unresolved) alerts.
     Optional filters: provider_id, severity.
+    fields returns only those alert fields (id, severity and created_at are
+    always included), e.g. ["provider_id"] for a compact overview;
+    max_message_chars shortens long messages and resolution notes.
     Returns JSON list of alerts.
+    With since_seq (the "seq" of an earlier answer) the result comes
+    wrapped as {"seq", "changed": true, "result"}, or is left out
+    ({"seq", "changed": false}) when no alert changed since.
     """
-    db = next(get_db())
+    seq = result_cache.change_seq()
+    unchanged = _unchanged_since(since_seq, seq)
+    if unchanged is not None:
+        return unchanged
+    db = next(get_read_db())
     try:
-        alerts = mcp_tools.get_open_alerts(db=db, provider_id=provider_id, severity=severity)
-        return "[" + ",".join([a.json() for a in alerts]) + "]"
+        alerts = mcp_tools.get_open_alert_rows(
+            db=db, provider_id=provider_id, severity=severity,
+            fields=fields, max_message_chars=max_message_chars
+        )
+        return _since_seq(since_seq, seq, mcp_tools.dump_json(alerts))
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    finally:
+        db.close()
+
+@mcp_tool
+@metrics.instrumented("mcp")
+@run_in_db_thread
+def get_open_alerts_page(
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    max_message_chars: Optional[int] = None,
+    since_seq: Optional[int] = None
+) -> str:
+    """
+    List open alerts one page at a time (same order as get_open_alerts).
+    Pass the returned next_cursor back as cursor to fetch the following page;
+    next_cursor is null on the last page. fields and max_message_chars as
+    for get_open_alerts.
+    With since_seq (the "seq" of an earlier answer) the result comes
+    wrapped as {"seq", "changed": true, "result"}, or is left out
+    ({"seq", "changed": false}) when no alert changed since.
+    """
+    seq = result_cache.change_seq()
+    unchanged = _unchanged_since(since_seq, seq)
+    if unchanged is not None:
+        return unchanged
+    db = next(get_read_db())
+    try:
+        page = mcp_tools.get_open_alert_rows_page(
+            db=db, provider_id=provider_id, severity=severity, limit=limit, cursor=cursor,
+            fields=fields, max_message_chars=max_message_chars
+        )
+        return _since_seq(since_seq, seq, mcp_tools.dump_json(page))
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    finally:
+        db.close()
+
+@mcp_tool
+@metrics.instrumented("mcp")
+@run_in_db_thread
+def search_alerts(
+    query: str,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    order: str = "relevance",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    since_seq: Optional[int] = None
+) -> str:
+    """
+    Full-text search over alert messages and resolution notes, e.g. "DEA" or
+    "board certification" (every word must match; "quote" a phrase, end a
+    word with * for a prefix). Optional filters: provider_id, severity,
+    status ("open" or "resolved"). order is "relevance" (best match first)
+    or "recent" (newest first, fastest for broad queries). Returns a JSON
+    page; pass its next_cursor back as cursor for the next one.
+    With since_seq (the "seq" of an earlier answer) the result comes
+    wrapped as {"seq", "changed": true, "result"}, or is left out
+    ({"seq", "changed": false}) when no alert changed since.
+    """
+    seq = result_cache.change_seq()
+    unchanged = _unchanged_since(since_seq, seq)
+    if unchanged is not None:
+        return unchanged
+    db = next(get_read_db())
+    try:
+        page = mcp_tools.search_alerts(
+            db=db, query=query, provider_id=provider_id, severity=severity,
+            status=status, order=order, limit=limit, cursor=cursor
+        )
+        return _since_seq(since_seq, seq, page.json())
+    except ValueError as e:
+        return f"Error: {str(e)}"
     finally:
         db.close()
 
-@mcp.tool()
+@mcp_tool
+@metrics.instrumented("mcp")
+@run_in_db_thread
 def mark_alert_resolved(
     alert_id: int,
     resolution_note: Optional[str] = None
@@ -84,37 +310,390 @@ def mark_alert_resolved(
     finally:
         db.close()
 
-@mcp.tool()
-def summarize_alerts(window_days: Optional[int] = None) -> str:
+@mcp_tool
+@metrics.instrumented("mcp")
+@run_in_db_thread
+def mark_alerts_resolved(
+    alert_ids: Optional[List[int]] = None,
+    provider_id: Optional[int] = None,
+    credential_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    created_before: Optional[str] = None,
+    resolution_note: Optional[str] = None
+) -> str:
     """
-    Get a summary of alerts (count by severity).
-    Optionally filter by last N days.
+    Resolve many open alerts at once: by a list of ids and/or filters
+    (provider_id, credential_id, severity, created_before as ISO datetime).
+    All given criteria must match. Returns the resolved alerts as JSON.
     """
     db = next(get_db())
     try:
-        summary = mcp_tools.summarize_alerts(db=db, window_days=window_days)
-        return summary.json()
+        request = AlertBulkResolve(
+            alert_ids=alert_ids,
+            provider_id=provider_id,
+            credential_id=credential_id,
+            severity=severity,
+            created_before=created_before,
+            resolution_note=resolution_note
+        )
+        alerts = mcp_tools.mark_alerts_resolved(db=db, **request.dict())
+        return "[" + ",".join([a.json() for a in alerts]) + "]"
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    finally:
+        db.close()
+
+@mcp_tool
+@metrics.instrumented("mcp")
+@run_in_db_thread
+def summarize_alerts(
+    window_days: Optional[int] = None,
+    include_archive: bool = False,
+    since_seq: Optional[int] = None
+) -> str:
+    """
+    Get a summary of alerts (count by severity, open vs resolved).
+    Optionally filter by last N days. include_archive also counts resolved
+    alerts that retention moved to the archive.
+    With since_seq (the "seq" of an earlier answer) the result comes
+    wrapped as {"seq", "changed": true, "result"}, or is left out
+    ({"seq", "changed": false}) when no alert changed since.
+    """
+    seq = result_cache.change_seq()
+    unchanged = _unchanged_since(since_seq, seq)
+    if unchanged is not None:
+        return unchanged
+    db = next(get_read_db())
+    archive_db = next(get_archive_db()) if include_archive else None
+    try:
+        summary = mcp_tools.summarize_alerts(db=db, window_days=window_days, archive_db=archive_db)
+        return _since_seq(since_seq, seq, summary.json())
+    finally:
+        db.close()
+        if archive_db is not None:
+            archive_db.close()
+
+@mcp_tool
+@metrics.instrumented("mcp")
+@run_in_db_thread
+def alert_analytics(
+    group_by: Optional[List[str]] = None,
+    window_days: Optional[int] = None,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    channel: Optional[str] = None,
+    percentiles: Optional[List[float]] = None,
+    include_archive: bool = False,
+    limit: int = 1000,
+    since_seq: Optional[int] = None
+) -> str:
+    """
+    Aggregated alert counts (total, open, resolved) and time-to-resolve
+    percentiles, grouped by any of: severity, provider_id, channel, day,
+    week, status. Optional filters: window_days, provider_id, severity,
+    channel. percentiles defaults to [50, 90, 99]. Returns JSON.
+    With since_seq (the "seq" of an earlier answer) the result comes
+    wrapped as {"seq", "changed": true, "result"}, or is left out
+    ({"seq", "changed": false}) when no alert changed since.
+    """
+    seq = result_cache.change_seq()
+    unchanged = _unchanged_since(since_seq, seq)
+    if unchanged is not None:
+        return unchanged
+    db = next(get_read_db())
+    archive_db = next(get_archive_db()) if include_archive else None
+    try:
+        analytics = mcp_tools.alert_analytics(
+            db=db,
+            group_by=group_by or (),
+            window_days=window_days,
+            provider_id=provider_id,
+            severity=severity,
+            channel=channel,
+            percentiles=percentiles or (50, 90, 99),
+            archive_db=archive_db,
+            limit=limit
+        )
+        return _since_seq(since_seq, seq, analytics.json())
+    except ValueError as e:
+        return f"Error: {str(e)}"
     finally:
         db.close()
+        if archive_db is not None:
+            archive_db.close()
+
+@mcp_tool
+@metrics.instrumented("mcp")
+@run_in_db_thread
+def batch(operations: List[Dict[str, Any]], atomic: bool = True) -> str:
+    """
+    Run several tool calls in one round trip and one database transaction,
+    e.g. get_open_alerts, a few mark_alert_resolved, a log_alert and a
+    summarize_alerts. operations is an ordered list of
+    {"tool": name, "arguments": {...}} with tool one of get_open_alerts,
+    mark_alert_resolved, log_alert, summarize_alerts and the arguments it
+    takes; later operations see the writes of earlier ones. atomic (the
+    default) undoes everything when an operation fails; atomic=false skips
+    failed operations and commits the rest. Returns every result in order.
+    """
+    db = next(get_db())
+    try:
+        result = mcp_tools.run_batch(db=db, operations=operations, atomic=atomic)
+        return result.json()
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    finally:
+        db.close()
+
+# --- MCP Change Feed Resources ---
+# Instead of polling get_open_alerts, MCP clients subscribe to one of these
+# resources and get a notifications/resources/updated message whenever a
+# matching alert changes, then read the events since their last sequence.
+#   alerts://changes                                    every change
+#   alerts://changes/{since}/{provider_id}/{severity}   filtered ("any" = no filter)
+
+FEED_URI = "alerts://changes"
+FEED_RESOURCE_LIMIT = 500
+
+def _changes_json(since: int, provider_id: Optional[int] = None, severity: Optional[str] = None) -> str:
+    events, complete = change_feed.since(since, provider_id=provider_id, severity=severity)
+    return json.dumps({
+        "last_seq": change_feed.last_seq,
+        # False means events were missed: resynchronize with get_open_alerts
+        "complete": complete,
+        "events": [e.to_dict() for e in events[:FEED_RESOURCE_LIMIT]],
+    })
+
+def _feed_filters(uri: str) -> Optional[Tuple[Optional[int], Optional[str]]]:
+    """(provider_id, severity) filters of a change-feed URI, or None for other URIs."""
+    if uri == FEED_URI:
+        return None, None
+    if not uri.startswith(FEED_URI + "/"):
+        return None
+    parts = uri[len(FEED_URI) + 1:].split("/")
+    if len(parts) != 3:
+        return None, None
+    provider_id = None if parts[1] == "any" else int(parts[1])
+    severity = None if parts[2] == "any" else parts[2]
+    return provider_id, severity
+
+@mcp_resource(FEED_URI, mime_type="application/json")
+def alert_changes() -> str:
+    """The latest change-feed sequence number and the most recent alert changes."""
+    # Sequence numbers have gaps (see feed.py): start before the last FEED_RESOURCE_LIMIT events
+    events, _ = change_feed.since(change_feed.first_seq)
+    since = events[-FEED_RESOURCE_LIMIT - 1].seq if len(events) > FEED_RESOURCE_LIMIT else change_feed.first_seq
+    return _changes_json(since)
+
+@mcp_resource(FEED_URI + "/{since}/{provider_id}/{severity}", mime_type="application/json")
+def alert_changes_since(since: str, provider_id: str, severity: str) -> str:
+    """Alert changes after sequence number `since`, optionally filtered ("any" = no filter)."""
+    filters = _feed_filters(f"{FEED_URI}/{since}/{provider_id}/{severity}")
+    return _changes_json(int(since), *filters)
+
+_feed_subscriptions: Dict[str, Dict[Any, asyncio.AbstractEventLoop]] = {}
+_feed_subscriptions_lock = threading.Lock()
+
+async def _subscribe_feed(uri):
+    uri = str(uri)
+    if _feed_filters(uri) is None:
+        return
+    session = get_mcp()._mcp_server.request_context.session
+    with _feed_subscriptions_lock:
+        _feed_subscriptions.setdefault(uri, {})[session] = asyncio.get_running_loop()
+
+async def _unsubscribe_feed(uri):
+    session = get_mcp()._mcp_server.request_context.session
+    with _feed_subscriptions_lock:
+        _feed_subscriptions.get(str(uri), {}).pop(session, None)
+
+def _notify_feed_subscribers(event):
+    # Called in the writer's thread; hand the notification to each session's loop
+    with _feed_subscriptions_lock:
+        targets = [
+            (uri, session, loop)
+            for uri, sessions in _feed_subscriptions.items()
+            if event.matches(*_feed_filters(uri))
+            for session, loop in sessions.items()
+        ]
+    for uri, session, loop in targets:
+        future = asyncio.run_coroutine_threadsafe(session.send_resource_updated(uri), loop)
+
+        def drop_dead_session(f, uri=uri, session=session):
+            if f.cancelled() or f.exception() is not None:
+                with _feed_subscriptions_lock:
+                    _feed_subscriptions.get(uri, {}).pop(session, None)
+
+        future.add_done_callback(drop_dead_session)
+
+change_feed.subscribe(_notify_feed_subscribers)
+
+def get_mcp():
+    """The FastMCP server with every tool and resource above, built on first use."""
+    global _mcp
+    if _mcp is not None:
+        return _mcp
+    with _mcp_lock:
+        if _mcp is None:
+            from mcp.server.fastmcp import FastMCP
+
+            server = FastMCP("alert_mcp")
+            for fn in _mcp_tools:
+                server.add_tool(fn)
+            for uri, kwargs, fn in _mcp_resources:
+                server.resource(uri, **kwargs)(fn)
+            server._mcp_server.subscribe_resource()(_subscribe_feed)
+            server._mcp_server.unsubscribe_resource()(_unsubscribe_feed)
+
+            # FastMCP always advertises resources.subscribe=False; we do support it.
+            get_capabilities = server._mcp_server.get_capabilities
+
+            def get_capabilities_with_subscribe(notification_options, experimental_capabilities):
+                capabilities = get_capabilities(notification_options, experimental_capabilities)
+                if capabilities.resources is not None:
+                    capabilities.resources.subscribe = True
+                return capabilities
+
+            server._mcp_server.get_capabilities = get_capabilities_with_subscribe
+            _mcp = server
+    return _mcp
+
+class _LazySSEApp:
+    """ASGI app that builds the MCP SSE app on its first request."""
+
+    def __init__(self):
+        self._app = None
+
+    async def __call__(self, scope, receive, send):
+        if self._app is None:
+            self._app = get_mcp().sse_app()
+        await self._app(scope, receive, send)
+
+class _LazyStreamableHTTPApp:
+    """
+    ASGI app serving MCP over stateless streamable HTTP: each POST carries
+    a complete request and gets its JSON response, with no Mcp-Session-Id
+    to pin a client to the process that served it, so requests can be
+    spread over several workers (see serve()). Resource subscriptions need
+    the SSE transport, which keeps a stream per client.
+
+    The session manager behind it is built on the first request and runs
+    in a task on that event loop until stop().
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._ready = None
+        self._stop = None
+        self._task = None
+
+    async def __call__(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First request, or the previous loop is gone (as between test clients)
+            self._loop = loop
+            self._ready = loop.create_future()
+            self._stop = asyncio.Event()
+            self._task = loop.create_task(self._run(self._ready, self._stop))
+        manager = await asyncio.shield(self._ready)
+        await manager.handle_request(scope, receive, send)
+
+    @staticmethod
+    async def _run(ready, stop):
+        try:
+            from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+
+            server = get_mcp()
+            manager = StreamableHTTPSessionManager(
+                app=server._mcp_server,
+                json_response=True,
+                stateless=True,
+                security_settings=server.settings.transport_security
+            )
+            async with manager.run():
+                ready.set_result(manager)
+                await stop.wait()
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(e)
+            raise
+
+    async def stop(self):
+        task, stop = self._task, self._stop
+        self._loop = self._ready = self._stop = self._task = None
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            stop.set()
+            await task
+
+_streamable_http_app = _LazyStreamableHTTPApp()
 
 # --- FastAPI App ---
 
-app = FastAPI(title="Alert MCP Server")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema setup runs here rather than at import; init_db() returns after
+    # one PRAGMA when the database is already at SCHEMA_VERSION.
+    init_db()
+    init_archive_db()
+    working_set.start()
+    worker = retention.start_worker()
+    yield
+    if worker is not None:
+        worker.stop()
+    # Commit whatever is still queued for group commit
+    group_commit.writer.stop()
+    await _streamable_http_app.stop()
+
+app = FastAPI(title="Alert MCP Server", lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Mount MCP Server (SSE)
 # FastMCP provides .sse_app() which returns a Starlette app that can be mounted
-app.mount("/sse", mcp.sse_app())
+app.mount("/sse", _LazySSEApp())
+# MCP over stateless streamable HTTP; a single path, so /mcp/tools/* below stay routes
+app.router.routes.append(Route("/mcp", _streamable_http_app))
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+# Prometheus scrape endpoint
+app.add_route("/metrics", metrics.metrics_endpoint, methods=["GET"], include_in_schema=False)
+
+@app.get("/api/cache/stats")
+def api_cache_stats():
+    return result_cache.stats()
+
+@app.get("/api/working_set/verify")
+def api_verify_working_set(repair: bool = False, db: Session = Depends(get_db)):
+    """
+    Compares the open alert working set with the database (on the writer
+    session, so no write lands in between); repair reloads it on drift.
+    """
+    try:
+        drift = open_alert_index.verify(db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    repaired = bool(drift) and repair
+    if repaired:
+        open_alert_index.load(db)
+    return {"open_alerts": len(open_alert_index), "drift": drift, "repaired": repaired}
+
 # REST Endpoints for Gradio / UI
 @app.post("/api/log_alert", response_model=AlertRead)
 def api_log_alert(
     alert: AlertCreate,
+    fire_and_forget: bool = False,
     db: Session = Depends(get_db)
 ):
+    if group_commit.ALERT_GROUP_COMMIT:
+        try:
+            committed = group_commit.log_alert(fire_and_forget=fire_and_forget, **alert.dict())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if committed is None:
+            return JSONResponse({"queued": True}, status_code=202)
+        return committed
     try:
         return mcp_tools.log_alert(
             db=db,
@@ -128,13 +707,135 @@ def api_log_alert(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/api/alerts/events")
+async def api_alert_events(
+    request: Request,
+    since: Optional[int] = None,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None
+):
+    """
+    Server-Sent Events stream of alert changes (created, coalesced, resolved).
+    Resume with ?since=<seq> or the standard Last-Event-ID header; a "reset"
+    event means events were missed and the client should refetch open alerts.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    return StreamingResponse(
+        sse_stream(change_feed, since=since, provider_id=provider_id, severity=severity),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/alerts/bulk", response_model=AlertBulkResult)
+def api_log_alerts_bulk(
+    alerts: List[Dict[str, Any]],
+    db: Session = Depends(get_db)
+):
+    return mcp_tools.log_alerts_bulk(db=db, alerts=alerts)
+
 @app.get("/api/alerts", response_model=List[AlertRead])
 def api_get_alerts(
+    request: Request,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    max_message_chars: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    # Without limit/cursor this returns every open alert, as before. With them
+    # it returns one page and the cursor for the next one in X-Next-Cursor.
+    # Both are already JSON-ready, so they skip response_model validation.
+    # fields is comma-separated, e.g. ?fields=provider_id,message
+    validators = _validators()
+    not_modified = _not_modified(request, validators)
+    if not_modified is not None:
+        return not_modified
+    try:
+        if limit is None and cursor is None:
+            alerts = mcp_tools.get_open_alert_rows(
+                db=db, provider_id=provider_id, severity=severity,
+                fields=fields, max_message_chars=max_message_chars
+            )
+            return Response(mcp_tools.dump_json(alerts), media_type="application/json", headers=validators)
+        page = mcp_tools.get_open_alert_rows_page(
+            db=db,
+            provider_id=provider_id,
+            severity=severity,
+            limit=limit if limit is not None else 100,
+            cursor=cursor,
+            fields=fields,
+            max_message_chars=max_message_chars
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = dict(validators)
+    if page["next_cursor"] is not None:
+        headers["X-Next-Cursor"] = page["next_cursor"]
+    return Response(mcp_tools.dump_json(page["items"]), media_type="application/json", headers=headers)
+
+@app.get("/api/alerts/search", response_model=AlertSearchPage)
+def api_search_alerts(
+    request: Request,
+    response: Response,
+    q: str,
     provider_id: Optional[int] = None,
     severity: Optional[str] = None,
+    status: Optional[str] = None,
+    order: str = "relevance",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    validators = _validators()
+    not_modified = _not_modified(request, validators)
+    if not_modified is not None:
+        return not_modified
+    try:
+        page = mcp_tools.search_alerts(
+            db=db, query=q, provider_id=provider_id, severity=severity,
+            status=status, order=order, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers.update(validators)
+    return page
+
+@app.get("/api/alerts/stream")
+def api_stream_alerts(
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    fields: Optional[str] = None,
+    max_message_chars: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    """All open alerts as newline-delimited JSON, read in bounded batches."""
+    try:
+        alerts = mcp_tools.iter_open_alert_rows(
+            db=db, provider_id=provider_id, severity=severity,
+            fields=fields, max_message_chars=max_message_chars
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def generate():
+        for alert in alerts:
+            yield mcp_tools.dump_json(alert) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.post("/api/alerts/resolve", response_model=List[AlertRead])
+def api_resolve_alerts(
+    request: AlertBulkResolve,
     db: Session = Depends(get_db)
 ):
-    return mcp_tools.get_open_alerts(db=db, provider_id=provider_id, severity=severity)
+    try:
+        return mcp_tools.mark_alerts_resolved(db=db, **request.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/alerts/{alert_id}/resolve", response_model=AlertRead)
 def api_resolve_alert(
@@ -149,38 +850,75 @@ def api_resolve_alert(
 
 @app.get("/api/summary", response_model=AlertSummary)
 def api_summary(
+    request: Request,
+    response: Response,
     window_days: Optional[int] = None,
-    db: Session = Depends(get_db)
+    include_archive: bool = False,
+    db: Session = Depends(get_read_db),
+    archive_db: Session = Depends(get_archive_db)
 ):
-    return mcp_tools.summarize_alerts(db=db, window_days=window_days)
-
-
-# Now integrating with FasteMCP for the actual MCP protocol support
-# I will use `mcp` library if it exists.
-# Since I am writing the code without checking `mcp` lib, I will assume `FasteMCP` works as a standalone app
-# or I can mount it.
-
-# If `mcp` is not installed in the environment, this file will fail.
-# But I put `mcp` in pyproject.toml.
-
-# Let's make `app` the main entry point and mount the MCP server if possible.
-# Or if FasteMCP is an app, we can use it.
+    validators = _validators()
+    not_modified = _not_modified(request, validators)
+    if not_modified is not None:
+        return not_modified
+    summary = mcp_tools.summarize_alerts(
+        db=db, window_days=window_days, archive_db=archive_db if include_archive else None
+    )
+    response.headers.update(validators)
+    return summary
 
-# Given the specific path requirement "/mcp/tools/{tool_name}", I'm suspicious this might be a custom requirement.
-# But standard MCP over SSE uses /sse and /messages (or similar).
+@app.get("/api/analytics", response_model=AlertAnalytics)
+def api_analytics(
+    request: Request,
+    response: Response,
+    group_by: List[str] = Query([]),
+    window_days: Optional[int] = None,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    channel: Optional[str] = None,
+    percentiles: List[float] = Query([50, 90, 99]),
+    include_archive: bool = False,
+    limit: int = 1000,
+    db: Session = Depends(get_read_db),
+    archive_db: Session = Depends(get_archive_db)
+):
+    validators = _validators()
+    not_modified = _not_modified(request, validators)
+    if not_modified is not None:
+        return not_modified
+    try:
+        analytics = mcp_tools.alert_analytics(
+            db=db,
+            group_by=group_by,
+            window_days=window_days,
+            provider_id=provider_id,
+            severity=severity,
+            channel=channel,
+            percentiles=percentiles,
+            archive_db=archive_db if include_archive else None,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers.update(validators)
+    return analytics
 
-# "MCP tool endpoints under /mcp/tools/{tool_name}"
-# This looks like:
-# POST /mcp/tools/log_alert
-# POST /mcp/tools/get_open_alerts
-# ...
-# This is explicitly what was requested. So I will add these specific routes.
+# --- MCP tools as plain HTTP routes: POST /mcp/tools/{tool_name} ---
 
 @app.post("/mcp/tools/log_alert")
-async def mcp_log_alert(payload: AlertCreate, db: Session = Depends(get_db)):
+async def mcp_log_alert(payload: AlertCreate, fire_and_forget: bool = False, db: Session = Depends(get_db)):
+    if group_commit.ALERT_GROUP_COMMIT:
+        try:
+            future = group_commit.writer.enqueue(wait=not fire_and_forget, **payload.dict())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if future is None:
+            return JSONResponse({"queued": True}, status_code=202)
+        return await asyncio.wrap_future(future)
     # Helper to wrap the logic
     try:
-        return mcp_tools.log_alert(
+        return await run_db(
+            mcp_tools.log_alert,
             db=db,
             provider_id=payload.provider_id,
             credential_id=payload.credential_id,
@@ -192,13 +930,74 @@ async def mcp_log_alert(payload: AlertCreate, db: Session = Depends(get_db)):
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/mcp/tools/log_alerts_bulk", response_model=AlertBulkResult)
+async def mcp_log_alerts_bulk(alerts: List[Dict[str, Any]], db: Session = Depends(get_db)):
+    return await run_db(mcp_tools.log_alerts_bulk, db=db, alerts=alerts)
+
+@app.post("/mcp/tools/batch", response_model=BatchResult)
+async def mcp_batch(operations: List[Dict[str, Any]], atomic: bool = True, db: Session = Depends(get_db)):
+    try:
+        return await run_db(mcp_tools.run_batch, db=db, operations=operations, atomic=atomic)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/mcp/tools/get_open_alerts")
 async def mcp_get_open_alerts(
     provider_id: Optional[int] = None,
     severity: Optional[str] = None,
-    db: Session = Depends(get_db)
+    fields: Optional[str] = None,
+    max_message_chars: Optional[int] = None,
+    db: Session = Depends(get_read_db)
 ):
-    return mcp_tools.get_open_alerts(db=db, provider_id=provider_id, severity=severity)
+    try:
+        alerts = await run_db(
+            mcp_tools.get_open_alert_rows,
+            db=db, provider_id=provider_id, severity=severity,
+            fields=fields, max_message_chars=max_message_chars
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(mcp_tools.dump_json(alerts), media_type="application/json")
+
+@app.post("/mcp/tools/get_open_alerts_page", response_model=AlertPage)
+async def mcp_get_open_alerts_page(
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    max_message_chars: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    try:
+        page = await run_db(
+            mcp_tools.get_open_alert_rows_page,
+            db=db, provider_id=provider_id, severity=severity, limit=limit, cursor=cursor,
+            fields=fields, max_message_chars=max_message_chars
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(mcp_tools.dump_json(page), media_type="application/json")
+
+@app.post("/mcp/tools/search_alerts", response_model=AlertSearchPage)
+async def mcp_search_alerts(
+    query: str,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    order: str = "relevance",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    try:
+        return await run_db(
+            mcp_tools.search_alerts,
+            db=db, query=query, provider_id=provider_id, severity=severity,
+            status=status, order=order, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/mcp/tools/mark_alert_resolved")
 async def mcp_mark_alert_resolved(
@@ -207,34 +1006,90 @@ async def mcp_mark_alert_resolved(
     db: Session = Depends(get_db)
 ):
     try:
-        return mcp_tools.mark_alert_resolved(db=db, alert_id=alert_id, resolution_note=resolution_note)
+        return await run_db(mcp_tools.mark_alert_resolved, db=db, alert_id=alert_id, resolution_note=resolution_note)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+@app.post("/mcp/tools/mark_alerts_resolved", response_model=List[AlertRead])
+async def mcp_mark_alerts_resolved(request: AlertBulkResolve, db: Session = Depends(get_db)):
+    try:
+        return await run_db(mcp_tools.mark_alerts_resolved, db=db, **request.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/mcp/tools/summarize_alerts")
-async def mcp_summarize_alerts(window_days: Optional[int] = None, db: Session = Depends(get_db)):
-    return mcp_tools.summarize_alerts(db=db, window_days=window_days)
-
-# Finally, I'll attempt to mount the FasteMCP app if I can, to support "real" MCP over SSE.
-# But without documentation on FasteMCP in this context, I might skip it and rely on the REST endpoints
-# satisfying the "MCP tool endpoints" requirement, as that is what was explicitly asked.
-# The prompt says "MCP: HTTP + SSE". This strongly suggests standard MCP support.
-
-# I will try to include the standard MCP setup using the `mcp` library from Anthropic or similar.
-# Assuming `mcp` package is available (it is in my toml).
-
-try:
-    # This is a best-effort integration with the `mcp` python sdk
-    from mcp.server.fastapi import Server
-    import mcp.types as types
-
-    # I'll need to define the server
-    # But FasteMCP mentioned above is from `mcp`? I might have hallucinated `FasteMCP` name
-    # if it's not in the standard lib. The standard lib usually has `Server`.
-    # I'll stick to the requested structure and minimal implementation.
-    pass
-except ImportError:
-    pass
+async def mcp_summarize_alerts(
+    window_days: Optional[int] = None,
+    include_archive: bool = False,
+    db: Session = Depends(get_read_db),
+    archive_db: Session = Depends(get_archive_db)
+):
+    return await run_db(
+        mcp_tools.summarize_alerts,
+        db=db, window_days=window_days, archive_db=archive_db if include_archive else None
+    )
+
+@app.post("/mcp/tools/alert_analytics", response_model=AlertAnalytics)
+async def mcp_alert_analytics(
+    request: AlertAnalyticsQuery,
+    db: Session = Depends(get_read_db),
+    archive_db: Session = Depends(get_archive_db)
+):
+    options = request.dict()
+    include_archive = options.pop("include_archive")
+    try:
+        return await run_db(
+            mcp_tools.alert_analytics,
+            db=db, archive_db=archive_db if include_archive else None, **options
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+
+def serve(host: str = API_HOST, port: int = API_PORT, workers: int = API_WORKERS):
+    """
+    Runs the API with uvicorn. With workers > 1, uvicorn starts that many
+    processes sharing the port; the database files are shared, and MCP
+    clients should use the stateless /mcp endpoint (an SSE session only
+    lives in the worker that opened it). Per worker are:
+      - the read cache: a write only invalidates its own worker's cache,
+        so it is disabled unless ALERT_CACHE_SIZE is set explicitly;
+      - the change feed: /api/alerts/events and the alerts://changes
+        resources only see writes made through the same worker;
+      - the open alert working set and the change sequence behind ETags
+        and since_seq, which are therefore turned off.
+    """
+    if workers <= 1:
+        uvicorn.run(app, host=host, port=port)
+        return
+    if _is_memory_db(DEFAULT_DB_PATH):
+        raise ValueError("Several workers need a database file; an in-memory database is per process")
+    # Create or migrate the schema once, rather than in every worker at once
+    init_db()
+    init_archive_db()
+    os.environ.setdefault("ALERT_CACHE_SIZE", "0")
+    # Nor would an open alert working set or the ETags see the other workers' writes
+    os.environ["ALERT_WORKING_SET"] = "0"
+    os.environ["ALERT_CONDITIONAL_GET"] = "0"
+    # Retention runs once, in this supervising process, not in every worker
+    worker = retention.start_worker()
+    os.environ["ALERT_RETENTION_INTERVAL_SECONDS"] = "0"
+    try:
+        uvicorn.run("src.alert_mcp.main:app", host=host, port=port, workers=workers)
+    finally:
+        if worker is not None:
+            worker.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the alert API and MCP server.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS)
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    main()
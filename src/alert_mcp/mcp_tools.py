@@ -1,11 +1,71 @@
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+import base64
+import heapq
+import inspect
+import itertools
+import json
+import re
+from datetime import datetime, timedelta, time
+from typing import Optional, List, Dict, Any, Union, Iterator, Sequence, Tuple
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.orm import Session, Query
+from sqlalchemy import (
+    DateTime, String, and_, case, desc, event, func, literal_column, or_, select, tuple_, type_coerce, update
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
 
-from .models import Alert
-from .schemas import AlertCreate, AlertRead, AlertSummary
+from .models import Alert, AlertCounter, AlertRollup, ArchivedAlert, SEVERITY_RANK, alert_dedup_key, alerts_fts
+from . import counters, rollups, shards
+from .cache import result_cache
+from .feed import change_feed
+from .working_set import open_alert_index
+from .schemas import (
+    AlertCreate, AlertRead, AlertPage, AlertSearchHit, AlertSearchPage, AlertSummary, AlertBulkError, AlertBulkResult,
+    AlertAnalytics, AlertAnalyticsGroup, AlertTimeToResolve, BatchOperation, BatchOperationResult, BatchResult
+)
 
+# Upper bound for a single page of get_open_alerts_page
+MAX_PAGE_SIZE = 1000
+# search_alerts ranks at most this many of the newest matches by relevance
+SEARCH_RANK_WINDOW = 10000
+# Upper bound for the operations of one run_batch call
+MAX_BATCH_OPERATIONS = 100
+
+def _after_commit(db: Session, callback):
+    """
+    Runs callback once the session's current transaction has committed.
+    Dropped if it rolls back instead.
+    """
+    callbacks = db.info.setdefault("after_commit", [])
+    if callback not in callbacks:
+        callbacks.append(callback)
+
+def _publish_after_commit(db: Session, event_type: str, alerts: List[AlertRead]):
+    """
+    Publishes one change-feed event per alert once the transaction commits,
+    and applies the change to the open alert working set.
+    """
+    def publish():
+        open_alert_index.apply(event_type, alerts)
+        for alert in alerts:
+            change_feed.publish(event_type, alert.model_dump(mode='json'))
+    _after_commit(db, publish)
+
+def _commit(db: Session):
+    """Commits a write tool's transaction, unless db is running a batch (see run_batch)."""
+    if not db.info.get("batch"):
+        db.commit()
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session):
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_commit(session):
+    session.info.pop("after_commit", None)
+
+@shards.sharded()
 def log_alert(
     db: Session,
     provider_id: int,
@@ -18,12 +78,47 @@ def log_alert(
     """
     Inserts a new row into alerts.
     Validates severity (only allow "info", "warning", "critical").
-    Returns the created alert record.
+    If an identical alert (same provider, credential, severity, window and
+    message) is still open, it is coalesced instead: its occurrence_count and
+    last_seen_at are bumped and no new row is created.
+    Returns the created (or coalesced) alert record.
     """
+    alert_data = validate_alert(
+        provider_id=provider_id,
+        severity=severity,
+        window_days=window_days,
+        message=message,
+        credential_id=credential_id,
+        channel=channel
+    )
+
+    now = datetime.utcnow()
+    row = db.execute(
+        _upsert_statement().returning(*Alert.__table__.c),
+        dict(alert_data.dict(), created_at=now, last_seen_at=now)
+    ).one()
+    alert = AlertRead.from_orm(row)
+    if row.occurrence_count == 1:
+        counters.record_created(db, [(row.created_at, row.severity)])
+        rollups.record_created(db, [row])
+    _after_commit(db, result_cache.invalidate)
+    _publish_after_commit(db, "created" if row.occurrence_count == 1 else "coalesced", [alert])
+    _commit(db)
+    return alert
+
+def validate_alert(
+    provider_id: int,
+    severity: str,
+    window_days: int,
+    message: str,
+    credential_id: Optional[int] = None,
+    channel: str = "ui"
+) -> AlertCreate:
+    """The checks log_alert applies to its arguments; raises ValueError."""
     if severity not in ("info", "warning", "critical"):
         raise ValueError("Severity must be one of: 'info', 'warning', 'critical'")
 
-    alert_data = AlertCreate(
+    return AlertCreate(
         provider_id=provider_id,
         credential_id=credential_id,
         severity=severity,
@@ -32,12 +127,225 @@ def log_alert(
         channel=channel
     )
 
-    db_alert = Alert(**alert_data.dict())
-    db.add(db_alert)
-    db.commit()
-    db.refresh(db_alert)
-    return AlertRead.from_orm(db_alert)
+def _upsert_statement():
+    """
+    INSERT into alerts that coalesces into the open alert with the same
+    dedup_key (ux_alerts_open_dedup) rather than adding a duplicate.
+    """
+    table = Alert.__table__
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.dedup_key],
+        index_where=table.c.resolved_at.is_(None),
+        set_={
+            "occurrence_count": table.c.occurrence_count + 1,
+            "last_seen_at": stmt.excluded.last_seen_at,
+        }
+    )
+
+def _format_validation_error(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in err['loc']) or 'alert'}: {err['msg']}"
+        for err in e.errors()
+    )
+
+def _bulk_shards(alerts: list, shard_count: int) -> Dict[int, List[int]]:
+    """Indexes of the bulk items per shard, by provider; invalid items go to shard 0 to be reported."""
+    parts: Dict[int, List[int]] = {}
+    for index, item in enumerate(alerts):
+        provider_id = item.get("provider_id") if isinstance(item, dict) else getattr(item, "provider_id", None)
+        try:
+            shard = shards.shard_for_provider(int(provider_id), shard_count)
+        except (TypeError, ValueError):
+            shard = 0
+        parts.setdefault(shard, []).append(index)
+    return dict(sorted(parts.items()))
+
+def _route_bulk(arguments):
+    alerts = arguments["alerts"]
+    return {
+        shard: {"alerts": [alerts[i] for i in indexes]}
+        for shard, indexes in _bulk_shards(alerts, len(arguments["db"])).items()
+    }
+
+def _merge_bulk_results(results: List[AlertBulkResult], arguments) -> AlertBulkResult:
+    # Map each shard's item indexes back to the positions in the whole batch
+    created = {}
+    errors = []
+    coalesced = 0
+    parts = _bulk_shards(arguments["alerts"], len(arguments["db"]))
+    for indexes, result in zip(parts.values(), results):
+        failed = {error.index for error in result.errors}
+        valid = [index for n, index in enumerate(indexes) if n not in failed]
+        created.update(zip(valid, result.created_ids))
+        errors.extend(AlertBulkError(index=indexes[e.index], error=e.error) for e in result.errors)
+        coalesced += result.coalesced
+    return AlertBulkResult(
+        created_ids=[created[index] for index in sorted(created)],
+        errors=sorted(errors, key=lambda e: e.index),
+        coalesced=coalesced
+    )
+
+@shards.sharded(route=_route_bulk, merge=_merge_bulk_results)
+def log_alerts_bulk(
+    db: Session,
+    alerts: List[Union[AlertCreate, Dict[str, Any]]]
+) -> AlertBulkResult:
+    """
+    Inserts many alerts at once.
+    Every item is validated up front; invalid items are reported by their
+    index in the batch and skipped, valid ones are upserted (deduplicated
+    like log_alert) with a single executemany in one transaction.
+    Returns the alert id of each valid item (in input order) and the
+    per-item errors.
+    """
+    rows = []
+    errors = []
+    for index, item in enumerate(alerts):
+        try:
+            if isinstance(item, AlertCreate):
+                alert_data = item
+            elif isinstance(item, dict):
+                alert_data = AlertCreate(**item)
+            else:
+                raise ValueError("Each alert must be a JSON object")
+        except ValidationError as e:
+            errors.append(AlertBulkError(index=index, error=_format_validation_error(e)))
+            continue
+        except ValueError as e:
+            errors.append(AlertBulkError(index=index, error=str(e)))
+            continue
+        rows.append(alert_data.dict())
+
+    created_ids = []
+    coalesced = 0
+    if rows:
+        by_key, inserted = upsert_alert_rows(db, rows)
+        created_ids = [by_key[row["dedup_key"]].id for row in rows]
+        coalesced = len(rows) - inserted
+        _commit(db)
+
+    return AlertBulkResult(created_ids=created_ids, errors=errors, coalesced=coalesced)
+
+def _route_rows(arguments):
+    parts: Dict[int, list] = {}
+    for row in arguments["rows"]:
+        parts.setdefault(shards.shard_for_provider(row["provider_id"], len(arguments["db"])), []).append(row)
+    return {shard: {"rows": rows} for shard, rows in parts.items()}
+
+def _merge_upserts(results, arguments):
+    by_key = {}
+    for shard_by_key, _ in results:
+        by_key.update(shard_by_key)
+    return by_key, sum(inserted for _, inserted in results)
+
+@shards.sharded(route=_route_rows, merge=_merge_upserts)
+def upsert_alert_rows(db: Session, rows: List[Dict[str, Any]]):
+    """
+    Upserts validated alert rows (AlertCreate.dict(), optionally with their
+    created_at) in the current transaction, deduplicated like log_alert.
+    Sets each row's dedup_key. Returns the resulting alert row per dedup_key
+    and how many rows were inserted rather than coalesced. The caller
+    commits; counters, cache invalidation and change events go with it.
+    """
+    now = datetime.utcnow()
+    for row in rows:
+        created_at = row.setdefault("created_at", now)
+        row["last_seen_at"] = created_at
+        row["dedup_key"] = alert_dedup_key(
+            row["provider_id"], row["credential_id"], row["severity"],
+            row["window_days"], row["message"]
+        )
+    # One INSERT ... ON CONFLICT ... RETURNING executed with all parameter
+    # sets; SQLAlchemy batches these into multi-row VALUES statements
+    # ("insertmanyvalues"). RETURNING order is not guaranteed, so rows are
+    # mapped back to the items through their dedup_key. Items repeating a key
+    # within the batch coalesce into one alert; the latest state wins.
+    returned = db.execute(
+        _upsert_statement().returning(*Alert.__table__.c),
+        rows
+    ).all()
+    by_key = {}
+    for r in returned:
+        if r.dedup_key not in by_key or r.occurrence_count > by_key[r.dedup_key].occurrence_count:
+            by_key[r.dedup_key] = r
+    inserted = [r for r in returned if r.occurrence_count == 1]
+    counters.record_created(db, [(r.created_at, r.severity) for r in inserted])
+    rollups.record_created(db, inserted)
+    _after_commit(db, result_cache.invalidate)
+    _publish_after_commit(db, "created", [AlertRead.from_orm(r) for r in inserted])
+    _publish_after_commit(
+        db, "coalesced", [AlertRead.from_orm(r) for r in returned if r.occurrence_count > 1]
+    )
+    return by_key, len(inserted)
+
+def _open_alerts_conditions(
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None
+) -> list:
+    conditions = [Alert.resolved_at == None]
+
+    if provider_id is not None:
+        conditions.append(Alert.provider_id == provider_id)
+
+    if severity is not None:
+        # Filter on the rank too so the open-alert indexes can seek on it
+        conditions.append(Alert.severity_rank == SEVERITY_RANK.get(severity, 0))
+        conditions.append(Alert.severity == severity)
+
+    return conditions
+
+# Sorting: critical (3), warning (2), info (1) via the stored severity_rank,
+# which matches the ix_alerts_open_* indexes so SQLite needs no sort step.
+# id breaks ties so the order is total, which keyset pagination relies on.
+_OPEN_ALERTS_ORDER = (
+    Alert.severity_rank.desc(),
+    Alert.created_at.desc(),
+    Alert.id.desc()
+)
+
+def _open_alerts_query(
+    db: Session,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None
+) -> Query:
+    return (
+        db.query(Alert)
+        .filter(*_open_alerts_conditions(provider_id, severity))
+        .order_by(*_OPEN_ALERTS_ORDER)
+    )
+
+def _read_order_key(alert: AlertRead):
+    return (SEVERITY_RANK.get(alert.severity, 0), alert.created_at, alert.id)
+
+def _row_order_key(alert: Dict[str, Any]):
+    # ISO strings compare like the datetimes they encode
+    return (SEVERITY_RANK.get(alert["severity"], 0), alert["created_at"], alert["id"])
+
+def _merge_ordered(key):
+    """Merges per-shard lists (or iterators) already in get_open_alerts order."""
+    def merge(results, arguments):
+        return list(heapq.merge(*results, key=key, reverse=True))
+    return merge
+
+def _merge_open_pages(key, item_cursor, get, reverse=True):
+    """
+    Merges per-shard pages fetched with the same cursor: the order key is
+    the same on every shard, so the first `limit` of the merged items are
+    the page, and the last one's key is the next cursor for all shards.
+    """
+    def merge(results, arguments):
+        limit = arguments["limit"]
+        items = list(heapq.merge(*(get(page, "items") for page in results), key=key, reverse=reverse))
+        next_cursor = None
+        if len(items) > limit or any(get(page, "next_cursor") for page in results):
+            next_cursor = _encode_cursor_key(*item_cursor(items[limit - 1]))
+        return items[:limit], next_cursor
+    return merge
 
+@open_alert_index.answers(open_alert_index.alerts)
+@result_cache.cached
+@shards.sharded(merge=_merge_ordered(_read_order_key))
 def get_open_alerts(
     db: Session,
     provider_id: Optional[int] = None,
@@ -48,32 +356,522 @@ def get_open_alerts(
     Optional filters: by provider_id, by severity.
     Sorted by severity (critical > warning > info), then by created_at desc.
     """
-    query = db.query(Alert).filter(Alert.resolved_at == None)
+    alerts = _open_alerts_query(db, provider_id=provider_id, severity=severity).all()
+    return [AlertRead.from_orm(a) for a in alerts]
 
-    if provider_id is not None:
-        query = query.filter(Alert.provider_id == provider_id)
+def _encode_cursor_key(*key) -> str:
+    # (severity_rank, created_at, id), or (created_at, id) for the by-time sorts
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+def encode_cursor(alert: Alert) -> str:
+    return _encode_cursor_key(alert.severity_rank, alert.created_at.isoformat(), alert.id)
+
+def decode_cursor(cursor: str):
+    try:
+        rank, created_at, alert_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(rank), datetime.fromisoformat(created_at), int(alert_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def _merge_open_alert_pages(results: List[AlertPage], arguments) -> AlertPage:
+    items, next_cursor = _merge_open_pages(
+        _read_order_key,
+        lambda a: (SEVERITY_RANK.get(a.severity, 0), a.created_at.isoformat(), a.id),
+        getattr
+    )(results, arguments)
+    return AlertPage(items=items, next_cursor=next_cursor)
+
+@result_cache.cached
+@shards.sharded(merge=_merge_open_alert_pages)
+def get_open_alerts_page(
+    db: Session,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> AlertPage:
+    """
+    One page of get_open_alerts, in the same order.
+    Keyset pagination: the cursor encodes the (severity_rank, created_at, id)
+    of the last alert returned, and the next page seeks past it in the index,
+    so every page costs the same no matter how deep it is.
+    """
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    query = _open_alerts_query(db, provider_id=provider_id, severity=severity)
+    if cursor is not None:
+        query = query.filter(
+            tuple_(Alert.severity_rank, Alert.created_at, Alert.id) < decode_cursor(cursor)
+        )
+
+    # Fetch one extra row to learn whether there is a next page
+    alerts = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(alerts[limit - 1]) if len(alerts) > limit else None
+    return AlertPage(
+        items=[AlertRead.from_orm(a) for a in alerts[:limit]],
+        next_cursor=next_cursor
+    )
+
+@shards.sharded(merge=lambda results, arguments: heapq.merge(*results, key=_read_order_key, reverse=True))
+def iter_open_alerts(
+    db: Session,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    batch_size: int = 1000
+) -> Iterator[AlertRead]:
+    """
+    Streams every open alert in get_open_alerts order, buffering at most
+    batch_size ORM rows at a time (Query.yield_per).
+    """
+    query = _open_alerts_query(db, provider_id=provider_id, severity=severity)
+    for alert in query.yield_per(batch_size):
+        yield AlertRead.from_orm(alert)
+
+# Fast read path: AlertRead's fields are selected straight from the table as
+# plain tuples (no ORM identity map, no per-row Pydantic validation) and the
+# whole result is encoded with a single json.dumps. DateTime columns are read
+# as the text SQLite stores ("YYYY-MM-DD HH:MM:SS.ffffff") and rewritten to
+# the ISO 8601 form AlertRead serializes to, so the output is the same JSON
+# as serializing the AlertRead models.
+_READ_FIELDS = tuple(AlertRead.model_fields)
+_DATETIME_FIELDS = tuple(
+    name for name in _READ_FIELDS if isinstance(Alert.__table__.c[name].type, DateTime)
+)
+_READ_COLUMNS = [
+    type_coerce(Alert.__table__.c[name], String).label(name)
+    if name in _DATETIME_FIELDS else Alert.__table__.c[name]
+    for name in _READ_FIELDS
+]
+
+def _iso(value: Optional[str]) -> Optional[str]:
+    # Same as datetime.isoformat(), which leaves out a zero fraction
+    if value is None:
+        return None
+    value = value.replace(" ", "T", 1)
+    return value[:-7] if value.endswith(".000000") else value
+
+def _alert_dict(row, names: Sequence[str] = _READ_FIELDS) -> Dict[str, Any]:
+    alert = dict(zip(names, row))
+    for name in _DATETIME_FIELDS:
+        if name in alert:
+            alert[name] = _iso(alert[name])
+    return alert
+
+# Always part of a projection: the sort key, which page cursors and the
+# merge across shards are built from
+_KEY_FIELDS = ("id", "severity", "created_at")
+# Shortened by max_message_chars
+_TEXT_FIELDS = ("message", "resolution_note")
+
+def _projection(fields: Optional[Union[str, Sequence[str]]]) -> Tuple[str, ...]:
+    """
+    The AlertRead fields to select, in AlertRead order: all of them, or the
+    given names (a list or a comma-separated string) plus _KEY_FIELDS.
+    """
+    if fields is None:
+        return _READ_FIELDS
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    names = {name.strip() for name in fields if name.strip()}
+    unknown = sorted(names - set(_READ_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Valid fields: {', '.join(_READ_FIELDS)}")
+    names.update(_KEY_FIELDS)
+    return tuple(name for name in _READ_FIELDS if name in names)
+
+def _read_column(name: str, max_message_chars: Optional[int]):
+    column = Alert.__table__.c[name]
+    if name in _DATETIME_FIELDS:
+        return type_coerce(column, String).label(name)
+    if name in _TEXT_FIELDS and max_message_chars is not None:
+        # Cut in SQL, so the full text is never fetched; "…" marks the cut
+        shortened = func.substr(column, 1, max_message_chars - 1, type_=String) + "…"
+        return case((func.length(column) > max_message_chars, shortened), else_=column).label(name)
+    return column
+
+def _open_alert_rows_statement(
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    names: Sequence[str] = _READ_FIELDS,
+    max_message_chars: Optional[int] = None
+):
+    _check_max_message_chars(max_message_chars)
+    if names == _READ_FIELDS and max_message_chars is None:
+        columns = _READ_COLUMNS
+    else:
+        columns = [_read_column(name, max_message_chars) for name in names]
+    return (
+        select(*columns)
+        .where(*_open_alerts_conditions(provider_id, severity))
+        .order_by(*_OPEN_ALERTS_ORDER)
+    )
+
+def dump_json(value: Any) -> str:
+    """Compact JSON, as Pydantic's .json() writes it."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+def _check_max_message_chars(max_message_chars: Optional[int]):
+    if max_message_chars is not None and max_message_chars < 1:
+        raise ValueError("max_message_chars must be at least 1")
+
+def _indexed_open_alert_rows(
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    fields: Optional[Union[str, Sequence[str]]] = None,
+    max_message_chars: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    # get_open_alert_rows from the working set
+    names = _projection(fields)
+    _check_max_message_chars(max_message_chars)
+    return open_alert_index.rows(provider_id, severity, names, max_message_chars)
+
+@open_alert_index.answers(_indexed_open_alert_rows)
+@result_cache.cached
+@shards.sharded(merge=_merge_ordered(_row_order_key))
+def get_open_alert_rows(
+    db: Session,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    fields: Optional[Union[str, Sequence[str]]] = None,
+    max_message_chars: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    get_open_alerts as JSON-ready dicts (AlertRead fields, datetimes as ISO
+    strings), for callers that only serialize the result.
+    fields limits the dicts (and the SELECT) to those AlertRead fields; id,
+    severity and created_at are always included. max_message_chars cuts
+    longer message and resolution_note texts to that many characters,
+    ending in "…".
+    """
+    names = _projection(fields)
+    rows = db.execute(_open_alert_rows_statement(provider_id, severity, names, max_message_chars))
+    return [_alert_dict(row, names) for row in rows]
 
+def _merge_counts(results: List[Dict[str, int]], arguments) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for shard_counts in results:
+        for severity, n in shard_counts.items():
+            counts[severity] = counts.get(severity, 0) + n
+    return counts
+
+@open_alert_index.answers(open_alert_index.counts)
+@result_cache.cached
+@shards.sharded(merge=_merge_counts)
+def count_open_alerts(
+    db: Session,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    Open alerts per severity (severities without any are left out), with the
+    get_open_alerts filters. Grouped on severity_rank, the leading column of
+    the ix_alerts_open_* indexes, so counting reads only the index and
+    needs no sort.
+    """
+    conditions = _open_alerts_conditions(provider_id, severity)
+    severities = {rank: name for name, rank in SEVERITY_RANK.items()}
+    counts = {}
+    rows = db.execute(
+        select(Alert.severity_rank, func.count()).where(*conditions).group_by(Alert.severity_rank)
+    ).all()
+    for rank, n in rows:
+        if rank in severities:
+            counts[severities[rank]] = n
+        else:
+            # Rank 0: severities outside SEVERITY_RANK, from before they were validated
+            counts.update(db.execute(
+                select(Alert.severity, func.count())
+                .where(*conditions, Alert.severity_rank == rank)
+                .group_by(Alert.severity)
+            ).all())
+    return counts
+
+# Orders get_open_alert_rows_page can sort by. "severity" is the
+# get_open_alerts order; "newest" and "oldest" walk ix_alerts_open_created.
+OPEN_ALERT_SORTS = ("severity", "newest", "oldest")
+
+def _row_time_key(alert: Dict[str, Any]):
+    return (alert["created_at"], alert["id"])
+
+def _decode_time_cursor(cursor: str):
+    try:
+        created_at, alert_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(alert_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def _merge_open_alert_row_pages(results: List[Dict[str, Any]], arguments) -> Dict[str, Any]:
+    key = _row_order_key if arguments["sort"] == "severity" else _row_time_key
+    items, next_cursor = _merge_open_pages(
+        key, key, dict.get, reverse=arguments["sort"] != "oldest"
+    )(results, arguments)
+    return {"items": items, "next_cursor": next_cursor}
+
+@result_cache.cached
+@shards.sharded(merge=_merge_open_alert_row_pages)
+def get_open_alert_rows_page(
+    db: Session,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[Union[str, Sequence[str]]] = None,
+    max_message_chars: Optional[int] = None,
+    sort: str = "severity"
+) -> Dict[str, Any]:
+    """
+    get_open_alerts_page as a JSON-ready dict shaped like AlertPage.
+    fields and max_message_chars as for get_open_alert_rows. sort is one of
+    OPEN_ALERT_SORTS; a cursor only continues the sort it came from.
+    """
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    if sort not in OPEN_ALERT_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(OPEN_ALERT_SORTS)}")
+
+    names = _projection(fields)
+    statement = _open_alert_rows_statement(provider_id, severity, names, max_message_chars)
+    if sort == "severity":
+        key = _row_order_key
+        if cursor is not None:
+            statement = statement.where(
+                tuple_(Alert.severity_rank, Alert.created_at, Alert.id) < decode_cursor(cursor)
+            )
+    else:
+        key = _row_time_key
+        order = desc if sort == "newest" else lambda column: column
+        statement = statement.order_by(None).order_by(order(Alert.created_at), order(Alert.id))
+        if cursor is not None:
+            position = tuple_(Alert.created_at, Alert.id)
+            after = _decode_time_cursor(cursor)
+            statement = statement.where(position < after if sort == "newest" else position > after)
+    items = [_alert_dict(row, names) for row in db.execute(statement.limit(limit + 1))]
+    next_cursor = _encode_cursor_key(*key(items[limit - 1])) if len(items) > limit else None
+    return {"items": items[:limit], "next_cursor": next_cursor}
+
+@shards.sharded(merge=lambda results, arguments: heapq.merge(*results, key=_row_order_key, reverse=True))
+def iter_open_alert_rows(
+    db: Session,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    batch_size: int = 1000,
+    fields: Optional[Union[str, Sequence[str]]] = None,
+    max_message_chars: Optional[int] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    iter_open_alerts as JSON-ready dicts; fields and max_message_chars as
+    for get_open_alert_rows. Invalid arguments raise here, not on iteration.
+    """
+    names = _projection(fields)
+    statement = _open_alert_rows_statement(provider_id, severity, names, max_message_chars)
+    rows = db.execute(statement.execution_options(yield_per=batch_size))
+    return (_alert_dict(row, names) for row in rows)
+
+# A "quoted phrase" or a bare word of a search query
+_SEARCH_TERM = re.compile(r'"([^"]*)"?|(\S+)')
+
+def _match_expression(query: str) -> str:
+    """
+    Turns a search string into an FTS5 query: every word has to match (a
+    trailing * matches it as a prefix) and "quoted words" as a phrase.
+    Everything else, FTS5 operators included, is matched literally, so no
+    input is a syntax error.
+    """
+    terms = []
+    for phrase, word in _SEARCH_TERM.findall(query):
+        text = phrase or word.rstrip("*")
+        text = text.replace('"', " ")
+        # Words made of punctuation only have no tokens to match
+        if not re.search(r"\w", text):
+            continue
+        terms.append(f'"{text}"' + ("*" if word.endswith("*") else ""))
+    if not terms:
+        raise ValueError("query must contain at least one word")
+    return " ".join(terms)
+
+def _search_statement(
+    query: str,
+    provider_id: Optional[int],
+    severity: Optional[str],
+    status: Optional[str]
+):
+    conditions = [literal_column("alerts_fts").op("MATCH")(_match_expression(query))]
+    if provider_id is not None:
+        conditions.append(Alert.provider_id == provider_id)
     if severity is not None:
-        query = query.filter(Alert.severity == severity)
+        conditions.append(Alert.severity == severity)
+    if status == "open":
+        conditions.append(Alert.resolved_at == None)
+    elif status == "resolved":
+        conditions.append(Alert.resolved_at != None)
+    elif status is not None:
+        raise ValueError("status must be 'open' or 'resolved'")
+    # The FTS table drives the join: SQLite walks its matches and looks each
+    # alert up by primary key, applying the filters as it goes.
+    return (
+        select(*_READ_COLUMNS)
+        .select_from(alerts_fts.join(Alert.__table__, Alert.id == alerts_fts.c.rowid))
+        .where(*conditions)
+    )
+
+def _encode_search_cursor(key: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def _decode_search_cursor(cursor: str, order: str) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if key[0] != order:
+            raise ValueError
+        if order == "relevance":
+            return [int(key[1]), float(key[2]), int(key[3])]
+        return [int(key[1])]
+    except (ValueError, TypeError, IndexError):
+        raise ValueError("Invalid cursor")
 
-    # Sorting: critical (3), warning (2), info (1)
-    # We can use a CASE statement for custom sort order or mapped values.
-    # A simple way in python is to fetch and sort, but doing it in SQL is better.
-    # Let's map severity to int for sorting using SQLAlchemy case
-    from sqlalchemy import case
+# Across shards (without a provider_id) a cursor holds one cursor per shard:
+# None to start from its first match, False once it has no more.
+def _decode_shard_cursors(cursor: Optional[str], shard_count: int) -> list:
+    if cursor is None:
+        return [None] * shard_count
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if key[0] != "shards" or len(key) != shard_count + 1:
+            raise ValueError
+        if not all(c is None or c is False or isinstance(c, str) for c in key[1:]):
+            raise ValueError
+        return key[1:]
+    except (ValueError, TypeError, IndexError):
+        raise ValueError("Invalid cursor")
 
-    severity_order = case(
-        (Alert.severity == 'critical', 3),
-        (Alert.severity == 'warning', 2),
-        (Alert.severity == 'info', 1),
-        else_=0
+def _route_search(arguments):
+    if arguments["provider_id"] is not None:
+        return shards.by_provider(arguments)
+    cursors = _decode_shard_cursors(arguments["cursor"], len(arguments["db"]))
+    return {shard: {"cursor": c} for shard, c in enumerate(cursors) if c is not False}
+
+def _search_hit_cursor(order: str, page: AlertSearchPage, cursor: Optional[str], hit: AlertSearchHit) -> str:
+    """The cursor continuing a shard's results after `hit`, one of its page's items."""
+    if order == "recent":
+        return _encode_search_cursor([order, hit.id])
+    # The rank window start is in the shard's cursors; a first page without
+    # a next one had fewer matches than the window, so it starts at 0
+    known = page.next_cursor or cursor
+    first_rowid = _decode_search_cursor(known, order)[0] if known else 0
+    return _encode_search_cursor([order, first_rowid, hit.score, hit.id])
+
+def _merge_search_pages(results: List[AlertSearchPage], arguments) -> AlertSearchPage:
+    order, limit = arguments["order"], arguments["limit"]
+    cursors = _decode_shard_cursors(arguments["cursor"], len(arguments["db"]))
+    active = [shard for shard, c in enumerate(cursors) if c is not False]
+    if order == "relevance":
+        # bm25 scores come from each shard's own statistics, so this is close
+        # to, not exactly, the ranking of one database holding every alert
+        key, reverse = (lambda item: (item[0].score, item[0].id)), False
+    else:
+        key, reverse = (lambda item: (item[0].created_at, item[0].id)), True
+    merged = heapq.merge(
+        *([(hit, shard) for hit in page.items] for shard, page in zip(active, results)),
+        key=key, reverse=reverse
     )
+    taken = list(itertools.islice(merged, limit))
+    for shard, page in zip(active, results):
+        count = sum(1 for _, s in taken if s == shard)
+        if count == len(page.items):
+            cursors[shard] = page.next_cursor or False
+        elif count:
+            cursors[shard] = _search_hit_cursor(order, page, cursors[shard], page.items[count - 1])
+    next_cursor = None
+    if any(c is not False for c in cursors):
+        next_cursor = _encode_search_cursor(["shards"] + cursors)
+    return AlertSearchPage(items=[hit for hit, _ in taken], next_cursor=next_cursor)
 
-    query = query.order_by(severity_order.desc(), Alert.created_at.desc())
+@result_cache.cached
+@shards.sharded(route=_route_search, merge=_merge_search_pages)
+def search_alerts(
+    db: Session,
+    query: str,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    order: str = "relevance",
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> AlertSearchPage:
+    """
+    Full-text search over alert messages and resolution notes.
+    Optional filters: by provider_id, by severity, by status ("open" or
+    "resolved"). Archived alerts are not searched.
 
-    alerts = query.all()
-    return [AlertRead.from_orm(a) for a in alerts]
+    order="relevance" ranks by bm25 (best first). Scoring costs time per
+    match, so only the newest SEARCH_RANK_WINDOW matches are ranked; for
+    broad queries use order="recent" (newest first), which reads only as
+    many matches as the page needs. Paginated like get_open_alerts_page:
+    pass a page's next_cursor to get the one after it.
+    """
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    if order not in ("relevance", "recent"):
+        raise ValueError("order must be 'relevance' or 'recent'")
+
+    statement = _search_statement(query, provider_id, severity, status)
+    rowid = alerts_fts.c.rowid
+    if order == "recent":
+        # Matches come out of the index in rowid order: no sort, and the
+        # scan stops once the page is full
+        statement = statement.add_columns(literal_column("NULL").label("score")).order_by(rowid.desc())
+        if cursor is not None:
+            statement = statement.where(rowid < _decode_search_cursor(cursor, order)[0])
+    else:
+        if cursor is not None:
+            first_rowid, last_score, last_id = _decode_search_cursor(cursor, order)
+        else:
+            # Lowest rowid among the newest SEARCH_RANK_WINDOW matches; later
+            # pages keep it (in the cursor) so the ranking stays the same
+            first_rowid = db.execute(
+                statement.with_only_columns(rowid).order_by(rowid.desc())
+                .offset(SEARCH_RANK_WINDOW - 1).limit(1)
+            ).scalar() or 0
+        score = func.bm25(literal_column("alerts_fts"))
+        statement = (
+            statement.add_columns(score.label("score"))
+            .where(rowid >= first_rowid)
+            .order_by(score, Alert.id)
+        )
+        if cursor is not None:
+            statement = statement.where(or_(
+                score > last_score, and_(score == last_score, Alert.id > last_id)
+            ))
+
+    rows = db.execute(statement.limit(limit + 1)).all()
+    items = [AlertSearchHit(**_alert_dict(row[:-1]), score=row[-1]) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = _encode_search_cursor(
+            [order, first_rowid, last.score, last.id] if order == "relevance" else [order, last.id]
+        )
+    return AlertSearchPage(items=items, next_cursor=next_cursor)
 
+def _resolve_statement(conditions, resolution_note: Optional[str]):
+    # Core UPDATE on the table (no ORM session synchronization) returning the
+    # full updated rows, so no follow-up SELECT is needed.
+    table = Alert.__table__
+    return (
+        update(table)
+        .where(*conditions)
+        .values(resolved_at=datetime.utcnow(), resolution_note=resolution_note)
+        .returning(*table.c)
+    )
+
+def _route_alert_id(arguments):
+    alert_id = arguments["alert_id"]
+    shard = shards.shard_for_alert(alert_id)
+    if not 0 <= shard < len(arguments["db"]):
+        raise ValueError(f"Alert with id {alert_id} not found")
+    return shard
+
+@shards.sharded(route=_route_alert_id)
 def mark_alert_resolved(
     db: Session,
     alert_id: int,
@@ -84,46 +882,498 @@ def mark_alert_resolved(
     Sets resolution_note.
     Returns the updated alert.
     """
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
-    if not alert:
-        raise ValueError(f"Alert with id {alert_id} not found")
+    row = db.execute(
+        _resolve_statement([Alert.id == alert_id, Alert.resolved_at == None], resolution_note)
+    ).first()
+    if row is not None:
+        counters.record_resolved(db, [(row.created_at, row.severity)])
+        rollups.record_resolved(db, [row])
+    else:
+        # Unknown id, or the alert was already resolved: in that case just
+        # overwrite the timestamp and note (it is already counted as resolved,
+        # but its resolve time changes).
+        previously_resolved_at = db.execute(
+            select(Alert.resolved_at).where(Alert.id == alert_id)
+        ).scalar()
+        if previously_resolved_at is None:
+            raise ValueError(f"Alert with id {alert_id} not found")
+        row = db.execute(_resolve_statement([Alert.id == alert_id], resolution_note)).first()
+        rollups.record_resolved(db, [row], previously_resolved_at=previously_resolved_at)
+
+    alert = AlertRead.from_orm(row)
+    _after_commit(db, result_cache.invalidate)
+    _publish_after_commit(db, "resolved", [alert])
+    _commit(db)
+    return alert
+
+def _route_resolve(arguments):
+    if arguments["provider_id"] is not None:
+        return shards.by_provider(arguments)
+    if arguments["alert_ids"]:
+        # Only the shards holding the ids, each with its own
+        parts: Dict[int, List[int]] = {}
+        for alert_id in arguments["alert_ids"]:
+            shard = shards.shard_for_alert(alert_id)
+            if 0 <= shard < len(arguments["db"]):
+                parts.setdefault(shard, []).append(alert_id)
+        return {shard: {"alert_ids": ids} for shard, ids in sorted(parts.items())}
+    return None
+
+def _merge_resolved(results: List[List[AlertRead]], arguments) -> List[AlertRead]:
+    return sorted(itertools.chain.from_iterable(results), key=_read_order_key, reverse=True)
+
+@shards.sharded(route=_route_resolve, merge=_merge_resolved)
+def mark_alerts_resolved(
+    db: Session,
+    alert_ids: Optional[List[int]] = None,
+    provider_id: Optional[int] = None,
+    credential_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    created_before: Optional[datetime] = None,
+    resolution_note: Optional[str] = None
+) -> List[AlertRead]:
+    """
+    Resolves every open alert matching alert_ids and/or the filters (all
+    given criteria must match) with a single UPDATE ... RETURNING.
+    At least one criterion is required so a bare call cannot resolve
+    everything. Returns the alerts that were resolved by this call, sorted
+    like get_open_alerts; already-resolved alerts are left untouched.
+    """
+    conditions = [Alert.resolved_at == None]
+    if alert_ids is not None:
+        if not alert_ids:
+            return []
+        conditions.append(Alert.id.in_(alert_ids))
+    if provider_id is not None:
+        conditions.append(Alert.provider_id == provider_id)
+    if credential_id is not None:
+        conditions.append(Alert.credential_id == credential_id)
+    if severity is not None:
+        conditions.append(Alert.severity_rank == SEVERITY_RANK.get(severity, 0))
+        conditions.append(Alert.severity == severity)
+    if created_before is not None:
+        conditions.append(Alert.created_at < created_before)
+    if len(conditions) == 1:
+        raise ValueError("Provide alert_ids or at least one filter")
 
-    alert.resolved_at = datetime.utcnow()
-    alert.resolution_note = resolution_note
-    db.commit()
-    db.refresh(alert)
-    return AlertRead.from_orm(alert)
+    rows = db.execute(_resolve_statement(conditions, resolution_note)).all()
+    rows.sort(key=lambda r: (r.severity_rank, r.created_at, r.id), reverse=True)
+    alerts = [AlertRead.from_orm(row) for row in rows]
+    if rows:
+        counters.record_resolved(db, [(row.created_at, row.severity) for row in rows])
+        rollups.record_resolved(db, rows)
+        _after_commit(db, result_cache.invalidate)
+        _publish_after_commit(db, "resolved", alerts)
+    _commit(db)
+    return alerts
 
+def _merge_summaries(results: List[AlertSummary], arguments) -> AlertSummary:
+    counts = dict.fromkeys(SEVERITY_RANK, 0)
+    for summary in results:
+        for severity, n in summary.by_severity.items():
+            counts[severity] = counts.get(severity, 0) + n
+    return AlertSummary(
+        window_days=arguments["window_days"],
+        total_alerts=sum(summary.total_alerts for summary in results),
+        by_severity=counts,
+        open_alerts=sum(summary.open_alerts for summary in results),
+        resolved_alerts=sum(summary.resolved_alerts for summary in results)
+    )
+
+@result_cache.cached
+@shards.sharded(route=lambda arguments: None, merge=_merge_summaries, once=("archive_db",))
 def summarize_alerts(
     db: Session,
-    window_days: Optional[int] = None
+    window_days: Optional[int] = None,
+    archive_db: Optional[Session] = None
 ) -> AlertSummary:
     """
     For a dashboard:
-      - Count alerts by severity.
+      - Count alerts by severity, and open vs resolved.
       - Optionally filter by alerts created in the last window_days.
+    Answered from the per-day alert_counters rows; only the partial first day
+    of a window is counted from the alerts table (via ix_alerts_created_window).
+    Alerts moved to the archive by retention are only counted when an
+    archive_db session is passed.
     """
-    query = db.query(Alert.severity, func.count(Alert.id))
+    counts = dict.fromkeys(SEVERITY_RANK, 0)
+    resolved = 0
+    cutoff = None
 
+    query = db.query(AlertCounter.severity, AlertCounter.total, AlertCounter.resolved)
     if window_days is not None:
         cutoff = datetime.utcnow() - timedelta(days=window_days)
-        query = query.filter(Alert.created_at >= cutoff)
+        next_day = cutoff.date() + timedelta(days=1)
+        query = query.filter(AlertCounter.day >= next_day)
 
-    query = query.group_by(Alert.severity)
-    results = query.all()
+        # The cutoff falls inside a day bucket; count that day's tail exactly.
+        partial = db.query(
+            *[func.count(Alert.id).filter(Alert.severity == s) for s in SEVERITY_RANK],
+            func.count(Alert.resolved_at)
+        ).filter(
+            Alert.created_at >= cutoff,
+            Alert.created_at < datetime.combine(next_day, time.min)
+        ).one()
+        for s, n in zip(SEVERITY_RANK, partial):
+            counts[s] += n
+        resolved += partial[-1]
 
-    # results is list of (severity, count)
-    counts = {row[0]: row[1] for row in results}
+    for severity, total, resolved_count in query:
+        counts[severity] = counts.get(severity, 0) + total
+        resolved += resolved_count
 
-    # Fill missing keys with 0
-    for s in ["info", "warning", "critical"]:
-        if s not in counts:
-            counts[s] = 0
+    if archive_db is not None:
+        # Archived alerts are all resolved
+        archived = archive_db.query(
+            *[func.count(ArchivedAlert.id).filter(ArchivedAlert.severity == s) for s in SEVERITY_RANK]
+        )
+        if cutoff is not None:
+            archived = archived.filter(ArchivedAlert.created_at >= cutoff)
+        for s, n in zip(SEVERITY_RANK, archived.one()):
+            counts[s] += n
+            resolved += n
 
     total = sum(counts.values())
 
     return AlertSummary(
         window_days=window_days,
         total_alerts=total,
-        by_severity=counts
+        by_severity=counts,
+        open_alerts=total - resolved,
+        resolved_alerts=resolved
+    )
+
+ANALYTICS_DIMENSIONS = ("severity", "provider_id", "channel", "day", "week", "status")
+MAX_ANALYTICS_GROUPS = 10000
+
+def _analytics_statement(group_by, dimensions, bucket, count, seconds, conditions):
+    """
+    (dimensions..., bucket, alert count, summed resolve seconds) per group and
+    bucket. "status" is not grouped on in SQL: it follows from the bucket.
+    """
+    columns = [dimensions[name].label(name) for name in group_by if name != "status"]
+    return (
+        select(*columns, bucket, count, seconds)
+        .where(*conditions)
+        .group_by(*columns, bucket)
+    )
+
+def _rollup_analytics_statement(group_by, since_day, provider_id, severity, channel):
+    dimensions = {
+        "severity": AlertRollup.severity,
+        "provider_id": AlertRollup.provider_id,
+        "channel": AlertRollup.channel,
+        # As stored ('YYYY-MM-DD'), like date() over the alerts table below
+        "day": type_coerce(AlertRollup.day, String),
+        # The Monday starting the week ('weekday 0' moves forward to Sunday)
+        "week": func.date(AlertRollup.day, "weekday 0", "-6 days"),
+    }
+    conditions = []
+    if since_day is not None:
+        conditions.append(AlertRollup.day >= since_day)
+    if provider_id is not None:
+        conditions.append(AlertRollup.provider_id == provider_id)
+    if severity is not None:
+        conditions.append(AlertRollup.severity == severity)
+    if channel is not None:
+        conditions.append(AlertRollup.channel == channel)
+    return _analytics_statement(
+        group_by, dimensions, AlertRollup.bucket,
+        func.sum(AlertRollup.alerts), func.sum(AlertRollup.resolve_seconds), conditions
+    )
+
+def _alerts_analytics_statement(model, group_by, start, end, provider_id, severity, channel):
+    """The same aggregate computed from alert rows (Alert or ArchivedAlert) created in [start, end)."""
+    dimensions = {
+        "severity": model.severity,
+        "provider_id": model.provider_id,
+        "channel": func.coalesce(model.channel, ""),
+        "day": func.date(model.created_at),
+        "week": func.date(model.created_at, "weekday 0", "-6 days"),
+    }
+    conditions = []
+    if start is not None:
+        conditions.append(model.created_at >= start)
+    if end is not None:
+        conditions.append(model.created_at < end)
+    if provider_id is not None:
+        conditions.append(model.provider_id == provider_id)
+    if severity is not None:
+        conditions.append(model.severity == severity)
+    if channel is not None:
+        conditions.append(func.coalesce(model.channel, "") == channel)
+    return _analytics_statement(
+        group_by, dimensions, rollups.resolve_bucket_expression(model).label("bucket"),
+        func.count(), func.sum(rollups.resolve_seconds_expression(model)), conditions
+    )
+
+def _histogram_percentile(q: float, counts: List[int]) -> float:
+    """Interpolates the q-th percentile linearly inside the bucket holding it."""
+    bounds = rollups.RESOLVE_TIME_BUCKETS
+    rank = q / 100 * sum(counts)
+    cumulative = 0
+    for i, n in enumerate(counts):
+        if n and cumulative + n >= rank:
+            low = bounds[i - 1] if i > 0 else 0
+            # The last bucket is open-ended: report its lower bound
+            high = bounds[i] if i < len(bounds) else low
+            return low + (high - low) * (rank - cumulative) / n
+        cumulative += n
+    return 0.0
+
+def alert_analytics(
+    db: Session,
+    group_by: Sequence[str] = (),
+    window_days: Optional[int] = None,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    channel: Optional[str] = None,
+    percentiles: Sequence[float] = (50, 90, 99),
+    archive_db: Optional[Session] = None,
+    limit: int = 1000
+) -> AlertAnalytics:
+    """
+    Alert counts (total, open, resolved) and time-to-resolve statistics,
+    grouped by any of ANALYTICS_DIMENSIONS and optionally filtered.
+
+    Answered with one aggregate query over the alert_rollups table, whose
+    size grows with days x providers rather than with alerts; only the
+    partial first day of a window is aggregated from the alerts table.
+    Percentiles are interpolated within rollups.RESOLVE_TIME_BUCKETS.
+    Alerts moved to the archive by retention are only included when an
+    archive_db session is passed (aggregated from the archive rows).
+    """
+    group_by = tuple(group_by)
+    unknown = [d for d in group_by if d not in ANALYTICS_DIMENSIONS]
+    if unknown:
+        raise ValueError(
+            f"Invalid group_by dimension(s) {', '.join(unknown)}; "
+            f"expected any of {', '.join(ANALYTICS_DIMENSIONS)}"
+        )
+    if len(set(group_by)) != len(group_by):
+        raise ValueError("group_by dimensions must not repeat")
+    if severity is not None and severity not in SEVERITY_RANK:
+        raise ValueError(f"Invalid severity: {severity}. Must be one of {list(SEVERITY_RANK)}")
+    if any(not 0 < q <= 100 for q in percentiles):
+        raise ValueError("percentiles must be between 0 (exclusive) and 100")
+    if not 1 <= limit <= MAX_ANALYTICS_GROUPS:
+        raise ValueError(f"limit must be between 1 and {MAX_ANALYTICS_GROUPS}")
+    return _alert_analytics(
+        db, group_by, window_days, provider_id, severity, channel,
+        tuple(percentiles), archive_db, limit
+    )
+
+def _merge_analytics_groups(results: List[Dict[tuple, list]], arguments) -> Dict[tuple, list]:
+    groups: Dict[tuple, list] = {}
+    for shard_groups in results:
+        for key, (open_count, resolved, seconds, counts) in shard_groups.items():
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [open_count, resolved, seconds, list(counts)]
+                continue
+            group[0] += open_count
+            group[1] += resolved
+            group[2] += seconds
+            group[3] = [a + b for a, b in zip(group[3], counts)]
+    return groups
+
+@shards.sharded(merge=_merge_analytics_groups, once=("archive_db",))
+def _analytics_groups(
+    db: Session,
+    group_by: Tuple[str, ...],
+    window_days: Optional[int],
+    provider_id: Optional[int],
+    severity: Optional[str],
+    channel: Optional[str],
+    archive_db: Optional[Session]
+) -> Dict[tuple, list]:
+    """key -> [open, resolved, summed resolve seconds, per-bucket resolved counts]"""
+    filters = (provider_id, severity, channel)
+    cutoff = None
+    statements = []
+    if window_days is None:
+        statements.append((db, _rollup_analytics_statement(group_by, None, *filters)))
+    else:
+        cutoff = datetime.utcnow() - timedelta(days=window_days)
+        next_day = cutoff.date() + timedelta(days=1)
+        statements.append((db, _rollup_analytics_statement(group_by, next_day, *filters)))
+        # The cutoff falls inside a day's rollup; aggregate that day's tail exactly
+        statements.append((db, _alerts_analytics_statement(
+            Alert, group_by, cutoff, datetime.combine(next_day, time.min), *filters
+        )))
+    if archive_db is not None:
+        statements.append((archive_db, _alerts_analytics_statement(
+            ArchivedAlert, group_by, cutoff, None, *filters
+        )))
+
+    buckets = len(rollups.RESOLVE_TIME_BUCKETS) + 1
+    groups: Dict[tuple, list] = {}
+    status_index = group_by.index("status") if "status" in group_by else None
+    dimensions = len(group_by) - (status_index is not None)
+    for session, stmt in statements:
+        for row in session.execute(stmt):
+            key = tuple(row[:dimensions])
+            bucket, count, seconds = row[dimensions:]
+            if status_index is not None:
+                status = "open" if bucket == rollups.OPEN_BUCKET else "resolved"
+                key = key[:status_index] + (status,) + key[status_index:]
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = [0, 0, 0.0, [0] * buckets]
+            if bucket == rollups.OPEN_BUCKET:
+                group[0] += count
+            else:
+                group[1] += count
+                group[2] += seconds or 0.0
+                group[3][bucket] += count
+    return groups
+
+@result_cache.cached
+def _alert_analytics(
+    db: Session,
+    group_by: Tuple[str, ...],
+    window_days: Optional[int],
+    provider_id: Optional[int],
+    severity: Optional[str],
+    channel: Optional[str],
+    percentiles: Tuple[float, ...],
+    archive_db: Optional[Session],
+    limit: int
+) -> AlertAnalytics:
+    groups = _analytics_groups(db, group_by, window_days, provider_id, severity, channel, archive_db)
+    if not group_by and not groups:
+        # No matching alerts; still report the single overall group
+        groups[()] = [0, 0, 0.0, [0] * (len(rollups.RESOLVE_TIME_BUCKETS) + 1)]
+
+    # Rollup rows emptied by resolves or archiving until retention prunes them
+    keys = [k for k, g in groups.items() if g[0] or g[1] or not group_by]
+    # None (a NULL column) sorts first, as in SQL
+    keys.sort(key=lambda k: tuple((v is not None, v) for v in k))
+    results = []
+    for key in keys[:limit]:
+        open_count, resolved, total_seconds, counts = groups[key]
+        time_to_resolve = AlertTimeToResolve(count=resolved)
+        if resolved:
+            time_to_resolve.mean_seconds = total_seconds / resolved
+            time_to_resolve.percentiles = {f"p{q:g}": _histogram_percentile(q, counts) for q in percentiles}
+        results.append(AlertAnalyticsGroup(
+            key=dict(zip(group_by, key)),
+            total_alerts=open_count + resolved,
+            open_alerts=open_count,
+            resolved_alerts=resolved,
+            time_to_resolve=time_to_resolve
+        ))
+
+    return AlertAnalytics(
+        group_by=list(group_by),
+        window_days=window_days,
+        groups=results,
+        truncated=len(keys) > limit
     )
+
+# The tools run_batch can run. Reads skip the result cache: inside a batch
+# they see its uncommitted writes, which must neither be served to others
+# nor be answered from before them.
+BATCH_TOOLS = {
+    "get_open_alerts": get_open_alert_rows.uncached,
+    "mark_alert_resolved": mark_alert_resolved,
+    "log_alert": log_alert,
+    "summarize_alerts": summarize_alerts.uncached,
+}
+
+def _run_batch_operation(db: Session, operation: BatchOperation):
+    fn = BATCH_TOOLS[operation.tool]
+    signature = inspect.signature(fn)
+    # Sessions are not arguments a caller can pass
+    unknown = [
+        name for name in operation.arguments
+        if name not in signature.parameters or name == "db" or name.endswith("_db")
+    ]
+    if unknown:
+        raise ValueError(f"Unknown arguments for {operation.tool}: {', '.join(sorted(unknown))}")
+    try:
+        signature.bind(db, **operation.arguments)
+    except TypeError as e:
+        raise ValueError(f"Invalid arguments for {operation.tool}: {e}")
+    value = fn(db, **operation.arguments)
+    return value.model_dump(mode='json') if isinstance(value, BaseModel) else value
+
+def _batch_sessions(db) -> List[Session]:
+    if isinstance(db, shards.ShardSet):
+        return [db.session(index) for index in range(len(db))]
+    return [db]
+
+def run_batch(
+    db: Session,
+    operations: List[Union[BatchOperation, Dict[str, Any]]],
+    atomic: bool = True
+) -> BatchResult:
+    """
+    Runs the operations (tool names from BATCH_TOOLS and their arguments)
+    in order on one writer session, in one transaction committed at the
+    end: reads see the writes before them, and cache invalidation and
+    change-feed events happen once, after the commit.
+
+    Each operation runs in a SAVEPOINT, so a failing one leaves no partial
+    writes. With atomic=True the first failure rolls back the whole batch
+    and stops it; otherwise the batch goes on and commits every operation
+    that succeeded. Failures are reported per operation, not raised.
+    """
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"A batch takes at most {MAX_BATCH_OPERATIONS} operations")
+
+    sessions = _batch_sessions(db)
+    results = []
+    try:
+        for session in sessions:
+            session.info["batch"] = True
+            # pysqlite only BEGINs before the first write, and releasing a
+            # SAVEPOINT taken outside a transaction would commit it
+            session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+        for index, item in enumerate(operations):
+            tool = item.get("tool") if isinstance(item, dict) else getattr(item, "tool", None)
+            # Callbacks of the operations so far, kept aside while one runs:
+            # ending its savepoint runs or drops the session's list
+            pending = [session.info.pop("after_commit", []) for session in sessions]
+            savepoints = [session.begin_nested() for session in sessions]
+            try:
+                if isinstance(item, BatchOperation):
+                    operation = item
+                elif isinstance(item, dict):
+                    operation = BatchOperation(**item)
+                else:
+                    raise ValueError("Each operation must be a JSON object")
+                value = _run_batch_operation(db, operation)
+            except (ValueError, SQLAlchemyError) as e:
+                for savepoint in savepoints:
+                    savepoint.rollback()
+                for session, callbacks in zip(sessions, pending):
+                    session.info["after_commit"] = callbacks
+                error = _format_validation_error(e) if isinstance(e, ValidationError) else str(e)
+                results.append(BatchOperationResult(index=index, tool=str(tool or ""), ok=False, error=error))
+                if atomic:
+                    db.rollback()
+                    return BatchResult(results=results, committed=False)
+                continue
+
+            # Releasing a savepoint runs after_commit listeners too, so the
+            # operation's callbacks are moved aside first
+            for session, callbacks in zip(sessions, pending):
+                for callback in session.info.pop("after_commit", []):
+                    if callback not in callbacks:
+                        callbacks.append(callback)
+            for savepoint in savepoints:
+                savepoint.commit()
+            for session, callbacks in zip(sessions, pending):
+                session.info["after_commit"] = callbacks
+            results.append(BatchOperationResult(index=index, tool=operation.tool, ok=True, result=value))
+
+        db.commit()
+        return BatchResult(results=results, committed=True)
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        for session in sessions:
+            session.info.pop("batch", None)
@@ -0,0 +1,378 @@
+"""
+Prometheus metrics for the alert server, exported on GET /metrics.
+
+Recorded:
+    - per tool and interface ("mcp", "http", "gradio"): calls, errors and a
+      latency histogram (instrumented() / MetricsMiddleware)
+    - per engine and statement type: execution time, rows returned and
+      rows affected (instrument_engine(), hooked into SQLAlchemy events)
+    - per pooled engine: time spent waiting to check out a connection, and
+      the current pool usage
+    - the read cache's hit/miss counters
+
+Kept dependency-free: a metric is a dict of label values to numbers behind
+a lock, so recording costs a dict lookup and an addition. Everything lives
+in this process; with several workers each one exports its own numbers.
+"""
+import bisect
+import functools
+import inspect
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; tools answer in well under a millisecond from cache and in
+# seconds for a full export
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *labels) -> int:
+        with self._lock:
+            entry = self._values.get(labels)
+            return entry[2] if entry else 0
+
+    def render(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted((labels, (list(e[0]), e[1], e[2])) for labels, e in self._values.items())
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        bounds = self.buckets + (float("inf"),)
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+        # Called at scrape time; each yields complete exposition lines
+        self._collectors: List[Callable[[], Iterator[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterator[str]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+TOOL_CALLS = registry.register(Counter(
+    "alert_tool_calls_total", "Tool calls, by tool and interface.", ("tool", "interface")
+))
+TOOL_ERRORS = registry.register(Counter(
+    "alert_tool_errors_total", "Tool calls that failed, by tool and interface.", ("tool", "interface")
+))
+TOOL_LATENCY = registry.register(Histogram(
+    "alert_tool_duration_seconds", "Tool call latency in seconds.", ("tool", "interface")
+))
+DB_STATEMENT_LATENCY = registry.register(Histogram(
+    "alert_db_statement_duration_seconds", "SQL statement execution time in seconds.", ("engine", "statement")
+))
+DB_ROWS_RETURNED = registry.register(Counter(
+    "alert_db_rows_returned_total", "Rows fetched from SQL statements.", ("engine", "statement")
+))
+DB_ROWS_AFFECTED = registry.register(Counter(
+    "alert_db_rows_affected_total", "Rows changed by INSERT, UPDATE and DELETE statements.", ("engine", "statement")
+))
+DB_ERRORS = registry.register(Counter(
+    "alert_db_errors_total", "SQL statements that raised.", ("engine", "statement")
+))
+DB_POOL_WAIT = registry.register(Histogram(
+    "alert_db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", ("engine",)
+))
+
+# --- Tools ---
+
+def _is_error_result(result: Any) -> bool:
+    # The wrappers report failures in their return value rather than raising
+    if isinstance(result, dict):
+        return "error" in result
+    if isinstance(result, list):
+        return bool(result) and isinstance(result[0], dict) and "error" in result[0]
+    if isinstance(result, str):
+        return result.startswith("Error")
+    return False
+
+def observe_tool(tool: str, interface: str, seconds: float, error: bool = False):
+    TOOL_CALLS.inc(tool, interface)
+    TOOL_LATENCY.observe(seconds, tool, interface)
+    if error:
+        TOOL_ERRORS.inc(tool, interface)
+
+def instrumented(interface: str, tool: Optional[str] = None):
+    """
+    Decorator recording calls, errors and latency of a tool function. An
+    exception, or an {"error": ...} / "Error: ..." result, counts as an error.
+    """
+    def decorator(fn: Callable) -> Callable:
+        name = tool or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                error = True
+                try:
+                    result = await fn(*args, **kwargs)
+                    error = _is_error_result(result)
+                    return result
+                finally:
+                    observe_tool(name, interface, time.perf_counter() - start, error)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = True
+            try:
+                result = fn(*args, **kwargs)
+                error = _is_error_result(result)
+                return result
+            finally:
+                observe_tool(name, interface, time.perf_counter() - start, error)
+
+        return wrapper
+    return decorator
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording every HTTP request as a call of the tool
+    named by its route template (e.g. "/api/alerts/{alert_id}/resolve").
+    Responses with a status of 400 or above count as errors.
+    """
+
+    def __init__(self, app, interface: str = "http"):
+        self.app = app
+        self.interface = interface
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Set by the router; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            observe_tool(route, self.interface, time.perf_counter() - start, status >= 400)
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+def metrics_route() -> Route:
+    """GET /metrics, for apps built outside main.py (the Gradio server)."""
+    return Route("/metrics", metrics_endpoint, methods=["GET"])
+
+# --- Database ---
+
+_STATEMENT_TYPES = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+@functools.lru_cache(maxsize=1024)
+def _statement_type(statement: str) -> str:
+    verb = statement.lstrip()[:6].upper()
+    return verb if verb in _STATEMENT_TYPES else "OTHER"
+
+class MetricsCursor(sqlite3.Cursor):
+    """Counts fetched rows against the labels set by before_cursor_execute."""
+    metrics_labels: Tuple[str, str] = ("unknown", "OTHER")
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            DB_ROWS_RETURNED.inc(*self.metrics_labels)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        if rows:
+            DB_ROWS_RETURNED.inc(*self.metrics_labels, amount=len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        if rows:
+            DB_ROWS_RETURNED.inc(*self.metrics_labels, amount=len(rows))
+        return rows
+
+class MetricsConnection(sqlite3.Connection):
+    """sqlite3 connection handing out MetricsCursors (connect_args factory)."""
+
+    def cursor(self, factory=MetricsCursor):
+        return super().cursor(factory)
+
+class TimedQueuePool(QueuePool):
+    """QueuePool recording how long each checkout waited for a connection."""
+    engine_name = "unknown"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start, self.engine_name)
+
+def timed_pool_class(engine_name: str):
+    # A subclass per engine, so the name survives Pool.recreate() on dispose
+    return type("TimedQueuePool", (TimedQueuePool,), {"engine_name": engine_name})
+
+def instrument_engine(engine, name: str):
+    """Records execution time, rows and errors of every statement run on engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        labels = (name, _statement_type(statement))
+        if isinstance(cursor, MetricsCursor):
+            cursor.metrics_labels = labels
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_start"].pop()
+        statement_type = _statement_type(statement)
+        DB_STATEMENT_LATENCY.observe(elapsed, name, statement_type)
+        if statement_type != "SELECT" and cursor.rowcount > 0:
+            DB_ROWS_AFFECTED.inc(name, statement_type, amount=cursor.rowcount)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("metrics_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        DB_ERRORS.inc(name, _statement_type(context.statement or ""))
+
+_pools: Dict[str, Any] = {}
+_pools_lock = threading.Lock()
+
+def register_pool(name: str, engine):
+    """Exports the pool usage of engine (a QueuePool) under `name`."""
+    if isinstance(engine.pool, QueuePool):
+        with _pools_lock:
+            _pools[name] = engine
+
+def _collect_pools() -> Iterator[str]:
+    with _pools_lock:
+        engines = sorted(_pools.items())
+    yield "# HELP alert_db_pool_checked_out Connections currently checked out of the pool."
+    yield "# TYPE alert_db_pool_checked_out gauge"
+    for name, engine in engines:
+        yield f'alert_db_pool_checked_out{{engine="{_escape(name)}"}} {engine.pool.checkedout()}'
+    yield "# HELP alert_db_pool_size Configured pool size."
+    yield "# TYPE alert_db_pool_size gauge"
+    for name, engine in engines:
+        yield f'alert_db_pool_size{{engine="{_escape(name)}"}} {engine.pool.size()}'
+
+def _collect_cache() -> Iterator[str]:
+    from .cache import result_cache
+
+    stats = result_cache.stats()
+    for key, kind, doc in (
+        ("hits", "counter", "Read cache hits."),
+        ("misses", "counter", "Read cache misses."),
+        ("evictions", "counter", "Read cache LRU evictions."),
+        ("invalidations", "counter", "Read cache invalidations (committed writes)."),
+        ("size", "gauge", "Entries in the read cache."),
+    ):
+        name = f"alert_cache_{key}_total" if kind == "counter" else f"alert_cache_{key}"
+        yield f"# HELP {name} {doc}"
+        yield f"# TYPE {name} {kind}"
+        yield f"{name} {stats[key]}"
+
+registry.add_collector(_collect_pools)
+registry.add_collector(_collect_cache)
@@ -1,8 +1,38 @@
-from datetime import datetime
+import hashlib
+from datetime import datetime, date
 from typing import Optional
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, DDL, Integer, Float, String, Text, Date, DateTime, ForeignKey, Index, column, event, table, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+# Sort order for open alerts: critical > warning > info
+SEVERITY_RANK = {"info": 1, "warning": 2, "critical": 3}
+
+def _severity_rank_default(context):
+    # Works for ORM flushes and Core (executemany) inserts alike
+    return SEVERITY_RANK.get(context.get_current_parameters()["severity"], 0)
+
+def alert_dedup_key(
+    provider_id: int,
+    credential_id: Optional[int],
+    severity: str,
+    window_days: int,
+    message: str
+) -> str:
+    """Identity of an alert for coalescing re-emitted duplicates."""
+    message_hash = hashlib.blake2b(message.encode(), digest_size=16).hexdigest()
+    raw = f"{provider_id}|{credential_id}|{severity}|{window_days}|{message_hash}"
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+def _dedup_key_default(context):
+    params = context.get_current_parameters()
+    return alert_dedup_key(
+        params["provider_id"],
+        params.get("credential_id"),
+        params["severity"],
+        params["window_days"],
+        params["message"],
+    )
+
 class Base(DeclarativeBase):
     pass
 
@@ -16,6 +46,8 @@ class Alert(Base):
     credential_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
     severity: Mapped[str] = mapped_column(String, nullable=False) # "info", "warning", "critical"
+    # Denormalized SEVERITY_RANK[severity] so ordering by severity can be served by an index
+    severity_rank: Mapped[int] = mapped_column(Integer, nullable=False, default=_severity_rank_default)
     window_days: Mapped[int] = mapped_column(Integer, nullable=False)
     message: Mapped[str] = mapped_column(Text, nullable=False)
     channel: Mapped[str] = mapped_column(String, default="ui")
@@ -24,5 +56,156 @@ class Alert(Base):
     resolved_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     resolution_note: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
+    # Deduplication: re-emitting an open alert bumps occurrence_count and
+    # last_seen_at on the existing row instead of inserting a new one.
+    dedup_key: Mapped[Optional[str]] = mapped_column(String, nullable=True, default=_dedup_key_default)
+    occurrence_count: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default=text("1"))
+    last_seen_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # get_open_alerts: partial indexes over open alerts only, in the
+        # (severity_rank, created_at, id) order the tool returns them in.
+        Index(
+            "ix_alerts_open_rank",
+            "severity_rank", "created_at", "id",
+            sqlite_where=text("resolved_at IS NULL"),
+        ),
+        Index(
+            "ix_alerts_open_provider_rank",
+            "provider_id", "severity_rank", "created_at", "id",
+            sqlite_where=text("resolved_at IS NULL"),
+        ),
+        # get_open_alert_rows_page sorted by age ("newest", "oldest")
+        Index(
+            "ix_alerts_open_created",
+            "created_at", "id",
+            sqlite_where=text("resolved_at IS NULL"),
+        ),
+        # At most one open alert per dedup key; the ON CONFLICT target of log_alert
+        Index(
+            "ux_alerts_open_dedup",
+            "dedup_key",
+            unique=True,
+            sqlite_where=text("resolved_at IS NULL"),
+        ),
+        # Retention: resolved alerts in resolved_at order
+        Index(
+            "ix_alerts_resolved_at",
+            "resolved_at",
+            sqlite_where=text("resolved_at IS NOT NULL"),
+        ),
+        # mark_alerts_resolved by credential
+        Index(
+            "ix_alerts_open_credential",
+            "credential_id",
+            sqlite_where=text("resolved_at IS NULL"),
+        ),
+        # summarize_alerts: covering index for the partial first day of a window
+        Index("ix_alerts_created_window", "created_at", "severity", "resolved_at"),
+        # Ids are never reused, even once the newest alerts were archived, and
+        # each shard's ids start in its own range (see db.init_db)
+        {"sqlite_autoincrement": True},
+    )
+
     def __repr__(self):
         return f"<Alert(id={self.id}, severity='{self.severity}', message='{self.message}')>"
+
+class AlertCounter(Base):
+    """
+    Alert counts per creation day and severity, kept up to date by the write
+    paths in mcp_tools in the same transaction as the alert rows themselves.
+    summarize_alerts reads these instead of counting the alerts table.
+    """
+    __tablename__ = "alert_counters"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    severity: Mapped[str] = mapped_column(String, primary_key=True)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    resolved: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<AlertCounter(day={self.day}, severity='{self.severity}', total={self.total}, resolved={self.resolved})>"
+
+class AlertRollup(Base):
+    """
+    Alert counts per creation day, provider, severity, channel and
+    time-to-resolve bucket (rollups.RESOLVE_TIME_BUCKETS; -1 = still open),
+    with the summed resolve time. Maintained by the write paths like
+    AlertCounter; alert_analytics reads these instead of the alerts table.
+    """
+    __tablename__ = "alert_rollups"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    provider_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    severity: Mapped[str] = mapped_column(String, primary_key=True)
+    # Alerts without a channel are rolled up under ""
+    channel: Mapped[str] = mapped_column(String, primary_key=True)
+    bucket: Mapped[int] = mapped_column(Integer, primary_key=True)
+    alerts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    resolve_seconds: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return (
+            f"<AlertRollup(day={self.day}, provider_id={self.provider_id}, severity='{self.severity}', "
+            f"channel='{self.channel}', bucket={self.bucket}, alerts={self.alerts})>"
+        )
+
+# Full-text index over alert messages and resolution notes (search_alerts).
+# An FTS5 external-content table: it stores only the index and reads the
+# text back from alerts, by rowid = alerts.id. The triggers keep it in step
+# with every insert, resolve (an update of resolution_note) and archive (a
+# delete); coalescing a duplicate touches neither column, so it costs nothing.
+ALERT_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS alerts_fts USING fts5("
+    "message, resolution_note, content='alerts', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS alerts_fts_insert AFTER INSERT ON alerts BEGIN "
+    "INSERT INTO alerts_fts(rowid, message, resolution_note) "
+    "VALUES (new.id, new.message, new.resolution_note); END",
+    "CREATE TRIGGER IF NOT EXISTS alerts_fts_delete AFTER DELETE ON alerts BEGIN "
+    "INSERT INTO alerts_fts(alerts_fts, rowid, message, resolution_note) "
+    "VALUES ('delete', old.id, old.message, old.resolution_note); END",
+    "CREATE TRIGGER IF NOT EXISTS alerts_fts_update AFTER UPDATE OF message, resolution_note ON alerts BEGIN "
+    "INSERT INTO alerts_fts(alerts_fts, rowid, message, resolution_note) "
+    "VALUES ('delete', old.id, old.message, old.resolution_note); "
+    "INSERT INTO alerts_fts(rowid, message, resolution_note) "
+    "VALUES (new.id, new.message, new.resolution_note); END",
+)
+
+# Re-indexes every alert; for databases whose alerts predate the index
+ALERT_SEARCH_REBUILD = "INSERT INTO alerts_fts(alerts_fts) VALUES ('rebuild')"
+
+# For queries; create_all does not know about virtual tables, so the DDL
+# above is attached to the alerts table instead.
+alerts_fts = table("alerts_fts", column("rowid", Integer), column("message"), column("resolution_note"))
+
+for _statement in ALERT_SEARCH_DDL:
+    event.listen(Alert.__table__, "after_create", DDL(_statement))
+# Dropping alerts drops its triggers, but not the virtual table
+event.listen(Alert.__table__, "before_drop", DDL("DROP TABLE IF EXISTS alerts_fts"))
+
+class ArchiveBase(DeclarativeBase):
+    """Metadata for the archive database (a separate SQLite file, see retention.py)."""
+    pass
+
+class ArchivedAlert(ArchiveBase):
+    """A resolved alert moved out of the hot alerts table by the retention job."""
+    __tablename__ = "alerts_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    provider_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    credential_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    severity: Mapped[str] = mapped_column(String, nullable=False)
+    severity_rank: Mapped[int] = mapped_column(Integer, nullable=False)
+    window_days: Mapped[int] = mapped_column(Integer, nullable=False)
+    message: Mapped[str] = mapped_column(Text, nullable=False)
+    channel: Mapped[str] = mapped_column(String, default="ui")
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    resolved_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    resolution_note: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    dedup_key: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    occurrence_count: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    last_seen_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ArchivedAlert(id={self.id}, severity='{self.severity}', message='{self.message}')>"
@@ -0,0 +1,226 @@
+"""
+Retention: moves resolved alerts out of the hot alerts table.
+
+Resolved alerts older than ALERT_RETENTION_DAYS are copied to the archive
+database (db.ARCHIVE_DB_PATH, a separate SQLite file) and deleted from the
+hot one in batches of ALERT_ARCHIVE_BATCH_SIZE, each batch in its own short
+write transaction so ingest never waits long for the writer. compact() then
+checkpoints the WAL and VACUUMs so the hot file actually shrinks.
+
+Run it once from the command line:
+
+    python -m src.alert_mcp.retention archive
+    python -m src.alert_mcp.retention compact
+    python -m src.alert_mcp.retention run        # archive, then compact
+
+or periodically in-process by setting ALERT_RETENTION_INTERVAL_SECONDS
+(see start_worker).
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from . import counters, rollups
+from .cache import result_cache
+from .models import Alert, ArchivedAlert
+
+logger = logging.getLogger(__name__)
+
+ALERT_RETENTION_DAYS = int(os.getenv("ALERT_RETENTION_DAYS", "90"))
+ALERT_ARCHIVE_BATCH_SIZE = int(os.getenv("ALERT_ARCHIVE_BATCH_SIZE", "500"))
+# 0 disables the in-process worker
+ALERT_RETENTION_INTERVAL_SECONDS = int(os.getenv("ALERT_RETENTION_INTERVAL_SECONDS", "0"))
+# VACUUM rewrites the whole file while holding the write lock, so scheduled
+# runs only do it once this share of the file is free pages.
+ALERT_VACUUM_FREE_RATIO = float(os.getenv("ALERT_VACUUM_FREE_RATIO", "0.2"))
+
+def archive_resolved_alerts(
+    db: Session,
+    archive_db: Session,
+    older_than_days: int = ALERT_RETENTION_DAYS,
+    batch_size: int = ALERT_ARCHIVE_BATCH_SIZE,
+    max_batches: Optional[int] = None
+) -> int:
+    """
+    Moves alerts resolved more than older_than_days ago into the archive.
+    Each batch is first committed to the archive and then deleted from the
+    hot table, together with the matching summary counter decrements. An
+    alert the archive already holds unchanged (a batch retried after a
+    crash) is only deleted. One whose id the archive holds for a different
+    alert, which older databases could produce by reusing ids, stays in the
+    hot table and is logged.
+    Returns the number of alerts archived.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    table = Alert.__table__
+    archive_table = ArchivedAlert.__table__
+    archived = 0
+    batches = 0
+    conflicting = set()
+    while max_batches is None or batches < max_batches:
+        query = (
+            select(*table.c)
+            .where(Alert.resolved_at != None, Alert.resolved_at < cutoff)
+            .order_by(Alert.resolved_at)
+            .limit(batch_size)
+        )
+        if conflicting:
+            query = query.where(Alert.id.not_in(conflicting))
+        rows = db.execute(query).all()
+        # End the read transaction before the archive write
+        db.rollback()
+        if not rows:
+            break
+
+        # The archive's copies, in the same columns as the hot rows
+        copies = {
+            copy.id: tuple(copy) for copy in archive_db.execute(
+                select(*(archive_table.c[column.name] for column in table.c))
+                .where(ArchivedAlert.id.in_([row.id for row in rows]))
+            )
+        }
+        moved = []
+        for row in rows:
+            if copies.get(row.id, tuple(row)) == tuple(row):
+                moved.append(row)
+            else:
+                conflicting.add(row.id)
+                logger.warning(f"Not archiving alert {row.id}: the archive holds a different alert with that id")
+        new_rows = [row for row in moved if row.id not in copies]
+        if new_rows:
+            now = datetime.utcnow()
+            # A plain INSERT, so an id archived meanwhile fails the batch
+            # instead of being skipped and then deleted
+            archive_db.execute(insert(ArchivedAlert), [dict(row._mapping, archived_at=now) for row in new_rows])
+        archive_db.commit()
+
+        if moved:
+            db.execute(delete(Alert).where(Alert.id.in_([row.id for row in moved])))
+            counters.record_archived(db, [(row.created_at, row.severity) for row in moved])
+            rollups.record_archived(db, moved)
+            db.commit()
+            result_cache.invalidate()
+
+        archived += len(moved)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+    return archived
+
+def compact(engine, vacuum: Optional[bool] = None) -> bool:
+    """
+    Refreshes planner statistics, VACUUMs the database file to return freed
+    pages to the OS and truncates the WAL. With vacuum=None the VACUUM only
+    happens when at least ALERT_VACUUM_FREE_RATIO of the pages are free.
+    Returns whether it vacuumed.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("PRAGMA optimize")
+        if vacuum is None:
+            pages = conn.exec_driver_sql("PRAGMA page_count").scalar()
+            free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            vacuum = bool(pages) and free / pages >= ALERT_VACUUM_FREE_RATIO
+        if vacuum:
+            conn.exec_driver_sql("VACUUM")
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return vacuum
+
+def run_once(
+    older_than_days: int = ALERT_RETENTION_DAYS,
+    batch_size: int = ALERT_ARCHIVE_BATCH_SIZE,
+    vacuum: Optional[bool] = None
+) -> int:
+    """
+    Archive, prune empty analytics rollups, then compact the hot database if
+    anything was archived. Each shard in turn, into the shared archive.
+    """
+    from .db import ArchiveSessionLocal, shard_engines, shard_sessions
+
+    total = 0
+    for session_factory, engine in zip(shard_sessions, shard_engines):
+        db = session_factory()
+        archive_db = ArchiveSessionLocal()
+        try:
+            archived = archive_resolved_alerts(
+                db, archive_db, older_than_days=older_than_days, batch_size=batch_size
+            )
+            rollups.prune(db)
+            db.commit()
+        finally:
+            db.close()
+            archive_db.close()
+        if archived:
+            compact(engine, vacuum=vacuum)
+        total += archived
+    return total
+
+class RetentionWorker(threading.Thread):
+    """Daemon thread running run_once every `interval` seconds until stopped."""
+
+    def __init__(self, interval: float = ALERT_RETENTION_INTERVAL_SECONDS):
+        super().__init__(name="alert-retention", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                archived = run_once()
+                if archived:
+                    logger.info(f"Archived {archived} resolved alerts")
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}", exc_info=True)
+
+    def stop(self):
+        self._stop_event.set()
+
+def start_worker() -> Optional[RetentionWorker]:
+    """Starts the retention worker if ALERT_RETENTION_INTERVAL_SECONDS is set."""
+    if ALERT_RETENTION_INTERVAL_SECONDS <= 0:
+        return None
+    worker = RetentionWorker()
+    worker.start()
+    return worker
+
+def main(argv=None) -> int:
+    from .db import ArchiveSessionLocal, init_db, init_archive_db, shard_engines, shard_sessions
+
+    parser = argparse.ArgumentParser(description="Archive old resolved alerts and compact the database.")
+    parser.add_argument("command", choices=["archive", "compact", "run"])
+    parser.add_argument("--older-than-days", type=int, default=ALERT_RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ALERT_ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--vacuum", choices=["auto", "always", "never"], default="always")
+    args = parser.parse_args(argv)
+
+    init_db()
+    init_archive_db()
+    if args.command in ("archive", "run"):
+        archived = 0
+        for session_factory in shard_sessions:
+            db = session_factory()
+            archive_db = ArchiveSessionLocal()
+            try:
+                archived += archive_resolved_alerts(
+                    db, archive_db, older_than_days=args.older_than_days, batch_size=args.batch_size
+                )
+            finally:
+                db.close()
+                archive_db.close()
+        print(f"Archived {archived} resolved alerts")
+    if args.command in ("compact", "run"):
+        vacuum = {"auto": None, "always": True, "never": False}[args.vacuum]
+        for index, engine in enumerate(shard_engines):
+            vacuumed = compact(engine, vacuum=vacuum)
+            shard = f" shard {index}" if len(shard_engines) > 1 else ""
+            print(f"Compacted database{shard}" + (" (vacuumed)" if vacuumed else ""))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
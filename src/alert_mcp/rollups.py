@@ -0,0 +1,235 @@
+"""
+Incrementally maintained analytics rollups (see models.AlertRollup).
+
+Like the summary counters, the write paths call record_created,
+record_resolved and record_archived before committing, so the rollups change
+atomically with the alerts they describe. rebuild() and verify() recompute
+them from the alerts table:
+
+    python -m src.alert_mcp.rollups verify
+    python -m src.alert_mcp.rollups rebuild
+
+SQLite date functions work in whole milliseconds, so resolve times are
+computed from millisecond-rounded timestamps in Python too: the write paths
+and SQL (rebuilds, partial days) then agree on every bucket.
+"""
+import argparse
+import bisect
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, literal, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .cache import result_cache
+from .models import Alert, AlertRollup
+
+# Upper bounds in seconds of the time-to-resolve buckets (1 minute to 30
+# days); bucket len(RESOLVE_TIME_BUCKETS) takes everything slower.
+RESOLVE_TIME_BUCKETS = (
+    60, 300, 900, 1800, 3600, 7200, 14400, 28800, 43200,
+    86400, 172800, 259200, 604800, 1209600, 2592000,
+)
+OPEN_BUCKET = -1
+
+RollupKey = Tuple[date, int, str, str, int]
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+def _epoch_ms(value: datetime) -> int:
+    # Rounded half up, as SQLite does when parsing fractional seconds
+    return ((value - _EPOCH) // _MICROSECOND + 500) // 1000
+
+def resolve_seconds(created_at: datetime, resolved_at: datetime) -> float:
+    return (_epoch_ms(resolved_at) - _epoch_ms(created_at)) / 1000
+
+def resolve_bucket(created_at: datetime, resolved_at: Optional[datetime]) -> int:
+    if resolved_at is None:
+        return OPEN_BUCKET
+    return bisect.bisect_left(RESOLVE_TIME_BUCKETS, resolve_seconds(created_at, resolved_at))
+
+def resolve_seconds_expression(model):
+    """SQL equivalent of resolve_seconds() (NULL while open)."""
+    # Whole milliseconds; rounding drops the julianday() float error
+    return func.round((func.julianday(model.resolved_at) - func.julianday(model.created_at)) * 86400, 3)
+
+def _bucket_search(seconds, low: int, high: int):
+    # Nested CASEs bisecting buckets low..high, so each row evaluates the
+    # (not cheap) seconds expression about log2(buckets) times, not up to 16
+    if low == high:
+        return literal(low)
+    middle = (low + high) // 2
+    return case(
+        (seconds <= RESOLVE_TIME_BUCKETS[middle], _bucket_search(seconds, low, middle)),
+        else_=_bucket_search(seconds, middle + 1, high)
+    )
+
+def resolve_bucket_expression(model):
+    """SQL equivalent of resolve_bucket()."""
+    return case(
+        (model.resolved_at.is_(None), OPEN_BUCKET),
+        else_=_bucket_search(resolve_seconds_expression(model), 0, len(RESOLVE_TIME_BUCKETS))
+    )
+
+def _key(row, resolved_at: Optional[datetime]) -> RollupKey:
+    return (
+        row.created_at.date(), row.provider_id, row.severity, row.channel or "",
+        resolve_bucket(row.created_at, resolved_at),
+    )
+
+def _bump_statement():
+    stmt = sqlite_insert(AlertRollup)
+    return stmt.on_conflict_do_update(
+        index_elements=[
+            AlertRollup.day, AlertRollup.provider_id, AlertRollup.severity,
+            AlertRollup.channel, AlertRollup.bucket,
+        ],
+        set_={
+            "alerts": AlertRollup.alerts + stmt.excluded.alerts,
+            "resolve_seconds": AlertRollup.resolve_seconds + stmt.excluded.resolve_seconds,
+        }
+    )
+
+def bump(db: Session, deltas: Dict[RollupKey, List[float]]):
+    """
+    Adds (alerts, resolve_seconds) deltas to the rollups. One statement with
+    a parameter set per key, so its compiled form is cached across calls.
+    Buckets that drop to zero are left for prune() to delete.
+    """
+    params = [
+        {
+            "day": key[0], "provider_id": key[1], "severity": key[2], "channel": key[3], "bucket": key[4],
+            "alerts": alerts, "resolve_seconds": seconds,
+        }
+        for key, (alerts, seconds) in sorted(deltas.items()) if alerts or seconds
+    ]
+    if params:
+        db.execute(_bump_statement(), params)
+
+def prune(db: Session) -> int:
+    """
+    Deletes empty rollup rows (every alert of an open bucket got resolved, or
+    all of a bucket was archived) so they do not slow down analytics scans.
+    Run by the retention job; the caller commits. Returns the rows deleted.
+    """
+    return db.execute(delete(AlertRollup).where(AlertRollup.alerts == 0)).rowcount
+
+def _add(deltas, key: RollupKey, alerts: int, seconds: float):
+    delta = deltas.setdefault(key, [0, 0.0])
+    delta[0] += alerts
+    delta[1] += seconds
+
+def record_created(db: Session, rows: Iterable):
+    """rows: newly inserted alert rows (created_at, provider_id, severity, channel)."""
+    deltas = {}
+    for row in rows:
+        _add(deltas, _key(row, None), 1, 0.0)
+    bump(db, deltas)
+
+def record_resolved(db: Session, rows: Iterable, previously_resolved_at: Optional[datetime] = None):
+    """
+    rows: alert rows as updated by a resolve. Each moves from the open bucket
+    (or, for a re-resolve, from its previous resolve time's bucket) to the
+    bucket of its new resolved_at.
+    """
+    deltas = {}
+    for row in rows:
+        if previously_resolved_at is None:
+            _add(deltas, _key(row, None), -1, 0.0)
+        else:
+            _add(
+                deltas, _key(row, previously_resolved_at),
+                -1, -resolve_seconds(row.created_at, previously_resolved_at)
+            )
+        _add(deltas, _key(row, row.resolved_at), 1, resolve_seconds(row.created_at, row.resolved_at))
+    bump(db, deltas)
+
+def record_archived(db: Session, rows: Iterable):
+    """rows: resolved alert rows moved out of the alerts table."""
+    deltas = {}
+    for row in rows:
+        _add(deltas, _key(row, row.resolved_at), -1, -resolve_seconds(row.created_at, row.resolved_at))
+    bump(db, deltas)
+
+def _expected_rollups_query():
+    """(day, provider_id, severity, channel, bucket, alerts, resolve_seconds) from the alerts table."""
+    day = func.date(Alert.created_at)
+    channel = func.coalesce(Alert.channel, "")
+    bucket = resolve_bucket_expression(Alert)
+    return select(
+        day, Alert.provider_id, Alert.severity, channel, bucket,
+        func.count(), func.coalesce(func.sum(resolve_seconds_expression(Alert)), 0.0)
+    ).group_by(day, Alert.provider_id, Alert.severity, channel, bucket)
+
+def _expected_rollups(db: Session) -> Dict[RollupKey, List[float]]:
+    return {
+        (date.fromisoformat(d), provider_id, severity, channel, b): [alerts, seconds]
+        for d, provider_id, severity, channel, b, alerts, seconds in db.execute(_expected_rollups_query())
+    }
+
+def rebuild(db: Session) -> int:
+    """Recomputes every rollup from the alerts table. Returns the number of rollup rows."""
+    db.execute(delete(AlertRollup))
+    inserted = db.execute(sqlite_insert(AlertRollup).from_select(
+        ["day", "provider_id", "severity", "channel", "bucket", "alerts", "resolve_seconds"],
+        _expected_rollups_query()
+    )).rowcount
+    db.commit()
+    result_cache.invalidate()
+    return inserted
+
+def verify(db: Session) -> List[str]:
+    """Compares the rollups with the alerts table. Returns one line per drifted rollup row."""
+    expected = _expected_rollups(db)
+    actual = {
+        (day, provider_id, severity, channel, bucket): (alerts, seconds)
+        for day, provider_id, severity, channel, bucket, alerts, seconds in db.execute(select(
+            AlertRollup.day, AlertRollup.provider_id, AlertRollup.severity, AlertRollup.channel,
+            AlertRollup.bucket, AlertRollup.alerts, AlertRollup.resolve_seconds
+        ))
+    }
+    drift = []
+    for key in sorted(set(expected) | set(actual)):
+        want = expected.get(key, (0, 0.0))
+        have = actual.get(key, (0, 0.0))
+        # Summed floats may differ in the last digits, and a bucket emptied
+        # by deltas can keep a residue far below the millisecond resolution
+        if want[0] != have[0] or abs(want[1] - have[1]) > max(1e-6, 1e-9 * abs(want[1])):
+            day, provider_id, severity, channel, bucket = key
+            drift.append(
+                f"{day} provider={provider_id} {severity} channel={channel!r} bucket={bucket}: "
+                f"rollups alerts={have[0]} seconds={have[1]:g}, alerts table alerts={want[0]} seconds={want[1]:g}"
+            )
+    return drift
+
+def main(argv=None) -> int:
+    from .db import init_db, shard_sessions
+
+    parser = argparse.ArgumentParser(description="Verify or rebuild the alert analytics rollups.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args(argv)
+
+    init_db()
+    # Every shard has its own rollups
+    drifted = 0
+    for session_factory in shard_sessions:
+        db = session_factory()
+        try:
+            if args.command == "rebuild":
+                print(f"Rebuilt {rebuild(db)} rollup rows")
+                continue
+            drift = verify(db)
+            for line in drift:
+                print(line)
+            drifted += len(drift)
+        finally:
+            db.close()
+    if args.command == "verify":
+        print("Rollups OK" if not drifted else f"{drifted} drifted rollup rows")
+    return 1 if drifted else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
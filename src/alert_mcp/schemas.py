@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, Literal
+from typing import Any, Optional, Literal, List, Dict, Union
 from pydantic import BaseModel, Field, validator
 
 class AlertBase(BaseModel):
@@ -18,11 +18,109 @@ class AlertRead(AlertBase):
     created_at: datetime
     resolved_at: Optional[datetime] = None
     resolution_note: Optional[str] = None
+    occurrence_count: int = 1
+    last_seen_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+class AlertPage(BaseModel):
+    items: List[AlertRead]
+    # Opaque keyset cursor for the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+class AlertSearchHit(AlertRead):
+    # bm25 relevance of the match, lower is better; None when ordered by recency
+    score: Optional[float] = None
+
+class AlertSearchPage(BaseModel):
+    items: List[AlertSearchHit]
+    # Opaque cursor for the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+class AlertBulkResolve(BaseModel):
+    # Either explicit ids, or filters selecting open alerts; combined with AND
+    alert_ids: Optional[List[int]] = None
+    provider_id: Optional[int] = None
+    credential_id: Optional[int] = None
+    severity: Optional[Literal["info", "warning", "critical"]] = None
+    created_before: Optional[datetime] = None
+    resolution_note: Optional[str] = None
+
 class AlertSummary(BaseModel):
     window_days: Optional[int]
     total_alerts: int
     by_severity: dict[str, int]
+    open_alerts: int = 0
+    resolved_alerts: int = 0
+
+class AlertBulkError(BaseModel):
+    index: int
+    error: str
+
+class AlertBulkResult(BaseModel):
+    # Alert id for each valid item, in input order. Items that duplicate an
+    # open alert report the id of that alert.
+    created_ids: List[int]
+    errors: List[AlertBulkError]
+    # How many valid items were coalesced into an already open alert
+    coalesced: int = 0
+
+AnalyticsDimension = Literal["severity", "provider_id", "channel", "day", "week", "status"]
+
+class AlertAnalyticsQuery(BaseModel):
+    # Dimensions to group by; none gives a single overall group
+    group_by: List[AnalyticsDimension] = []
+    window_days: Optional[int] = None
+    provider_id: Optional[int] = None
+    severity: Optional[Literal["info", "warning", "critical"]] = None
+    channel: Optional[str] = None
+    # Time-to-resolve percentiles to report, in (0, 100]
+    percentiles: List[float] = [50, 90, 99]
+    include_archive: bool = False
+    limit: int = 1000
+
+class AlertTimeToResolve(BaseModel):
+    # Over resolved alerts only, in seconds. Percentiles ("p50", ...) are
+    # estimated from a histogram of resolve times (see rollups.py).
+    count: int
+    mean_seconds: Optional[float] = None
+    percentiles: Dict[str, float] = {}
+
+class AlertAnalyticsGroup(BaseModel):
+    # Dimension name -> value; day and week are ISO dates (week = its Monday)
+    key: Dict[str, Union[int, str, None]]
+    total_alerts: int
+    open_alerts: int
+    resolved_alerts: int
+    time_to_resolve: AlertTimeToResolve
+
+class AlertAnalytics(BaseModel):
+    group_by: List[str]
+    window_days: Optional[int]
+    groups: List[AlertAnalyticsGroup]
+    # True when there were more than `limit` groups
+    truncated: bool = False
+
+BatchTool = Literal["get_open_alerts", "mark_alert_resolved", "log_alert", "summarize_alerts"]
+
+class BatchOperation(BaseModel):
+    tool: BatchTool
+    # The tool's arguments, as for the tool itself
+    arguments: Dict[str, Any] = {}
+
+class BatchOperationResult(BaseModel):
+    index: int
+    tool: str
+    ok: bool
+    # The tool's result as JSON; None when the operation failed
+    result: Any = None
+    error: Optional[str] = None
+
+class BatchResult(BaseModel):
+    # One per operation that ran, in order. An atomic batch stops at the
+    # first failure, which is then the last result.
+    results: List[BatchOperationResult]
+    # False when an atomic batch was rolled back; results before the
+    # failure describe writes that were undone
+    committed: bool
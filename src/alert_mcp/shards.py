@@ -0,0 +1,149 @@
+"""
+Optional provider-sharded storage.
+
+With DB_SHARDS=N (N > 1) alerts are spread over N SQLite files by a hash of
+their provider_id (see db.shard_path). Every shard has its own writer
+connection, so writes for providers on different shards commit in parallel
+instead of queueing for a single database lock. Alert ids come from
+disjoint ranges, shard i's starting above i * ALERT_ID_STRIDE, so an id
+alone names its shard.
+
+get_db() and get_read_db() then yield a ShardSet instead of a Session. The
+mcp_tools functions wrapped with @sharded accept either: given a ShardSet
+they run on the single shard their arguments pin down (a provider_id, an
+alert id) or on every shard in parallel on a thread pool, merging the
+per-shard results. A call spanning shards commits once per shard, so it is
+atomic within each shard but not across them.
+
+Alerts stay where they were written: changing DB_SHARDS on an existing
+database does not move them.
+"""
+import functools
+import hashlib
+import inspect
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+DB_SHARDS = int(os.getenv("DB_SHARDS", "1"))
+# Ids of shard i are i * ALERT_ID_STRIDE + 1, + 2, ...
+ALERT_ID_STRIDE = 2 ** 40
+
+def shard_for_provider(provider_id: int, shards: int = DB_SHARDS) -> int:
+    # Hashed so that neighbouring (and the busiest, lowest) provider ids spread out
+    digest = hashlib.blake2b(str(provider_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+def shard_for_alert(alert_id: int) -> int:
+    return (alert_id - 1) // ALERT_ID_STRIDE
+
+class ShardSet:
+    """
+    Stands in for a Session when the database is sharded: one session per
+    shard, opened on first use. commit(), rollback() and close() apply to
+    every session opened so far.
+    """
+
+    def __init__(self, session_factories: Sequence[Callable[[], Session]]):
+        self._factories = list(session_factories)
+        self._sessions: Dict[int, Session] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._factories)
+
+    def session(self, shard: int) -> Session:
+        with self._lock:
+            session = self._sessions.get(shard)
+            if session is None:
+                session = self._sessions[shard] = self._factories[shard]()
+            return session
+
+    def commit(self):
+        for session in list(self._sessions.values()):
+            session.commit()
+
+    def rollback(self):
+        for session in list(self._sessions.values()):
+            session.rollback()
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(DB_SHARDS, 2), thread_name_prefix="alert-shard")
+    return _executor
+
+def map_shards(db: ShardSet, fn: Callable[[int, Session], Any], shards: Optional[Sequence[int]] = None) -> List[Any]:
+    """
+    Runs fn(index, session) for every shard (or the given ones), in parallel
+    when there are several. Returns the results in shard order; the first
+    exception raised is re-raised.
+    """
+    indexes = list(range(len(db)) if shards is None else shards)
+    if len(indexes) == 1:
+        return [fn(indexes[0], db.session(indexes[0]))]
+    futures = [_pool().submit(fn, index, db.session(index)) for index in indexes]
+    return [future.result() for future in futures]
+
+def by_provider(arguments: Dict[str, Any]) -> Optional[int]:
+    """Route for functions with a provider_id filter: its shard, or every shard without one."""
+    provider_id = arguments.get("provider_id")
+    return None if provider_id is None else shard_for_provider(provider_id, len(arguments["db"]))
+
+def sharded(route: Callable = by_provider, merge: Optional[Callable] = None, once: Sequence[str] = ()):
+    """
+    Lets a function taking `db` first be called with a ShardSet as well.
+
+    route(arguments) gets the call's arguments by name (defaults applied,
+    `db` being the ShardSet) and returns the shard to run on; None to run on
+    every shard; or a dict {shard: arguments to override} to run on those
+    shards with, e.g., their share of a batch. Results from several shards
+    are combined by merge(results, arguments), results in shard order (for
+    a dict route, in the dict's order).
+
+    Arguments named in `once` (such as archive_db, shared by all shards) are
+    only passed to the first shard's call and None to the others.
+    """
+    def decorate(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            db = args[0] if args else kwargs.get("db")
+            if not isinstance(db, ShardSet):
+                return fn(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            target = route(arguments)
+            if isinstance(target, int):
+                return fn(**dict(arguments, db=db.session(target)))
+
+            overrides = target if target is not None else {index: {} for index in range(len(db))}
+            first = min(overrides, default=None)
+
+            def call(index, session):
+                call_arguments = dict(arguments, db=session, **overrides[index])
+                if index != first:
+                    call_arguments.update((name, None) for name in once)
+                return fn(**call_arguments)
+
+            return merge(map_shards(db, call, list(overrides)), arguments)
+
+        return wrapper
+
+    return decorate
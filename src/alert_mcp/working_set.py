@@ -0,0 +1,262 @@
+"""
+Optional in-process index of the open alerts (ALERT_WORKING_SET=1).
+
+Open alerts are a small, hot part of the alerts table, and get_open_alerts
+is by far the most frequent call. With the index enabled, get_open_alerts,
+get_open_alert_rows and count_open_alerts are answered from memory. load()
+fills it from the database at startup. After that, the write paths in
+mcp_tools apply every committed create, coalesce and resolve to it, in the
+same after-commit callback that publishes the change-feed event.
+
+Each open alert is an OpenAlert record (with __slots__). The records are
+indexed by id, and their sort keys (severity rank, created_at, id) are kept
+in sorted lists per severity and per provider. Reads walk those lists
+backwards, which gives the get_open_alerts order.
+
+Like the read cache, the index is per process. It does not see writes
+made by other processes or made directly against the database. verify()
+compares it with the database (GET /api/working_set/verify), and
+load() rebuilds it.
+"""
+import bisect
+import functools
+import inspect
+import itertools
+import os
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import shards
+from .models import Alert, SEVERITY_RANK
+from .schemas import AlertRead
+
+ALERT_WORKING_SET = os.getenv("ALERT_WORKING_SET", "0").lower() in ("1", "true", "yes")
+
+SortKey = Tuple[int, Any, int]
+
+class OpenAlert:
+    """One open alert: the AlertRead fields, without the resolution ones."""
+    __slots__ = (
+        "id", "provider_id", "credential_id", "severity", "window_days", "message", "channel",
+        "created_at", "occurrence_count", "last_seen_at",
+    )
+
+    def __init__(self, alert):
+        for name in self.__slots__:
+            setattr(self, name, getattr(alert, name))
+
+    @property
+    def key(self) -> SortKey:
+        return (SEVERITY_RANK.get(self.severity, 0), self.created_at, self.id)
+
+    def to_read(self) -> AlertRead:
+        return AlertRead.model_construct(
+            resolved_at=None, resolution_note=None, **{name: getattr(self, name) for name in self.__slots__}
+        )
+
+    def to_dict(self, names: Sequence[str], max_message_chars: Optional[int] = None) -> Dict[str, Any]:
+        """Like mcp_tools.get_open_alert_rows builds it from a row."""
+        alert = {}
+        for name in names:
+            value = getattr(self, name, None)
+            if name in ("created_at", "last_seen_at"):
+                value = value.isoformat() if value is not None else None
+            elif name == "message" and max_message_chars is not None and len(value) > max_message_chars:
+                value = value[:max_message_chars - 1] + "…"
+            alert[name] = value
+        return alert
+
+def _remove(keys: List[SortKey], key: SortKey):
+    index = bisect.bisect_left(keys, key)
+    if index < len(keys) and keys[index] == key:
+        del keys[index]
+
+class OpenAlertIndex:
+    def __init__(self):
+        self.loaded = False
+        self._by_id: Dict[int, OpenAlert] = {}
+        self._by_severity: Dict[str, List[SortKey]] = {}
+        self._by_provider: Dict[int, List[SortKey]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def load(self, db: Session) -> int:
+        """
+        (Re)builds the index from the open alerts in db (a Session or a
+        ShardSet). Pass a writer session (get_db()): every write commits
+        and updates the index while holding the writer connection, so no
+        write can land between the read here and the swap. Returns the
+        number of open alerts.
+        """
+        records = [OpenAlert(row) for row in _open_alert_rows(db)]
+        by_severity: Dict[str, List[SortKey]] = {}
+        by_provider: Dict[int, List[SortKey]] = {}
+        for record in sorted(records, key=lambda r: r.key):
+            by_severity.setdefault(record.severity, []).append(record.key)
+            by_provider.setdefault(record.provider_id, []).append(record.key)
+        with self._lock:
+            self._by_id = {record.id: record for record in records}
+            self._by_severity = by_severity
+            self._by_provider = by_provider
+            self.loaded = True
+        return len(records)
+
+    def clear(self):
+        """Empties and disables the index; reads go to the database again."""
+        with self._lock:
+            self.loaded = False
+            self._by_id, self._by_severity, self._by_provider = {}, {}, {}
+
+    def apply(self, event_type: str, alerts: Sequence[AlertRead]):
+        """Applies committed writes ("created", "coalesced" or "resolved", as in the change feed)."""
+        if not self.loaded:
+            return
+        with self._lock:
+            for alert in alerts:
+                self._discard(alert.id)
+                if event_type != "resolved" and alert.resolved_at is None:
+                    self._add(OpenAlert(alert))
+
+    def _add(self, record: OpenAlert):
+        key = record.key
+        self._by_id[record.id] = record
+        bisect.insort(self._by_severity.setdefault(record.severity, []), key)
+        bisect.insort(self._by_provider.setdefault(record.provider_id, []), key)
+
+    def _discard(self, alert_id: int):
+        record = self._by_id.pop(alert_id, None)
+        if record is None:
+            return
+        key = record.key
+        _remove(self._by_severity[record.severity], key)
+        _remove(self._by_provider[record.provider_id], key)
+        if not self._by_provider[record.provider_id]:
+            del self._by_provider[record.provider_id]
+
+    def _keys(self, provider_id: Optional[int], severity: Optional[str]) -> Iterator[SortKey]:
+        # Caller holds the lock; yields in get_open_alerts order
+        if provider_id is not None:
+            keys = self._by_provider.get(provider_id, [])
+            if severity is not None:
+                rank = SEVERITY_RANK.get(severity)
+                if rank is None:
+                    return iter(())
+                keys = keys[bisect.bisect_left(keys, (rank,)):bisect.bisect_left(keys, (rank + 1,))]
+            return reversed(keys)
+        if severity is not None:
+            return reversed(self._by_severity.get(severity, []))
+        by_rank = sorted(self._by_severity.items(), key=lambda item: SEVERITY_RANK.get(item[0], 0), reverse=True)
+        return itertools.chain.from_iterable(reversed(keys) for _, keys in by_rank)
+
+    def alerts(self, provider_id: Optional[int] = None, severity: Optional[str] = None) -> List[AlertRead]:
+        with self._lock:
+            return [self._by_id[key[2]].to_read() for key in self._keys(provider_id, severity)]
+
+    def rows(
+        self,
+        provider_id: Optional[int] = None,
+        severity: Optional[str] = None,
+        names: Sequence[str] = (),
+        max_message_chars: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                self._by_id[key[2]].to_dict(names, max_message_chars)
+                for key in self._keys(provider_id, severity)
+            ]
+
+    def counts(self, provider_id: Optional[int] = None, severity: Optional[str] = None) -> Dict[str, int]:
+        with self._lock:
+            if provider_id is None:
+                counts = {s: len(keys) for s, keys in self._by_severity.items()}
+            else:
+                counts = {}
+                for rank, _, _ in self._by_provider.get(provider_id, []):
+                    counts[rank] = counts.get(rank, 0) + 1
+                counts = {s: counts.get(rank, 0) for s, rank in SEVERITY_RANK.items()}
+        if severity is not None:
+            counts = {severity: counts.get(severity, 0)}
+        return {s: n for s, n in counts.items() if n}
+
+    def verify(self, db: Session) -> List[str]:
+        """
+        Compares the index with the open alerts in db. Returns one line per
+        alert that differs. Pass a writer session, as for load().
+        """
+        if not self.loaded:
+            raise ValueError("The open alert working set is not enabled (ALERT_WORKING_SET=1)")
+        expected = {row.id: OpenAlert(row) for row in _open_alert_rows(db)}
+        with self._lock:
+            actual = dict(self._by_id)
+            indexed = sorted(itertools.chain.from_iterable(self._by_severity.values()))
+            indexed_by_provider = sorted(itertools.chain.from_iterable(self._by_provider.values()))
+        drift = []
+        for alert_id in sorted(set(expected) | set(actual)):
+            want, have = expected.get(alert_id), actual.get(alert_id)
+            if have is None:
+                drift.append(f"alert {alert_id}: open in the database, missing from the working set")
+            elif want is None:
+                drift.append(f"alert {alert_id}: in the working set, not open in the database")
+            else:
+                for name in OpenAlert.__slots__:
+                    if getattr(want, name) != getattr(have, name):
+                        drift.append(
+                            f"alert {alert_id}: {name} is {getattr(have, name)!r} in the working set, "
+                            f"{getattr(want, name)!r} in the database"
+                        )
+        keys = sorted(record.key for record in actual.values())
+        if indexed != keys or indexed_by_provider != keys:
+            drift.append("the severity or provider lists do not match the indexed alerts")
+        return drift
+
+    def answers(self, answer: Callable) -> Callable:
+        """
+        Decorates an mcp_tools read taking `db` first: while the index is
+        loaded, calls are answered by answer(**arguments), the call's
+        arguments without `db`. `wrapper.uncached` still reads the database
+        (see mcp_tools.run_batch).
+        """
+        def decorate(fn):
+            signature = inspect.signature(fn)
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.loaded:
+                    return fn(*args, **kwargs)
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = dict(bound.arguments)
+                del arguments["db"]
+                return answer(**arguments)
+
+            wrapper.uncached = getattr(fn, "uncached", fn)
+            return wrapper
+
+        return decorate
+
+def _open_alert_rows(db) -> List[Any]:
+    statement = select(*(Alert.__table__.c[name] for name in OpenAlert.__slots__)).where(Alert.resolved_at == None)
+    if isinstance(db, shards.ShardSet):
+        return list(itertools.chain.from_iterable(
+            shards.map_shards(db, lambda index, session: session.execute(statement).all())
+        ))
+    return db.execute(statement).all()
+
+open_alert_index = OpenAlertIndex()
+
+def start() -> Optional[int]:
+    """Loads the index if ALERT_WORKING_SET is set. Returns the number of open alerts loaded."""
+    if not ALERT_WORKING_SET:
+        return None
+    from .db import get_db
+
+    db = next(get_db())
+    try:
+        return open_alert_index.load(db)
+    finally:
+        db.close()
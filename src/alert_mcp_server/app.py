@@ -1,5 +1,42 @@
 import gradio as gr
-from .tools import log_alert, get_open_alerts, mark_alert_resolved, summarize_alerts
+from src.alert_mcp import metrics, working_set
+from src.alert_mcp.db import init_db, init_archive_db
+from .tools import (
+    batch, log_alert, log_alerts_bulk, get_open_alerts, get_open_alerts_page, open_alerts_table, search_alerts,
+    mark_alert_resolved, mark_alerts_resolved, summarize_alerts, alert_analytics, ALERT_TABLE_COLUMNS
+)
+
+def _table_page(provider_id, severity, sort, page_size, cursors):
+    """
+    Table rows, summary header and pagination state for the page at
+    cursors[-1]. The header's counts are the page's open_by_severity
+    (mcp_tools.count_open_alerts for the filters).
+    """
+    page = open_alerts_table(provider_id, severity, sort, page_size, cursors[-1])
+    if "error" in page:
+        return gr.update(), f"**Error:** {page['error']}", {"cursors": [None], "next": None}
+    counts = page["open_by_severity"]
+    first = (len(cursors) - 1) * int(page_size or 50) + 1
+    shown = f"rows {first}-{first + len(page['rows']) - 1}" if page["rows"] else "no rows"
+    summary = (
+        f"**{sum(counts.values())} open alerts** "
+        f"({', '.join(f'{counts.get(s, 0)} {s}' for s in ('critical', 'warning', 'info'))}) "
+        f"· page {len(cursors)}, {shown}"
+    )
+    return page["rows"], summary, {"cursors": cursors, "next": page["next_cursor"]}
+
+def _first_table_page(provider_id, severity, sort, page_size):
+    return _table_page(provider_id, severity, sort, page_size, [None])
+
+def _next_table_page(provider_id, severity, sort, page_size, pages):
+    if pages["next"] is None:
+        return gr.update(), gr.update(), pages
+    return _table_page(provider_id, severity, sort, page_size, pages["cursors"] + [pages["next"]])
+
+def _previous_table_page(provider_id, severity, sort, page_size, pages):
+    if len(pages["cursors"]) < 2:
+        return gr.update(), gr.update(), pages
+    return _table_page(provider_id, severity, sort, page_size, pages["cursors"][:-1])
 
 # Define the Gradio interface
 # We can use a TabbedInterface to organize the tools for the UI,
@@ -32,18 +69,82 @@ def create_demo():
                 outputs=t1_output
             )
 
+        with gr.Tab("Bulk Log Alerts"):
+            gr.Markdown("## Log many alerts in one transaction")
+            t5_alerts = gr.Code(
+                label="Alerts (JSON list)",
+                language="json",
+                value='[{"provider_id": 1, "severity": "warning", "window_days": 30, "message": "License expires soon"}]'
+            )
+
+            t5_output = gr.JSON(label="Response")
+            t5_btn = gr.Button("Log Alerts")
+
+            t5_btn.click(
+                fn=log_alerts_bulk,
+                inputs=[t5_alerts],
+                outputs=t5_output
+            )
+
         with gr.Tab("Get Open Alerts"):
-            gr.Markdown("## List open alerts")
-            t2_provider_id = gr.Number(label="Provider ID (Optional)", value=None, precision=0)
-            t2_severity = gr.Dropdown(choices=["info", "warning", "critical", None], label="Severity (Optional)", value=None)
+            gr.Markdown("## Open alerts")
+            with gr.Row():
+                t2_provider_id = gr.Number(label="Provider ID (Optional)", value=None, precision=0)
+                t2_severity = gr.Dropdown(choices=["info", "warning", "critical", None], label="Severity (Optional)", value=None)
+                t2_sort = gr.Dropdown(
+                    choices=[("Severity", "severity"), ("Newest first", "newest"), ("Oldest first", "oldest")],
+                    label="Sort By",
+                    value="severity"
+                )
+                t2_page_size = gr.Number(label="Page Size", value=50, precision=0)
+
+            t2_summary = gr.Markdown()
+            t2_table = gr.Dataframe(headers=ALERT_TABLE_COLUMNS, interactive=False, wrap=True)
+            with gr.Row():
+                t2_prev = gr.Button("Previous")
+                t2_refresh = gr.Button("Refresh")
+                t2_next = gr.Button("Next")
+            # Cursors of the pages up to the one shown (None for the first)
+            # and the shown page's next_cursor
+            t2_pages = gr.State({"cursors": [None], "next": None})
+
+            table_inputs = [t2_provider_id, t2_severity, t2_sort, t2_page_size]
+            table_outputs = [t2_table, t2_summary, t2_pages]
+            t2_refresh.click(fn=_first_table_page, inputs=table_inputs, outputs=table_outputs, api_visibility="private")
+            for control in table_inputs:
+                control.change(fn=_first_table_page, inputs=table_inputs, outputs=table_outputs, api_visibility="private")
+            t2_next.click(
+                fn=_next_table_page, inputs=table_inputs + [t2_pages], outputs=table_outputs, api_visibility="private"
+            )
+            t2_prev.click(
+                fn=_previous_table_page, inputs=table_inputs + [t2_pages], outputs=table_outputs, api_visibility="private"
+            )
+            demo.load(fn=_first_table_page, inputs=table_inputs, outputs=table_outputs, api_visibility="private")
+
+            # Still served as MCP tools and API endpoints, just not rendered
+            gr.api(get_open_alerts)
+            gr.api(get_open_alerts_page)
+            gr.api(batch)
+
+        with gr.Tab("Search Alerts"):
+            gr.Markdown("## Find alerts by message text")
+            t7_query = gr.Textbox(label="Search", placeholder='e.g. DEA, "board certification", renew*')
+            with gr.Row():
+                t7_provider_id = gr.Number(label="Provider ID (Optional)", value=None, precision=0)
+                t7_severity = gr.Dropdown(choices=["info", "warning", "critical", None], label="Severity (Optional)", value=None)
+                t7_status = gr.Dropdown(choices=["open", "resolved", None], label="Status (Optional)", value=None)
+            with gr.Row():
+                t7_order = gr.Radio(choices=["relevance", "recent"], label="Order", value="relevance")
+                t7_limit = gr.Number(label="Page Size", value=20, precision=0)
+                t7_cursor = gr.Textbox(label="Cursor (empty for first page)")
 
-            t2_output = gr.JSON(label="Open Alerts")
-            t2_btn = gr.Button("Get Alerts")
+            t7_output = gr.JSON(label="Matching Alerts")
+            t7_btn = gr.Button("Search")
 
-            t2_btn.click(
-                fn=get_open_alerts,
-                inputs=[t2_provider_id, t2_severity],
-                outputs=t2_output
+            t7_btn.click(
+                fn=search_alerts,
+                inputs=[t7_query, t7_provider_id, t7_severity, t7_status, t7_order, t7_limit, t7_cursor],
+                outputs=t7_output
             )
 
         with gr.Tab("Resolve Alert"):
@@ -60,21 +161,69 @@ def create_demo():
                 outputs=t3_output
             )
 
+            gr.Markdown("## Resolve many alerts")
+            t3_ids = gr.Textbox(label="Alert IDs (comma-separated, optional)")
+            with gr.Row():
+                t3_provider_id = gr.Number(label="Provider ID (Optional)", value=None, precision=0)
+                t3_credential_id = gr.Number(label="Credential ID (Optional)", value=None, precision=0)
+            with gr.Row():
+                t3_severity = gr.Dropdown(choices=["info", "warning", "critical", None], label="Severity (Optional)", value=None)
+                t3_created_before = gr.Textbox(label="Created Before (ISO datetime, optional)")
+            t3_bulk_note = gr.Textbox(label="Resolution Note")
+
+            t3_bulk_output = gr.JSON(label="Resolved Alerts")
+            t3_bulk_btn = gr.Button("Resolve Matching")
+
+            t3_bulk_btn.click(
+                fn=mark_alerts_resolved,
+                inputs=[t3_ids, t3_provider_id, t3_credential_id, t3_severity, t3_created_before, t3_bulk_note],
+                outputs=t3_bulk_output
+            )
+
         with gr.Tab("Summarize Alerts"):
             gr.Markdown("## Summary of alerts")
             t4_window = gr.Number(label="Window Days (Optional)", value=None, precision=0)
+            t4_include_archive = gr.Checkbox(label="Include archived alerts", value=False)
 
             t4_output = gr.JSON(label="Summary")
             t4_btn = gr.Button("Summarize")
 
             t4_btn.click(
                 fn=summarize_alerts,
-                inputs=[t4_window],
+                inputs=[t4_window, t4_include_archive],
                 outputs=t4_output
             )
 
+        with gr.Tab("Analytics"):
+            gr.Markdown("## Alert counts and time to resolve, grouped")
+            t6_group_by = gr.CheckboxGroup(
+                choices=["severity", "provider_id", "channel", "day", "week", "status"],
+                label="Group By",
+                value=["severity"]
+            )
+            with gr.Row():
+                t6_window = gr.Number(label="Window Days (Optional)", value=None, precision=0)
+                t6_provider_id = gr.Number(label="Provider ID (Optional)", value=None, precision=0)
+            with gr.Row():
+                t6_severity = gr.Dropdown(choices=["info", "warning", "critical", None], label="Severity (Optional)", value=None)
+                t6_channel = gr.Textbox(label="Channel (Optional)")
+            t6_percentiles = gr.Textbox(label="Percentiles", value="50, 90, 99")
+            t6_include_archive = gr.Checkbox(label="Include archived alerts", value=False)
+
+            t6_output = gr.JSON(label="Analytics")
+            t6_btn = gr.Button("Run")
+
+            t6_btn.click(
+                fn=alert_analytics,
+                inputs=[t6_group_by, t6_window, t6_provider_id, t6_severity, t6_channel, t6_percentiles, t6_include_archive],
+                outputs=t6_output
+            )
+
     return demo
 
 if __name__ == "__main__":
+    init_db()
+    init_archive_db()
+    working_set.start()
     demo = create_demo()
-    demo.launch(mcp_server=True)
+    demo.launch(mcp_server=True, app_kwargs={"routes": [metrics.metrics_route()]})
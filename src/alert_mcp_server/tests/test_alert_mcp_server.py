@@ -1,12 +1,18 @@
 import pytest
 from unittest.mock import MagicMock, patch
-from src.alert_mcp_server.tools import log_alert, get_open_alerts, mark_alert_resolved, summarize_alerts
+from src.alert_mcp import metrics
+from src.alert_mcp_server.tools import (
+    log_alert, log_alerts_bulk, get_open_alerts, get_open_alerts_page, search_alerts,
+    mark_alert_resolved, mark_alerts_resolved, summarize_alerts, alert_analytics
+)
 
 @pytest.fixture
 def mock_db_session():
-    with patch("src.alert_mcp_server.tools.get_db") as mock_get_db:
+    with patch("src.alert_mcp_server.tools.get_db") as mock_get_db, \
+            patch("src.alert_mcp_server.tools.get_read_db") as mock_get_read_db:
         mock_session = MagicMock()
         mock_get_db.return_value = iter([mock_session])
+        mock_get_read_db.return_value = iter([mock_session])
         yield mock_session
 
 def test_log_alert(mock_db_session):
@@ -28,16 +34,14 @@ def test_log_alert(mock_db_session):
         mock_alert_read.model_dump.assert_called_with(mode='json')
 
 def test_get_open_alerts(mock_db_session):
-    mock_alert_read = MagicMock()
-    mock_alert_read.model_dump.return_value = {"id": 1, "provider_id": 1, "severity": "critical"}
+    rows = [{"id": 1, "provider_id": 1, "severity": "critical"}]
 
-    with patch("src.alert_mcp.mcp_tools.get_open_alerts", return_value=[mock_alert_read]) as mock_get:
+    with patch("src.alert_mcp.mcp_tools.get_open_alert_rows", return_value=rows) as mock_get:
         result = get_open_alerts(provider_id=1)
 
         assert len(result) == 1
         assert result[0]["id"] == 1
-        mock_get.assert_called_once()
-        mock_alert_read.model_dump.assert_called_with(mode='json')
+        assert mock_get.call_args.kwargs["provider_id"] == 1
 
 def test_mark_alert_resolved(mock_db_session):
     mock_alert_read = MagicMock()
@@ -60,3 +64,82 @@ def test_summarize_alerts(mock_db_session):
         assert result["total_alerts"] == 10
         mock_sum.assert_called_once()
         mock_summary.model_dump.assert_called_with(mode='json')
+
+def test_alert_analytics(mock_db_session):
+    mock_result = MagicMock()
+    mock_result.model_dump.return_value = {"group_by": ["severity"], "groups": []}
+
+    with patch("src.alert_mcp.mcp_tools.alert_analytics", return_value=mock_result) as mock_analytics:
+        result = alert_analytics(group_by=["severity"], percentiles="50, 95")
+
+        assert result["group_by"] == ["severity"]
+        assert mock_analytics.call_args.kwargs["percentiles"] == [50.0, 95.0]
+        mock_result.model_dump.assert_called_with(mode='json')
+
+    assert "error" in alert_analytics(percentiles="fast")
+
+def test_search_alerts(mock_db_session):
+    mock_page = MagicMock()
+    mock_page.model_dump.return_value = {"items": [{"id": 1, "score": -1.5}], "next_cursor": None}
+
+    with patch("src.alert_mcp.mcp_tools.search_alerts", return_value=mock_page) as mock_search:
+        result = search_alerts("DEA", status="", limit=5, cursor="")
+
+        assert result["items"][0]["id"] == 1
+        kwargs = mock_search.call_args.kwargs
+        assert kwargs["query"] == "DEA"
+        assert kwargs["status"] is None
+        assert kwargs["cursor"] is None
+        assert kwargs["limit"] == 5
+
+def test_search_alerts_error(mock_db_session):
+    with patch("src.alert_mcp.mcp_tools.search_alerts", side_effect=ValueError("Invalid cursor")):
+        assert search_alerts("DEA", cursor="bogus") == {"error": "Invalid cursor"}
+
+def test_log_alerts_bulk(mock_db_session):
+    mock_result = MagicMock()
+    mock_result.model_dump.return_value = {"created_ids": [1, 2], "errors": []}
+
+    with patch("src.alert_mcp.mcp_tools.log_alerts_bulk", return_value=mock_result) as mock_bulk:
+        result = log_alerts_bulk('[{"provider_id": 1}, {"provider_id": 2}]')
+
+        assert result["created_ids"] == [1, 2]
+        assert mock_bulk.call_args.kwargs["alerts"] == [{"provider_id": 1}, {"provider_id": 2}]
+        mock_result.model_dump.assert_called_with(mode='json')
+
+def test_log_alerts_bulk_invalid_json(mock_db_session):
+    result = log_alerts_bulk("not json")
+    assert "error" in result
+
+def test_get_open_alerts_page(mock_db_session):
+    page = {"items": [{"id": 1}], "next_cursor": "abc"}
+
+    with patch("src.alert_mcp.mcp_tools.get_open_alert_rows_page", return_value=page) as mock_get:
+        result = get_open_alerts_page(limit=1, cursor="")
+
+        assert result["next_cursor"] == "abc"
+        assert mock_get.call_args.kwargs["cursor"] is None
+        assert mock_get.call_args.kwargs["limit"] == 1
+
+def test_mark_alerts_resolved(mock_db_session):
+    mock_alert_read = MagicMock()
+    mock_alert_read.model_dump.return_value = {"id": 3, "resolved_at": "2023-10-27"}
+
+    with patch("src.alert_mcp.mcp_tools.mark_alerts_resolved", return_value=[mock_alert_read]) as mock_mark:
+        result = mark_alerts_resolved(alert_ids="3, 4", resolution_note="Renewed")
+
+        assert result[0]["id"] == 3
+        assert mock_mark.call_args.kwargs["alert_ids"] == [3, 4]
+        assert mock_mark.call_args.kwargs["created_before"] is None
+
+def test_wrappers_record_metrics(mock_db_session):
+    calls = metrics.TOOL_CALLS.value("mark_alert_resolved", "gradio")
+    errors = metrics.TOOL_ERRORS.value("mark_alert_resolved", "gradio")
+
+    with patch("src.alert_mcp.mcp_tools.mark_alert_resolved", side_effect=ValueError("Alert not found")):
+        result = mark_alert_resolved(alert_id=999)
+
+    assert result == {"error": "Alert not found"}
+    assert metrics.TOOL_CALLS.value("mark_alert_resolved", "gradio") == calls + 1
+    assert metrics.TOOL_ERRORS.value("mark_alert_resolved", "gradio") == errors + 1
+    assert metrics.TOOL_LATENCY.count("mark_alert_resolved", "gradio") >= 1
@@ -1,11 +1,13 @@
 import json
-from typing import List, Optional, Dict, Any
-from src.alert_mcp.db import get_db
-from src.alert_mcp import mcp_tools
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Union
+from src.alert_mcp.db import get_db, get_read_db, get_archive_db
+from src.alert_mcp import group_commit, metrics, mcp_tools
 
 # We use synchronous calls directly to the database logic
 # This avoids the need for a separate backend server process in the Space.
 
+@metrics.instrumented("gradio")
 def log_alert(
     provider_id: int,
     severity: str,
@@ -25,6 +27,22 @@ def log_alert(
         credential_id: Optional credential ID.
         channel: Notification channel (default: "ui").
     """
+    if group_commit.ALERT_GROUP_COMMIT:
+        try:
+            alert = group_commit.log_alert(
+                provider_id=provider_id,
+                credential_id=credential_id,
+                severity=severity,
+                window_days=window_days,
+                message=message,
+                channel=channel
+            )
+            return alert.model_dump(mode='json')
+        except ValueError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            return {"error": f"An error occurred: {str(e)}"}
+
     db = next(get_db())
     try:
         alert = mcp_tools.log_alert(
@@ -44,9 +62,73 @@ def log_alert(
     finally:
         db.close()
 
+@metrics.instrumented("gradio")
+def log_alerts_bulk(
+    alerts: Union[str, List[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """
+    Log many alerts at once in a single transaction.
+
+    Args:
+        alerts: A list of alert objects (or a JSON string of that list). Each
+            object takes the same fields as log_alert.
+    """
+    if isinstance(alerts, str):
+        try:
+            alerts = json.loads(alerts)
+        except json.JSONDecodeError as e:
+            return {"error": f"Invalid JSON: {str(e)}"}
+    if not isinstance(alerts, list):
+        return {"error": "alerts must be a list of alert objects"}
+
+    db = next(get_db())
+    try:
+        result = mcp_tools.log_alerts_bulk(db=db, alerts=alerts)
+        return result.model_dump(mode='json')
+    except Exception as e:
+        return {"error": f"An error occurred: {str(e)}"}
+    finally:
+        db.close()
+
+@metrics.instrumented("gradio")
+def batch(
+    operations: Union[str, List[Dict[str, Any]]],
+    atomic: bool = True
+) -> Dict[str, Any]:
+    """
+    Run several tool calls in one round trip and one database transaction.
+
+    Args:
+        operations: An ordered list (or a JSON string of that list) of {"tool": name, "arguments": {...}},
+            tool being one of get_open_alerts, mark_alert_resolved, log_alert and summarize_alerts.
+            Later operations see the writes of earlier ones.
+        atomic: Undo everything if an operation fails (default); otherwise skip failed operations and commit the rest.
+    """
+    if isinstance(operations, str):
+        try:
+            operations = json.loads(operations)
+        except json.JSONDecodeError as e:
+            return {"error": f"Invalid JSON: {str(e)}"}
+    if not isinstance(operations, list):
+        return {"error": "operations must be a list of operation objects"}
+
+    db = next(get_db())
+    try:
+        result = mcp_tools.run_batch(db=db, operations=operations, atomic=bool(atomic))
+        return result.model_dump(mode='json')
+    except ValueError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        return {"error": f"An error occurred: {str(e)}"}
+    finally:
+        db.close()
+
+@metrics.instrumented("gradio")
 def get_open_alerts(
     provider_id: Optional[int] = None,
-    severity: Optional[str] = None
+    severity: Optional[str] = None,
+    fields: Optional[str] = None,
+    max_message_chars: Optional[int] = None
 ) -> List[Dict[str, Any]]:
     """
     Get a list of open (unresolved) alerts.
@@ -54,16 +136,146 @@ def get_open_alerts(
     Args:
         provider_id: Optional filter by provider ID.
         severity: Optional filter by severity.
+        fields: Optional comma-separated alert fields to return, e.g. "provider_id,message"; id, severity and created_at are always included.
+        max_message_chars: Optional length to shorten messages and resolution notes to.
     """
-    db = next(get_db())
+    db = next(get_read_db())
     try:
-        alerts = mcp_tools.get_open_alerts(db=db, provider_id=provider_id, severity=severity)
-        return [a.model_dump(mode='json') for a in alerts]
+        return mcp_tools.get_open_alert_rows(
+            db=db,
+            provider_id=provider_id,
+            severity=severity,
+            fields=fields or None,
+            max_message_chars=int(max_message_chars) if max_message_chars else None
+        )
     except Exception as e:
         return [{"error": str(e)}]
     finally:
         db.close()
 
+@metrics.instrumented("gradio")
+def get_open_alerts_page(
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    limit: Optional[int] = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    max_message_chars: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Get one page of open (unresolved) alerts, in the same order as get_open_alerts.
+
+    Args:
+        provider_id: Optional filter by provider ID.
+        severity: Optional filter by severity.
+        limit: Page size (1-1000, default 100).
+        cursor: The next_cursor returned by the previous page; empty for the first page.
+        fields: Optional comma-separated alert fields to return; id, severity and created_at are always included.
+        max_message_chars: Optional length to shorten messages and resolution notes to.
+    """
+    db = next(get_read_db())
+    try:
+        return mcp_tools.get_open_alert_rows_page(
+            db=db,
+            provider_id=provider_id,
+            severity=severity,
+            limit=int(limit) if limit else 100,
+            cursor=cursor or None,
+            fields=fields or None,
+            max_message_chars=int(max_message_chars) if max_message_chars else None
+        )
+    except ValueError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        db.close()
+
+# Columns of the open alerts table in the UI; only these are selected
+ALERT_TABLE_COLUMNS = ["id", "severity", "provider_id", "credential_id", "message", "occurrence_count", "created_at"]
+ALERT_TABLE_MESSAGE_CHARS = 160
+
+@metrics.instrumented("gradio")
+def open_alerts_table(
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    sort: Optional[str] = "severity",
+    page_size: Optional[int] = 50,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    One page of open alerts for the table in the UI: "rows" (lists in
+    ALERT_TABLE_COLUMNS order), "next_cursor", and "open_by_severity", the
+    open alert counts for the filters.
+    """
+    db = next(get_read_db())
+    try:
+        page = mcp_tools.get_open_alert_rows_page(
+            db=db,
+            provider_id=provider_id,
+            severity=severity or None,
+            limit=int(page_size) if page_size else 50,
+            cursor=cursor or None,
+            fields=ALERT_TABLE_COLUMNS,
+            max_message_chars=ALERT_TABLE_MESSAGE_CHARS,
+            sort=sort or "severity"
+        )
+        return {
+            "rows": [[alert[column] for column in ALERT_TABLE_COLUMNS] for alert in page["items"]],
+            "next_cursor": page["next_cursor"],
+            "open_by_severity": mcp_tools.count_open_alerts(db=db, provider_id=provider_id, severity=severity or None),
+        }
+    except ValueError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        return {"error": f"An error occurred: {str(e)}"}
+    finally:
+        db.close()
+
+@metrics.instrumented("gradio")
+def search_alerts(
+    query: str,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    order: str = "relevance",
+    limit: Optional[int] = 20,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Full-text search over alert messages and resolution notes.
+
+    Args:
+        query: Words to find, e.g. "DEA" or "board certification". Every word must match;
+            "quote" a phrase, end a word with * to match it as a prefix.
+        provider_id: Optional filter by provider ID.
+        severity: Optional filter by severity.
+        status: Optional filter: "open" or "resolved".
+        order: "relevance" (best match first) or "recent" (newest first).
+        limit: Page size (1-1000, default 20).
+        cursor: The next_cursor returned by the previous page; empty for the first page.
+    """
+    db = next(get_read_db())
+    try:
+        page = mcp_tools.search_alerts(
+            db=db,
+            query=query,
+            provider_id=provider_id,
+            severity=severity,
+            status=status or None,
+            order=order or "relevance",
+            limit=int(limit) if limit else 20,
+            cursor=cursor or None
+        )
+        return page.model_dump(mode='json')
+    except ValueError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        db.close()
+
+@metrics.instrumented("gradio")
 def mark_alert_resolved(
     alert_id: int,
     resolution_note: Optional[str] = None
@@ -86,18 +298,118 @@ def mark_alert_resolved(
     finally:
         db.close()
 
-def summarize_alerts(window_days: Optional[int] = None) -> Dict[str, Any]:
+@metrics.instrumented("gradio")
+def mark_alerts_resolved(
+    alert_ids: Optional[Union[str, List[int]]] = None,
+    provider_id: Optional[int] = None,
+    credential_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    created_before: Optional[str] = None,
+    resolution_note: Optional[str] = None
+) -> List[Dict[str, Any]]:
     """
-    Get a summary of alerts (counts by severity).
+    Resolve many open alerts at once. All given criteria must match.
 
     Args:
-        window_days: Optional window in days to summarize over.
+        alert_ids: Optional list of alert IDs (or a comma-separated string of IDs).
+        provider_id: Optional filter by provider ID.
+        credential_id: Optional filter by credential ID.
+        severity: Optional filter by severity.
+        created_before: Optional ISO datetime; only alerts created before it.
+        resolution_note: A note explaining the resolution.
     """
+    if isinstance(alert_ids, str):
+        try:
+            alert_ids = [int(i) for i in alert_ids.replace(",", " ").split()] or None
+        except ValueError:
+            return [{"error": "alert_ids must be a list of integers"}]
+
     db = next(get_db())
     try:
-        summary = mcp_tools.summarize_alerts(db=db, window_days=window_days)
+        alerts = mcp_tools.mark_alerts_resolved(
+            db=db,
+            alert_ids=alert_ids,
+            provider_id=provider_id,
+            credential_id=credential_id,
+            severity=severity or None,
+            created_before=datetime.fromisoformat(created_before) if created_before else None,
+            resolution_note=resolution_note
+        )
+        return [a.model_dump(mode='json') for a in alerts]
+    except ValueError as e:
+        return [{"error": str(e)}]
+    except Exception as e:
+        return [{"error": str(e)}]
+    finally:
+        db.close()
+
+@metrics.instrumented("gradio")
+def summarize_alerts(window_days: Optional[int] = None, include_archive: bool = False) -> Dict[str, Any]:
+    """
+    Get a summary of alerts (counts by severity, open vs resolved).
+
+    Args:
+        window_days: Optional window in days to summarize over.
+        include_archive: Also count resolved alerts moved to the archive.
+    """
+    db = next(get_read_db())
+    archive_db = next(get_archive_db()) if include_archive else None
+    try:
+        summary = mcp_tools.summarize_alerts(db=db, window_days=window_days, archive_db=archive_db)
         return summary.model_dump(mode='json')
     except Exception as e:
         return {"error": str(e)}
     finally:
         db.close()
+        if archive_db is not None:
+            archive_db.close()
+
+@metrics.instrumented("gradio")
+def alert_analytics(
+    group_by: Optional[List[str]] = None,
+    window_days: Optional[int] = None,
+    provider_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    channel: Optional[str] = None,
+    percentiles: Optional[Union[str, List[float]]] = None,
+    include_archive: bool = False
+) -> Dict[str, Any]:
+    """
+    Aggregated alert counts and time-to-resolve percentiles, grouped by any of
+    severity, provider_id, channel, day, week and status.
+
+    Args:
+        group_by: Dimensions to group by (none gives one overall group).
+        window_days: Optional window in days (by creation time).
+        provider_id: Optional filter by provider ID.
+        severity: Optional filter by severity.
+        channel: Optional filter by channel.
+        percentiles: Time-to-resolve percentiles (list or comma-separated string, default 50, 90, 99).
+        include_archive: Also include resolved alerts moved to the archive.
+    """
+    if isinstance(percentiles, str):
+        try:
+            percentiles = [float(p) for p in percentiles.replace(",", " ").split()] or None
+        except ValueError:
+            return {"error": "percentiles must be a list of numbers"}
+
+    db = next(get_read_db())
+    archive_db = next(get_archive_db()) if include_archive else None
+    try:
+        analytics = mcp_tools.alert_analytics(
+            db=db,
+            group_by=group_by or (),
+            window_days=window_days,
+            provider_id=provider_id,
+            severity=severity or None,
+            channel=channel or None,
+            percentiles=percentiles or (50, 90, 99),
+            archive_db=archive_db
+        )
+        return analytics.model_dump(mode='json')
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        db.close()
+        if archive_db is not None:
+            archive_db.close()
@@ -1,11 +1,22 @@
+import asyncio
+import json
+import re
+import time
+from datetime import datetime, timedelta
+
+import httpx
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, select
 from sqlalchemy.orm import sessionmaker
 
-from src.alert_mcp.main import app, get_db
-from src.alert_mcp.models import Base, Alert
-from src.alert_mcp.schemas import AlertCreate
+from src.alert_mcp.main import app, get_db, get_read_db, get_archive_db
+from src.alert_mcp.db import make_engine, init_db, SCHEMA_VERSION
+from src.alert_mcp.models import Base, ArchiveBase, Alert, AlertCounter, AlertRollup, ArchivedAlert
+from src.alert_mcp import main, mcp_tools, counters, metrics, retention, rollups
+from src.alert_mcp.cache import ResultCache, result_cache
+from src.alert_mcp.feed import ChangeFeed, change_feed, sse_stream
+from src.alert_mcp.schemas import AlertCreate, AlertSummary
 
 # Setup in-memory DB for tests
 # We need to make sure the connection is shared if we use :memory:
@@ -25,6 +36,12 @@ engine = create_engine(
     poolclass=StaticPool
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+archive_engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+TestingArchiveSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=archive_engine)
 
 def override_get_db():
     try:
@@ -34,17 +51,56 @@ def override_get_db():
         db.close()
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+
+def override_get_archive_db():
+    try:
+        db = TestingArchiveSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_archive_db] = override_get_archive_db
 
 @pytest.fixture(autouse=True)
 def init_test_db():
     Base.metadata.create_all(bind=engine)
+    ArchiveBase.metadata.create_all(bind=archive_engine)
+    result_cache.clear()
     yield
     Base.metadata.drop_all(bind=engine)
+    ArchiveBase.metadata.drop_all(bind=archive_engine)
 
 @pytest.fixture
 def client():
     return TestClient(app)
 
+@pytest.fixture
+def tool_sessions(monkeypatch):
+    """
+    For calling main's FastMCP tools directly: they open their sessions
+    themselves, which dependency_overrides does not reach.
+    """
+    monkeypatch.setattr(main, "get_db", override_get_db)
+    monkeypatch.setattr(main, "get_read_db", override_get_db)
+    monkeypatch.setattr(main, "get_archive_db", override_get_archive_db)
+
+@pytest.fixture
+def lifespan_databases(tmp_path, monkeypatch):
+    """
+    For `with TestClient(app)`: the app's startup creates its databases in
+    tmp_path instead of the working directory.
+    """
+    from src.alert_mcp import db as db_module
+
+    writer = make_engine(str(tmp_path / "credentialwatch.db"))
+    archive = make_engine(str(tmp_path / "credentialwatch.archive.db"), name="archive")
+    monkeypatch.setattr(db_module, "shard_engines", [writer])
+    monkeypatch.setattr(db_module, "archive_engine", archive)
+    yield tmp_path
+    writer.dispose()
+    archive.dispose()
+
 def test_log_alert(client):
     response = client.post(
         "/mcp/tools/log_alert",
@@ -127,3 +183,1216 @@ def test_summarize_alerts(client):
     assert data["by_severity"]["info"] == 2
     assert data["by_severity"]["critical"] == 1
     assert data["by_severity"]["warning"] == 0
+
+def test_alert_analytics_groups_and_resolve_percentiles(client):
+    monday = datetime(2024, 1, 1, 9, 0)
+    db = TestingSessionLocal()
+    # Provider 1: ten critical alerts resolved after 1..10 hours; provider 2:
+    # two open warnings by email, created on the Sunday of the same week
+    for i in range(10):
+        created = monday + timedelta(hours=i)
+        db.add(Alert(
+            provider_id=1, severity="critical", severity_rank=3, window_days=30, message=str(i),
+            channel="ui", created_at=created, resolved_at=created + timedelta(hours=i + 1)
+        ))
+    for i in range(2):
+        db.add(Alert(
+            provider_id=2, severity="warning", severity_rank=2, window_days=30, message=f"w{i}",
+            channel="email", created_at=monday + timedelta(days=6)
+        ))
+    db.commit()
+    rollups.rebuild(db)
+    db.close()
+
+    response = client.get("/api/analytics", params={"group_by": ["provider_id", "week", "status"]})
+    assert response.status_code == 200
+    groups = response.json()["groups"]
+    assert [g["key"] for g in groups] == [
+        {"provider_id": 1, "week": "2024-01-01", "status": "resolved"},
+        {"provider_id": 2, "week": "2024-01-01", "status": "open"},
+    ]
+    resolved, open_ = groups
+    assert (resolved["total_alerts"], resolved["resolved_alerts"]) == (10, 10)
+    assert (open_["open_alerts"], open_["time_to_resolve"]["count"]) == (2, 0)
+    ttr = resolved["time_to_resolve"]
+    assert ttr["mean_seconds"] == pytest.approx(5.5 * 3600)
+    # Histogram estimates stay within their bucket (4-8h and 8-12h here)
+    assert 4 * 3600 <= ttr["percentiles"]["p50"] <= 8 * 3600
+    assert 8 * 3600 <= ttr["percentiles"]["p99"] <= 12 * 3600
+
+    response = client.post("/mcp/tools/alert_analytics", json={
+        "group_by": ["day", "channel"], "severity": "warning", "percentiles": [50]
+    })
+    assert response.json()["groups"] == [{
+        "key": {"day": "2024-01-07", "channel": "email"},
+        "total_alerts": 2, "open_alerts": 2, "resolved_alerts": 0,
+        "time_to_resolve": {"count": 0, "mean_seconds": None, "percentiles": {}},
+    }]
+
+    # No dimensions: one overall group, also for an empty result
+    overall = client.get("/api/analytics").json()["groups"]
+    assert [g["total_alerts"] for g in overall] == [12]
+    empty = client.get("/api/analytics", params={"provider_id": 99}).json()["groups"]
+    assert [g["total_alerts"] for g in empty] == [0]
+
+    assert client.get("/api/analytics", params={"group_by": "owner"}).status_code == 400
+    truncated = client.get("/api/analytics", params={"group_by": "provider_id", "limit": 1}).json()
+    assert truncated["truncated"] and len(truncated["groups"]) == 1
+
+    # The write paths keep the rollups current; a window reads today's alerts
+    created = client.post("/api/log_alert", json={
+        "provider_id": 3, "severity": "info", "window_days": 7, "message": "new"
+    }).json()
+    client.post("/api/log_alert", json={"provider_id": 3, "severity": "info", "window_days": 7, "message": "new"})
+    client.post(f"/api/alerts/{created['id']}/resolve", params={"resolution_note": "done"})
+    client.post(f"/api/alerts/{created['id']}/resolve", params={"resolution_note": "again"})
+    client.post("/api/alerts/resolve", json={"provider_id": 2, "resolution_note": "bulk"})
+    recent = client.get("/api/analytics", params={"group_by": "provider_id", "window_days": 1}).json()
+    assert [(g["key"]["provider_id"], g["resolved_alerts"]) for g in recent["groups"]] == [(3, 1)]
+    db = TestingSessionLocal()
+    try:
+        assert rollups.verify(db) == []
+    finally:
+        db.close()
+
+def test_log_alerts_bulk(client):
+    response = client.post(
+        "/api/alerts/bulk",
+        json=[
+            {"provider_id": 1, "severity": "critical", "window_days": 30, "message": "a"},
+            {"provider_id": 2, "severity": "super_critical", "window_days": 30, "message": "b"},
+            {"provider_id": 3, "severity": "info", "window_days": 7, "message": "c", "channel": "email"},
+        ]
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["created_ids"]) == 2
+    assert data["created_ids"][0] < data["created_ids"][1]
+    assert len(data["errors"]) == 1
+    assert data["errors"][0]["index"] == 1
+    assert "severity" in data["errors"][0]["error"]
+
+    open_res = client.post("/mcp/tools/get_open_alerts", json={})
+    data = open_res.json()
+    assert [a["provider_id"] for a in data] == [1, 3]
+    assert data[1]["channel"] == "email"
+
+def test_wal_reader_does_not_block_behind_writer(tmp_path):
+    path = str(tmp_path / "wal.db")
+    writer = make_engine(path)
+    Base.metadata.create_all(bind=writer)
+    reader = make_engine(path, read_only=True, pool_size=2)
+
+    with reader.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+    # Hold an open write transaction; the reader still sees the last commit.
+    with writer.begin() as wconn:
+        wconn.exec_driver_sql(
+            "INSERT INTO alerts (provider_id, severity, severity_rank, window_days, message, channel, created_at) "
+            "VALUES (1, 'info', 1, 30, 'pending', 'ui', CURRENT_TIMESTAMP)"
+        )
+        with reader.connect() as conn:
+            assert conn.exec_driver_sql("SELECT count(*) FROM alerts").scalar() == 0
+
+    with reader.connect() as conn:
+        assert conn.exec_driver_sql("SELECT count(*) FROM alerts").scalar() == 1
+        with pytest.raises(Exception, match="readonly"):
+            conn.exec_driver_sql("DELETE FROM alerts")
+
+    reader.dispose()
+    writer.dispose()
+
+# The alerts table as the first release created it
+LEGACY_ALERTS_DDL = (
+    "CREATE TABLE alerts (id INTEGER PRIMARY KEY, provider_id INTEGER NOT NULL, "
+    "credential_id INTEGER, severity VARCHAR NOT NULL, window_days INTEGER NOT NULL, "
+    "message TEXT NOT NULL, channel VARCHAR, created_at DATETIME NOT NULL, "
+    "resolved_at DATETIME, resolution_note TEXT)"
+)
+
+def test_init_db_migrates_legacy_schema(tmp_path):
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy.begin() as conn:
+        conn.exec_driver_sql(LEGACY_ALERTS_DDL)
+        for _ in range(2):
+            conn.exec_driver_sql(
+                "INSERT INTO alerts (provider_id, severity, window_days, message, channel, created_at) "
+                "VALUES (1, 'warning', 30, 'old', 'ui', CURRENT_TIMESTAMP)"
+            )
+
+    init_db(bind=legacy)
+
+    with legacy.connect() as conn:
+        assert conn.exec_driver_sql("SELECT severity_rank FROM alerts").scalar() == 2
+        assert conn.exec_driver_sql("SELECT total FROM alert_counters").scalar() == 2
+        # Only the newest of the pre-existing duplicates gets the dedup key
+        keys = conn.exec_driver_sql("SELECT dedup_key FROM alerts ORDER BY id").scalars().all()
+        assert keys[0] is None and keys[1] is not None
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION
+        indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list('alerts')")}
+        # Existing alerts are indexed for search
+        assert conn.exec_driver_sql("SELECT count(*) FROM alerts_fts WHERE alerts_fts MATCH 'old'").scalar() == 2
+    assert "ix_alerts_open_rank" in indexes
+
+    # The rebuilt table never reuses the id of a deleted (archived) alert
+    with legacy.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM alerts WHERE id = 2")
+        conn.exec_driver_sql(
+            "INSERT INTO alerts (provider_id, severity, severity_rank, window_days, message, channel, created_at) "
+            "VALUES (1, 'info', 1, 30, 'new', 'ui', CURRENT_TIMESTAMP)"
+        )
+        assert conn.exec_driver_sql("SELECT max(id) FROM alerts").scalar() == 3
+        assert conn.exec_driver_sql("SELECT rowid FROM alerts_fts WHERE alerts_fts MATCH 'new'").scalar() == 3
+
+    # Once current, init_db only reads user_version
+    statements = []
+    event.listen(legacy, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    init_db(bind=legacy)
+    assert statements == ["PRAGMA user_version"]
+    legacy.dispose()
+
+def test_search_alerts(client):
+    db = TestingSessionLocal()
+    try:
+        dea = mcp_tools.log_alert(db, provider_id=1, severity="critical", window_days=30,
+                                  message="DEA registration expires soon")
+        board = mcp_tools.log_alert(db, provider_id=2, severity="info", window_days=30,
+                                    message="Board certification expires in 30 days")
+        old = mcp_tools.log_alert(db, provider_id=1, severity="warning", window_days=90,
+                                  message="State license expires")
+        pending = mcp_tools.log_alert(db, provider_id=1, severity="info", window_days=30,
+                                      message="DEA DEA DEA registration pending")
+        mcp_tools.mark_alert_resolved(db, alert_id=old.id, resolution_note="Renewed with the DEA form")
+
+        def ids(**kwargs):
+            return [a.id for a in mcp_tools.search_alerts(db, **kwargs).items]
+
+        # Repeated terms rank higher; every word has to match
+        assert ids(query="dea")[0] == pending.id
+        assert set(ids(query="dea")) == {dea.id, old.id, pending.id}
+        assert ids(query="dea registration", order="recent") == [pending.id, dea.id]
+        assert ids(query="board certification") == [board.id]
+        assert ids(query='"certification board"') == []
+        assert ids(query="regist*", provider_id=1, status="open", order="recent") == [pending.id, dea.id]
+        # Resolution notes are indexed when the alert is resolved
+        assert ids(query="renewed", status="resolved") == [old.id]
+        assert ids(query="dea", severity="warning") == [old.id]
+        # FTS5 syntax is taken literally
+        assert ids(query='DEA AND "expires') == []
+        assert ids(query="expires NOT -- ( *") == []
+        with pytest.raises(ValueError):
+            mcp_tools.search_alerts(db, query=" -- ")
+
+        # Coalescing a duplicate does not index it twice
+        mcp_tools.log_alert(db, provider_id=2, severity="info", window_days=30,
+                            message="Board certification expires in 30 days")
+        assert ids(query="board") == [board.id]
+
+        # Both orders page through every match exactly once
+        for order in ("relevance", "recent"):
+            seen, cursor = [], None
+            while True:
+                page = mcp_tools.search_alerts(db, query="expires", order=order, limit=1, cursor=cursor)
+                seen += [a.id for a in page.items]
+                cursor = page.next_cursor
+                if cursor is None:
+                    break
+            assert sorted(seen) == sorted([dea.id, board.id, old.id])
+            assert seen == ids(query="expires", order=order)
+    finally:
+        db.close()
+
+    response = client.get("/api/alerts/search", params={"q": "expires", "status": "open", "order": "recent"})
+    assert response.status_code == 200
+    assert [a["id"] for a in response.json()["items"]] == [board.id, dea.id]
+    assert response.json()["items"][0]["score"] is None
+    hit = client.post("/mcp/tools/search_alerts", params={"query": "board"}).json()["items"][0]
+    assert hit["message"].startswith("Board") and hit["score"] < 0
+    assert client.get("/api/alerts/search", params={"q": "dea", "cursor": "bogus"}).status_code == 400
+    assert client.get("/api/alerts/search", params={"q": "dea", "order": "oldest"}).status_code == 400
+
+def test_get_open_alerts_pagination(client):
+    for i, severity in enumerate(["info", "critical", "warning", "critical", "info"]):
+        client.post("/mcp/tools/log_alert", json={
+            "provider_id": 1, "severity": severity, "window_days": 30, "message": str(i)
+        })
+    expected = [a["id"] for a in client.get("/api/alerts").json()]
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/alerts", params=params)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        seen.extend(a["id"] for a in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == expected
+
+    page = client.post("/mcp/tools/get_open_alerts_page", params={"limit": 3, "severity": "critical"}).json()
+    assert len(page["items"]) == 2
+    assert page["next_cursor"] is None
+
+    assert client.get("/api/alerts", params={"cursor": "garbage"}).status_code == 400
+
+def test_open_alerts_field_projection(client):
+    for i, severity in enumerate(["info", "critical", "warning"]):
+        client.post("/mcp/tools/log_alert", json={
+            "provider_id": i, "severity": severity, "window_days": 30, "message": "Renew DEA registration " * (i + 1)
+        })
+    full = client.get("/api/alerts").json()
+
+    alerts = client.get("/api/alerts", params={"fields": "provider_id, message", "max_message_chars": 30}).json()
+    assert [set(a) for a in alerts] == [{"id", "severity", "created_at", "provider_id", "message"}] * 3
+    assert [a["id"] for a in alerts] == [a["id"] for a in full]
+    for short, alert in zip(alerts, full):
+        assert short["created_at"] == alert["created_at"]
+        if len(alert["message"]) > 30:
+            assert len(short["message"]) == 30 and short["message"].endswith("…")
+            assert alert["message"].startswith(short["message"][:-1])
+        else:
+            assert short["message"] == alert["message"]
+
+    # Pages and their cursors work on projected rows
+    seen, cursor = [], None
+    while True:
+        page = client.post("/mcp/tools/get_open_alerts_page", params=dict(
+            {"limit": 2, "fields": "provider_id"}, **({"cursor": cursor} if cursor else {})
+        )).json()
+        assert all("message" not in a for a in page["items"])
+        seen += [a["id"] for a in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [a["id"] for a in full]
+
+    db = TestingSessionLocal()
+    try:
+        rows = mcp_tools.get_open_alert_rows(db, fields=["id"], max_message_chars=5)
+        assert [set(a) for a in rows] == [{"id", "severity", "created_at"}] * 3
+        streamed = list(mcp_tools.iter_open_alert_rows(db, fields=["resolution_note"]))
+        assert [a["resolution_note"] for a in streamed] == [None] * 3
+        with pytest.raises(ValueError):
+            mcp_tools.iter_open_alert_rows(db, fields=["password"])
+    finally:
+        db.close()
+    assert client.get("/api/alerts", params={"fields": "bogus"}).status_code == 400
+    assert client.get("/api/alerts/stream", params={"fields": "bogus"}).status_code == 400
+    assert client.post("/mcp/tools/get_open_alerts", params={"max_message_chars": 0}).status_code == 400
+
+def test_open_alert_rows_page_sorts():
+    db = TestingSessionLocal()
+    try:
+        for i, severity in enumerate(["info", "critical", "warning", "critical", "info"]):
+            mcp_tools.log_alert(db, provider_id=1, severity=severity, window_days=30, message=str(i))
+        mcp_tools.mark_alerts_resolved(db, alert_ids=[2])
+
+        def pages(sort):
+            seen, cursor = [], None
+            while True:
+                page = mcp_tools.get_open_alert_rows_page(db, limit=2, cursor=cursor, sort=sort, fields=["message"])
+                seen += [a["message"] for a in page["items"]]
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    return seen
+
+        assert pages("newest") == ["4", "3", "2", "0"]
+        assert pages("oldest") == ["0", "2", "3", "4"]
+        assert pages("severity") == [a.message for a in mcp_tools.get_open_alerts(db)]
+
+        # A cursor only continues the sort it came from
+        cursor = mcp_tools.get_open_alert_rows_page(db, limit=1, sort="newest")["next_cursor"]
+        with pytest.raises(ValueError):
+            mcp_tools.get_open_alert_rows_page(db, limit=1, cursor=cursor)
+        with pytest.raises(ValueError):
+            mcp_tools.get_open_alert_rows_page(db, sort="provider")
+    finally:
+        db.close()
+
+def test_stream_open_alerts(client):
+    for i in range(3):
+        client.post("/mcp/tools/log_alert", json={
+            "provider_id": i, "severity": "warning", "window_days": 30, "message": str(i)
+        })
+    response = client.get("/api/alerts/stream")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [a["id"] for a in lines] == [a["id"] for a in client.get("/api/alerts").json()]
+
+def test_summary_counters_track_writes():
+    db = TestingSessionLocal()
+    try:
+        a = mcp_tools.log_alert(db, provider_id=1, severity="critical", window_days=30, message="a")
+        mcp_tools.log_alert(db, provider_id=1, severity="info", window_days=30, message="b")
+        mcp_tools.log_alerts_bulk(db, [
+            {"provider_id": 2, "severity": "info", "window_days": 30, "message": "c"},
+            {"provider_id": 2, "severity": "warning", "window_days": 30, "message": "d"},
+        ])
+        mcp_tools.mark_alert_resolved(db, alert_id=a.id, resolution_note="done")
+        # Resolving twice must not count twice
+        mcp_tools.mark_alert_resolved(db, alert_id=a.id, resolution_note="again")
+
+        for window_days in (None, 1):
+            summary = mcp_tools.summarize_alerts(db, window_days=window_days)
+            assert summary.total_alerts == 4
+            assert summary.by_severity == {"info": 2, "warning": 1, "critical": 1}
+            assert summary.open_alerts == 3
+            assert summary.resolved_alerts == 1
+        assert counters.verify(db) == []
+        assert rollups.verify(db) == []
+
+        # Drift is detected and repaired by rebuild
+        db.query(AlertCounter).update({AlertCounter.total: 99})
+        db.commit()
+        assert counters.verify(db)
+        counters.rebuild(db)
+        assert counters.verify(db) == []
+        assert mcp_tools.summarize_alerts(db).total_alerts == 4
+    finally:
+        db.close()
+
+def test_summary_window_counts_partial_day_exactly():
+    db = TestingSessionLocal()
+    try:
+        old = datetime.utcnow() - timedelta(days=2, hours=1)
+        db.add(Alert(provider_id=1, severity="info", window_days=30, message="old", created_at=old))
+        counters.record_created(db, [(old, "info")])
+        db.commit()
+        mcp_tools.log_alert(db, provider_id=1, severity="info", window_days=30, message="new")
+
+        assert mcp_tools.summarize_alerts(db, window_days=2).total_alerts == 1
+        assert mcp_tools.summarize_alerts(db, window_days=3).total_alerts == 2
+    finally:
+        db.close()
+
+def test_read_cache_hits_and_write_invalidation(client):
+    client.post("/mcp/tools/log_alert", json={
+        "provider_id": 1, "severity": "info", "window_days": 30, "message": "a"
+    })
+    assert len(client.get("/api/alerts").json()) == 1
+    assert len(client.get("/api/alerts").json()) == 1
+    stats = client.get("/api/cache/stats").json()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+    # A write must never leave a stale entry behind
+    client.post("/mcp/tools/log_alert", json={
+        "provider_id": 1, "severity": "critical", "window_days": 30, "message": "b"
+    })
+    assert len(client.get("/api/alerts").json()) == 2
+    assert client.get("/api/summary").json()["total_alerts"] == 2
+
+def test_result_cache_lru_eviction():
+    cache = ResultCache(maxsize=2)
+    calls = []
+
+    @cache.cached
+    def lookup(db, key):
+        calls.append(key)
+        return [key]
+
+    lookup(None, 1)
+    lookup(None, 2)
+    lookup(None, 1)
+    lookup(None, 3)  # evicts 2, the least recently used
+    lookup(None, 1)
+    lookup(None, 2)
+    assert calls == [1, 2, 3, 2]
+    assert cache.stats()["evictions"] == 2
+
+    # Results computed before an invalidation are not stored
+    generation = cache.generation
+    cache.invalidate()
+    cache.put(("lookup", ("key", 9)), generation, [9])
+    assert cache.get(("lookup", ("key", 9))) == (False, None)
+
+def test_result_cache_hands_out_copies(client):
+    db = TestingSessionLocal()
+    try:
+        mcp_tools.log_alert(db, provider_id=1, severity="info", window_days=30, message="a")
+        first = mcp_tools.get_open_alerts(db)
+        first[0].message = "changed"
+        first.append(first[0])
+        rows = mcp_tools.get_open_alert_rows(db)
+        rows[0]["message"] = "changed"
+        summary = mcp_tools.summarize_alerts(db)
+        summary.by_severity["info"] = 99
+
+        for _ in range(2):
+            # Cached, and unaffected by what the earlier callers did with their results
+            assert [a.message for a in mcp_tools.get_open_alerts(db)] == ["a"]
+            assert [a["message"] for a in mcp_tools.get_open_alert_rows(db)] == ["a"]
+            assert mcp_tools.summarize_alerts(db).by_severity["info"] == 1
+        assert result_cache.stats()["hits"] == 6
+    finally:
+        db.close()
+
+def test_mark_alerts_resolved(client):
+    ids = client.post("/api/alerts/bulk", json=[
+        {"provider_id": 1, "credential_id": 10, "severity": "info", "window_days": 30, "message": "a"},
+        {"provider_id": 1, "credential_id": 11, "severity": "critical", "window_days": 30, "message": "b"},
+        {"provider_id": 2, "credential_id": 12, "severity": "warning", "window_days": 30, "message": "c"},
+        {"provider_id": 3, "credential_id": 13, "severity": "info", "window_days": 30, "message": "d"},
+    ]).json()["created_ids"]
+
+    response = client.post("/api/alerts/resolve", json={"provider_id": 1, "resolution_note": "renewed"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [a["id"] for a in data] == [ids[1], ids[0]]
+    assert all(a["resolution_note"] == "renewed" and a["resolved_at"] for a in data)
+
+    # Already-resolved alerts are not touched again
+    response = client.post("/mcp/tools/mark_alerts_resolved", json={"alert_ids": [ids[0], ids[2]]})
+    assert [a["id"] for a in response.json()] == [ids[2]]
+
+    assert client.post("/api/alerts/resolve", json={}).status_code == 400
+    assert [a["id"] for a in client.get("/api/alerts").json()] == [ids[3]]
+    summary = client.get("/api/summary").json()
+    assert summary["open_alerts"] == 1
+    assert summary["resolved_alerts"] == 3
+
+def test_batch_runs_tools_in_one_transaction(client):
+    first = client.post("/mcp/tools/log_alert", json={
+        "provider_id": 1, "severity": "warning", "window_days": 30, "message": "License expiring"
+    }).json()
+    invalidations, seq = result_cache.stats()["invalidations"], change_feed.last_seq
+
+    operations = [
+        {"tool": "get_open_alerts", "arguments": {"fields": ["provider_id"]}},
+        {"tool": "mark_alert_resolved", "arguments": {"alert_id": first["id"], "resolution_note": "Renewed"}},
+        {"tool": "log_alert", "arguments": {
+            "provider_id": 2, "severity": "critical", "window_days": 7, "message": "DEA expired"
+        }},
+        {"tool": "mark_alert_resolved", "arguments": {"alert_id": 999}},
+        {"tool": "summarize_alerts"},
+    ]
+    response = client.post("/mcp/tools/batch", json=operations)
+    assert response.status_code == 200
+    data = response.json()
+    # The failed resolve rolls everything back, and nothing after it runs
+    assert data["committed"] is False
+    assert [r["ok"] for r in data["results"]] == [True, True, True, False]
+    assert data["results"][3]["error"] == "Alert with id 999 not found"
+    assert client.post("/mcp/tools/summarize_alerts").json()["open_alerts"] == 1
+    assert (result_cache.stats()["invalidations"], change_feed.last_seq) == (invalidations, seq)
+
+    response = client.post("/mcp/tools/batch", params={"atomic": False}, json=operations + [
+        {"tool": "summarize_alerts", "arguments": {"archive_db": "x"}},
+        {"tool": "drop_alerts"},
+    ])
+    data = response.json()
+    assert data["committed"] is True
+    assert [r["ok"] for r in data["results"]] == [True, True, True, False, True, False, False]
+    assert data["results"][0]["result"] == [{
+        "provider_id": 1, "severity": "warning", "id": first["id"], "created_at": first["created_at"]
+    }]
+    # Reads see the writes before them
+    summary = data["results"][4]["result"]
+    assert (summary["open_alerts"], summary["resolved_alerts"]) == (1, 1)
+    assert "archive_db" in data["results"][5]["error"]
+    # One invalidation and one event per write, after the single commit
+    assert result_cache.stats()["invalidations"] == invalidations + 1
+    assert [e.type for e in change_feed.since(seq)[0]] == ["resolved", "created"]
+    assert client.post("/mcp/tools/summarize_alerts").json() == summary
+
+    response = client.post("/mcp/tools/batch", json=[{"tool": "summarize_alerts"}] * (mcp_tools.MAX_BATCH_OPERATIONS + 1))
+    assert response.status_code == 400
+
+def test_open_alert_working_set_matches_database(client):
+    from src.alert_mcp.working_set import open_alert_index
+
+    def post(path, **kwargs):
+        response = client.post(path, **kwargs)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    severities = ["info", "warning", "critical"]
+    for i in range(6):
+        post("/mcp/tools/log_alert", json={
+            "provider_id": i % 2, "severity": severities[i % 3], "window_days": 30, "message": f"Before load {i}"
+        })
+    db = TestingSessionLocal()
+    try:
+        assert open_alert_index.load(db) == 6
+        # Every write path updates the index once committed
+        ids = [post("/mcp/tools/log_alert", json={
+            "provider_id": 2, "severity": s, "window_days": 7, "message": "x" * 50
+        })["id"] for s in severities]
+        post("/mcp/tools/log_alert", json={"provider_id": 2, "severity": "info", "window_days": 7, "message": "x" * 50})
+        post("/mcp/tools/log_alerts_bulk", json=[
+            {"provider_id": 3, "severity": "critical", "window_days": 30, "message": "Bulk"},
+            {"provider_id": 0, "severity": "info", "window_days": 30, "message": "Before load 0"},
+        ])
+        post(f"/mcp/tools/mark_alert_resolved?alert_id={ids[1]}")
+        post("/mcp/tools/mark_alerts_resolved", json={"provider_id": 1, "severity": "warning"})
+        post("/mcp/tools/batch", json=[
+            {"tool": "mark_alert_resolved", "arguments": {"alert_id": ids[2]}},
+            {"tool": "log_alert", "arguments": {"provider_id": 4, "severity": "bogus", "window_days": 1, "message": "y"}},
+        ])
+
+        def sql(fn, **kwargs):
+            return fn.uncached(TestingSessionLocal(), **kwargs)
+
+        for filters in ({}, {"provider_id": 2}, {"severity": "info"}, {"provider_id": 0, "severity": "info"},
+                        {"provider_id": 9}, {"severity": "bogus"}):
+            assert mcp_tools.get_open_alerts(db, **filters) == sql(mcp_tools.get_open_alerts, **filters)
+            assert mcp_tools.count_open_alerts(db, **filters) == sql(mcp_tools.count_open_alerts, **filters)
+            options = dict(filters, fields=["message", "occurrence_count"], max_message_chars=20)
+            assert mcp_tools.get_open_alert_rows(db, **options) == sql(mcp_tools.get_open_alert_rows, **options)
+        assert mcp_tools.get_open_alert_rows(db) == sql(mcp_tools.get_open_alert_rows)
+        # The failed batch rolled its resolve back
+        assert mcp_tools.count_open_alerts(db) == {"critical": 4, "warning": 1, "info": 3}
+        with pytest.raises(ValueError):
+            mcp_tools.get_open_alert_rows(db, fields=["nope"])
+
+        assert client.get("/api/working_set/verify").json() == {"open_alerts": 8, "drift": [], "repaired": False}
+        # Writes behind the index's back show up as drift until repaired
+        with engine.begin() as conn:
+            conn.exec_driver_sql("UPDATE alerts SET message = 'edited' WHERE id = ?", (ids[0],))
+            conn.exec_driver_sql("DELETE FROM alerts WHERE provider_id = 3")
+        data = client.get("/api/working_set/verify", params={"repair": True}).json()
+        assert len(data["drift"]) == 2 and data["repaired"] is True
+        assert client.get("/api/working_set/verify").json()["drift"] == []
+        assert mcp_tools.get_open_alerts(db) == sql(mcp_tools.get_open_alerts)
+    finally:
+        open_alert_index.clear()
+        db.close()
+    assert client.get("/api/working_set/verify").status_code == 400
+
+def test_conditional_reads_with_change_sequence(client, monkeypatch, tool_sessions):
+    client.post("/mcp/tools/log_alert", json={"provider_id": 1, "severity": "info", "window_days": 30, "message": "a"})
+
+    # As if the write was a few seconds ago: Last-Modified (whole seconds) is
+    # only sent once the second of the last write is over
+    monkeypatch.setattr(result_cache, "changed_at", result_cache.changed_at - 3)
+    first = client.get("/api/summary")
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+    assert first.headers["cache-control"] == "no-cache"
+
+    def no_database(*args, **kwargs):
+        raise AssertionError("queried the database")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(mcp_tools, "summarize_alerts", no_database)
+        patch.setattr(mcp_tools, "get_open_alert_rows", no_database)
+        response = client.get("/api/summary", headers={"If-None-Match": etag})
+        assert response.status_code == 304 and response.content == b""
+        assert response.headers["etag"] == etag
+        # The ETag only depends on the data version, not on the route
+        assert client.get("/api/alerts", headers={"If-None-Match": f'"0", W/{etag}'}).status_code == 304
+        # Echoing Last-Modified back works like the ETag
+        assert client.get("/api/summary", headers={"If-Modified-Since": last_modified}).status_code == 304
+        future = "Fri, 01 Jan 2100 00:00:00 GMT"
+        assert client.get("/api/summary", headers={"If-Modified-Since": future}).status_code == 304
+
+    page = client.get("/api/alerts", params={"limit": 1}, headers={"If-None-Match": '"0"'})
+    assert page.status_code == 200 and page.headers["etag"] == etag
+
+    client.post("/mcp/tools/log_alert", json={"provider_id": 2, "severity": "critical", "window_days": 30, "message": "b"})
+    assert client.get("/api/summary", headers={"If-Modified-Since": last_modified}).status_code == 200
+    second = client.get("/api/summary", headers={"If-None-Match": etag})
+    assert second.status_code == 200 and second.json()["total_alerts"] == 2
+    assert int(second.headers["etag"].strip('"')) > int(etag.strip('"'))
+
+    # The MCP read tools take the sequence as since_seq
+    seq = int(second.headers["etag"].strip('"'))
+    assert json.loads(asyncio.run(main.summarize_alerts(since_seq=seq))) == {"seq": seq, "changed": False}
+    data = json.loads(asyncio.run(main.summarize_alerts(since_seq=seq - 1)))
+    assert data["seq"] == seq and data["changed"] is True and data["result"]["total_alerts"] == 2
+    assert asyncio.run(main.get_open_alerts(fields=["nope"], since_seq=0)).startswith("Error:")
+
+    # It is the change feed's sequence too: the write's event carries it
+    assert change_feed.last_seq == seq
+    events, complete = change_feed.since(int(etag.strip('"')))
+    assert complete and [e.seq for e in events][-1] == seq
+    # A write publishing no event (e.g. archiving) advances it, leaving the feed resumable
+    result_cache.invalidate()
+    assert change_feed.since(seq) == ([], True)
+    assert json.loads(asyncio.run(main.summarize_alerts(since_seq=seq)))["changed"] is True
+
+def test_mark_alert_resolved_not_found(client):
+    response = client.post("/mcp/tools/mark_alert_resolved", params={"alert_id": 999})
+    assert response.status_code == 404
+
+def test_log_alert_coalesces_open_duplicates(client):
+    payload = {"provider_id": 1, "credential_id": 5, "severity": "warning",
+               "window_days": 30, "message": "License expires in 30 days"}
+    first = client.post("/mcp/tools/log_alert", json=payload).json()
+    second = client.post("/mcp/tools/log_alert", json=payload).json()
+    assert second["id"] == first["id"]
+    assert second["occurrence_count"] == 2
+    assert second["last_seen_at"] >= first["last_seen_at"]
+
+    # A different window is a different alert
+    other = client.post("/mcp/tools/log_alert", json=dict(payload, window_days=7)).json()
+    assert other["id"] != first["id"]
+
+    result = client.post("/api/alerts/bulk", json=[payload, payload]).json()
+    assert result["created_ids"] == [first["id"], first["id"]]
+    assert result["coalesced"] == 2
+
+    alerts = client.get("/api/alerts").json()
+    assert len(alerts) == 2
+    assert client.get("/api/summary").json()["total_alerts"] == 2
+
+    # Once resolved, the same alert opens a fresh row
+    client.post("/mcp/tools/mark_alert_resolved", params={"alert_id": first["id"]})
+    reopened = client.post("/mcp/tools/log_alert", json=payload).json()
+    assert reopened["id"] != first["id"]
+    assert reopened["occurrence_count"] == 1
+
+def test_change_feed_publishes_committed_writes():
+    feed_start = change_feed.last_seq
+    db = TestingSessionLocal()
+    try:
+        a = mcp_tools.log_alert(db, provider_id=1, severity="critical", window_days=30, message="a")
+        mcp_tools.log_alert(db, provider_id=1, severity="critical", window_days=30, message="a")
+        mcp_tools.log_alert(db, provider_id=2, severity="info", window_days=30, message="b")
+        mcp_tools.mark_alert_resolved(db, alert_id=a.id)
+    finally:
+        db.close()
+
+    events, complete = change_feed.since(feed_start)
+    assert complete
+    assert [e.type for e in events] == ["created", "coalesced", "created", "resolved"]
+    assert events[-1].alert["id"] == a.id
+
+    events, _ = change_feed.since(feed_start, provider_id=2)
+    assert [e.alert["message"] for e in events] == ["b"]
+
+    # A sequence number this process never issued cannot be resumed from
+    assert change_feed.since(change_feed.last_seq + 5)[1] is False
+
+def test_change_feed_sse_stream_resumes_and_goes_live():
+    feed = ChangeFeed(history=10)
+    feed.publish("created", {"id": 1, "provider_id": 1, "severity": "info"})
+    feed.publish("created", {"id": 2, "provider_id": 2, "severity": "critical"})
+
+    async def consume():
+        stream = sse_stream(feed, since=0, severity="critical", keepalive=0.05)
+        chunks = [await stream.__anext__()]
+        chunks.append(await stream.__anext__())  # keepalive while idle
+        feed.publish("resolved", {"id": 2, "provider_id": 2, "severity": "critical"})
+        chunks.append(await stream.__anext__())
+        await stream.aclose()
+        return chunks
+
+    replayed, keepalive, live = asyncio.run(consume())
+    assert replayed.startswith("id: 2\nevent: created\n")
+    assert keepalive == ": keepalive\n\n"
+    assert live.startswith("id: 3\nevent: resolved\n")
+
+    # Resuming from before the retained history yields a reset
+    for i in range(20):
+        feed.publish("created", {"id": 10 + i, "provider_id": 1, "severity": "info"})
+
+    async def first():
+        stream = sse_stream(feed, since=1)
+        try:
+            return await stream.__anext__()
+        finally:
+            await stream.aclose()
+
+    assert asyncio.run(first()).startswith("event: reset\n")
+
+def test_mcp_change_feed_resource():
+    from src.alert_mcp.main import alert_changes_since, _feed_filters
+
+    assert _feed_filters("alerts://changes") == (None, None)
+    assert _feed_filters("alerts://changes/5/7/any") == (7, None)
+    assert _feed_filters("alerts://other") is None
+
+    before = change_feed.last_seq
+    change_feed.publish("created", {"id": 1, "provider_id": 7, "severity": "critical"})
+    change_feed.publish("created", {"id": 2, "provider_id": 8, "severity": "critical"})
+    data = json.loads(alert_changes_since(str(before), "7", "any"))
+    assert data["complete"] is True
+    assert [e["alert"]["id"] for e in data["events"]] == [1]
+
+def test_archive_resolved_alerts(client):
+    db = TestingSessionLocal()
+    archive_db = TestingArchiveSessionLocal()
+    try:
+        old = [
+            mcp_tools.log_alert(db, provider_id=1, severity="critical", window_days=30, message=f"old {i}")
+            for i in range(3)
+        ]
+        recent = mcp_tools.log_alert(db, provider_id=1, severity="info", window_days=30, message="recent")
+        mcp_tools.log_alert(db, provider_id=2, severity="warning", window_days=30, message="open")
+        mcp_tools.mark_alerts_resolved(db, alert_ids=[a.id for a in old] + [recent.id])
+        db.query(Alert).filter(Alert.id.in_([a.id for a in old])).update(
+            {Alert.resolved_at: datetime.utcnow() - timedelta(days=100)}, synchronize_session=False
+        )
+        db.commit()
+        rollups.rebuild(db)
+
+        archived = retention.archive_resolved_alerts(db, archive_db, older_than_days=90, batch_size=2)
+        assert archived == 3
+        assert db.query(Alert).count() == 2
+        assert sorted(a.id for a in archive_db.query(ArchivedAlert)) == sorted(a.id for a in old)
+        assert counters.verify(db) == []
+        assert rollups.verify(db) == []
+        # Archived alerts leave the search index
+        assert [a.id for a in mcp_tools.search_alerts(db, query="old").items] == []
+        assert [a.id for a in mcp_tools.search_alerts(db, query="recent").items] == [recent.id]
+        # The archived alerts' buckets are empty now and get pruned
+        assert rollups.prune(db) > 0
+        assert db.query(AlertRollup).filter(AlertRollup.alerts == 0).count() == 0
+        assert rollups.verify(db) == []
+        # Nothing left to move
+        assert retention.archive_resolved_alerts(db, archive_db, older_than_days=90) == 0
+
+        summary = mcp_tools.summarize_alerts(db)
+        assert summary.total_alerts == 2
+        assert summary.by_severity == {"info": 1, "warning": 1, "critical": 0}
+        summary = mcp_tools.summarize_alerts(db, archive_db=archive_db)
+        assert summary.total_alerts == 5
+        assert summary.resolved_alerts == 4
+        assert summary.open_alerts == 1
+
+        response = client.get("/api/summary", params={"include_archive": True, "window_days": 7})
+        assert response.json()["by_severity"]["critical"] == 3
+        assert client.get("/api/summary").json()["total_alerts"] == 2
+    finally:
+        db.close()
+        archive_db.close()
+
+def test_archive_keeps_alerts_whose_id_was_archived(client):
+    db = TestingSessionLocal()
+    archive_db = TestingArchiveSessionLocal()
+    try:
+        alerts = [
+            mcp_tools.log_alert(db, provider_id=1, severity="warning", window_days=30, message=f"old {i}")
+            for i in range(3)
+        ]
+        mcp_tools.mark_alerts_resolved(db, alert_ids=[a.id for a in alerts])
+        db.query(Alert).update({Alert.resolved_at: datetime.utcnow() - timedelta(days=100)})
+        db.commit()
+        rows = {row.id: row for row in db.execute(select(*Alert.__table__.c))}
+        now = datetime.utcnow()
+        # alerts[0] was archived before, but the batch stopped before the delete
+        archive_db.add(ArchivedAlert(**rows[alerts[0].id]._mapping, archived_at=now))
+        # alerts[1]'s id belongs to a different alert archived from a database that reused ids
+        archive_db.add(ArchivedAlert(**dict(rows[alerts[1].id]._mapping, message="reused"), archived_at=now))
+        archive_db.commit()
+
+        assert retention.archive_resolved_alerts(db, archive_db, older_than_days=90, batch_size=2) == 2
+        assert [a.id for a in db.query(Alert)] == [alerts[1].id]
+        assert {a.id: a.message for a in archive_db.query(ArchivedAlert)} == {
+            alerts[0].id: "old 0", alerts[1].id: "reused", alerts[2].id: "old 2"
+        }
+        assert counters.verify(db) == []
+        # The kept alert is skipped, not retried
+        assert retention.archive_resolved_alerts(db, archive_db, older_than_days=90) == 0
+    finally:
+        db.close()
+        archive_db.close()
+
+def test_compact_vacuums_freed_pages(tmp_path):
+    file_engine = make_engine(str(tmp_path / "alerts.db"))
+    init_db(bind=file_engine)
+    with file_engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO alerts (provider_id, severity, severity_rank, window_days, message, channel, created_at) "
+            "VALUES (1, 'info', 1, 30, ?, 'ui', CURRENT_TIMESTAMP)",
+            [("x" * 2000,) for _ in range(200)]
+        )
+        conn.exec_driver_sql("DELETE FROM alerts")
+
+    # Nothing to reclaim in auto mode below the threshold
+    assert retention.compact(file_engine, vacuum=False) is False
+    assert retention.compact(file_engine) is True
+    with file_engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA freelist_count").scalar() == 0
+    assert retention.compact(file_engine) is False
+    file_engine.dispose()
+
+def test_fast_read_path_matches_alert_read_json(client):
+    db = TestingSessionLocal()
+    try:
+        mcp_tools.log_alert(db, provider_id=1, severity="critical", window_days=30, message="Ablauf \u00e9 \"soon\"")
+        mcp_tools.log_alert(db, provider_id=1, severity="critical", window_days=30, message="Ablauf \u00e9 \"soon\"")
+        mcp_tools.log_alert(db, provider_id=2, credential_id=7, severity="info", window_days=7, message="b")
+        # A timestamp without a fractional part
+        db.add(Alert(
+            provider_id=3, severity="warning", window_days=30, message="c", channel="email",
+            created_at=datetime(2024, 1, 2, 3, 4, 5), last_seen_at=datetime(2024, 1, 2, 3, 4, 5)
+        ))
+        db.commit()
+        result_cache.clear()
+
+        expected = mcp_tools.get_open_alerts(db)
+        assert len(expected) == 3
+        assert mcp_tools.dump_json(mcp_tools.get_open_alert_rows(db)) == \
+            "[" + ",".join(a.model_dump_json() for a in expected) + "]"
+        assert [mcp_tools.dump_json(a) for a in mcp_tools.iter_open_alert_rows(db, batch_size=2)] == \
+            [a.model_dump_json() for a in expected]
+
+        page = mcp_tools.get_open_alert_rows_page(db, limit=2)
+        assert mcp_tools.dump_json(page) == mcp_tools.get_open_alerts_page(db, limit=2).model_dump_json()
+        next_page = mcp_tools.get_open_alert_rows_page(db, limit=2, cursor=page["next_cursor"])
+        assert [a["id"] for a in next_page["items"]] == [expected[2].id]
+        assert next_page["next_cursor"] is None
+
+        response = client.get("/api/alerts", params={"limit": 2})
+        assert response.json() == page["items"]
+        assert response.headers["X-Next-Cursor"] == page["next_cursor"]
+        assert client.get("/api/alerts").json() == [a.model_dump(mode="json") for a in expected]
+    finally:
+        db.close()
+
+def test_metrics_endpoint_records_routes_and_sql(client, tmp_path):
+    calls = metrics.TOOL_CALLS.value("/api/alerts", "http")
+    errors = metrics.TOOL_ERRORS.value("/api/alerts/{alert_id}/resolve", "http")
+    client.post("/api/log_alert", json={"provider_id": 1, "severity": "info", "window_days": 30, "message": "m"})
+    client.get("/api/alerts")
+    client.get("/api/alerts", params={"provider_id": 1})
+    assert client.post("/api/alerts/999/resolve").status_code == 404
+
+    assert metrics.TOOL_CALLS.value("/api/alerts", "http") == calls + 2
+    assert metrics.TOOL_ERRORS.value("/api/alerts/{alert_id}/resolve", "http") == errors + 1
+
+    # Statement timings, rows and pool waits of an instrumented engine
+    file_engine = make_engine(str(tmp_path / "metrics.db"), name="metrics-test")
+    init_db(bind=file_engine)
+    db = sessionmaker(bind=file_engine)()
+    try:
+        for i in range(3):
+            mcp_tools.log_alert(db, provider_id=1, severity="info", window_days=30, message=str(i))
+        assert len(mcp_tools.get_open_alert_rows(db)) == 3
+    finally:
+        db.close()
+        file_engine.dispose()
+    assert metrics.DB_STATEMENT_LATENCY.count("metrics-test", "INSERT") >= 3
+    assert metrics.DB_ROWS_RETURNED.value("metrics-test", "SELECT") >= 3
+    assert metrics.DB_ROWS_AFFECTED.value("metrics-test", "INSERT") >= 3
+    assert metrics.DB_POOL_WAIT.count("metrics-test") > 0
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'alert_tool_calls_total{tool="/api/alerts",interface="http"}' in body
+    assert 'alert_tool_duration_seconds_bucket{tool="/api/alerts",interface="http",le="+Inf"}' in body
+    assert 'alert_db_statement_duration_seconds_count{engine="metrics-test",statement="INSERT"}' in body
+    assert "alert_cache_hits_total" in body
+    for line in body.splitlines():
+        assert line.startswith("#") or re.match(r'^[a-z_]+(\{.*\})? [-+0-9.eInf]+$', line), line
+
+def test_group_commit_batches_concurrent_log_alerts(client, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from src.alert_mcp import group_commit
+
+    writer = group_commit.GroupCommitWriter(TestingSessionLocal, max_rows=50, window_ms=200)
+    before = group_commit.BATCH_ROWS.count()
+    alert = {"provider_id": 1, "severity": "warning", "window_days": 30, "channel": "ui"}
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(
+            lambda i: writer.submit(message=f"Expiring {i % 6}", credential_id=i % 6, **alert),
+            range(12)
+        ))
+    writer.stop()
+
+    # Fewer commits than calls, and repeats within a batch coalesce
+    assert group_commit.BATCH_ROWS.count() - before < 12
+    assert len({r.id for r in results}) == 6
+    db = TestingSessionLocal()
+    try:
+        assert db.query(Alert).count() == 6
+        assert {a.occurrence_count for a in db.query(Alert)} == {2}
+        assert counters.verify(db) == []
+    finally:
+        db.close()
+
+    with pytest.raises(ValueError):
+        writer.submit(message="x", **dict(alert, severity="bogus"))
+
+    # Fire-and-forget rows are committed by stop()
+    writer.submit(wait=False, message="Queued", **alert)
+    writer.stop()
+    db = TestingSessionLocal()
+    try:
+        assert db.query(Alert).filter(Alert.message == "Queued").count() == 1
+    finally:
+        db.close()
+
+    # The REST route answers 202 without waiting for the commit
+    monkeypatch.setattr(group_commit, "ALERT_GROUP_COMMIT", True)
+    monkeypatch.setattr(group_commit, "writer", writer)
+    response = client.post("/api/log_alert?fire_and_forget=true", json=dict(alert, message="Queued 2"))
+    assert response.status_code == 202
+    response = client.post("/mcp/tools/log_alert", json=dict(alert, message="Waited"))
+    assert response.status_code == 200
+    assert response.json()["message"] == "Waited"
+    writer.stop()
+
+def test_group_commit_retries_only_the_failed_shard():
+    from src.alert_mcp import group_commit, shards
+
+    shard_engines = [
+        create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        for _ in range(2)
+    ]
+    for index, shard_engine in enumerate(shard_engines):
+        init_db(bind=shard_engine, shard=index)
+    factories = [sessionmaker(bind=e) for e in shard_engines]
+    on_shard = {shards.shard_for_provider(p, 2): p for p in range(10)}
+    alert = {"severity": "warning", "window_days": 30, "channel": "ui"}
+
+    shard_set = shards.ShardSet(factories)
+    try:
+        existing = mcp_tools.log_alert(shard_set, provider_id=on_shard[0], message="Expiring", **alert)
+    finally:
+        shard_set.close()
+    feed_start = change_feed.last_seq
+
+    def fail(conn):
+        raise RuntimeError("disk I/O error")
+
+    event.listen(shard_engines[1], "commit", fail)
+    writer = group_commit.GroupCommitWriter(lambda: shards.ShardSet(factories), window_ms=200)
+    try:
+        futures = [
+            writer.enqueue(provider_id=on_shard[0], message="Expiring", **alert),
+            writer.enqueue(provider_id=on_shard[0], message="New", **alert),
+            writer.enqueue(provider_id=on_shard[1], message="Lost", **alert),
+        ]
+        coalesced, created = futures[0].result(5), futures[1].result(5)
+        with pytest.raises(RuntimeError, match="disk I/O"):
+            futures[2].result(5)
+    finally:
+        writer.stop()
+        event.remove(shard_engines[1], "commit", fail)
+
+    # The rows on the shard that committed went in exactly once
+    assert coalesced.id == existing.id and coalesced.occurrence_count == 2
+    assert created.occurrence_count == 1
+    assert sorted(e.type for e in change_feed.since(feed_start)[0]) == ["coalesced", "created"]
+    with shard_engines[0].connect() as conn:
+        assert conn.exec_driver_sql("SELECT occurrence_count FROM alerts ORDER BY id").scalars().all() == [2, 1]
+    with shard_engines[1].connect() as conn:
+        assert conn.exec_driver_sql("SELECT count(*) FROM alerts").scalar() == 0
+
+def test_init_db_upgrades_legacy_database_to_shard(tmp_path):
+    from src.alert_mcp import shards
+
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy.begin() as conn:
+        conn.exec_driver_sql(LEGACY_ALERTS_DDL)
+        conn.exec_driver_sql(
+            "INSERT INTO alerts (provider_id, severity, window_days, message, channel, created_at) "
+            "VALUES (1, 'warning', 30, 'old', 'ui', CURRENT_TIMESTAMP)"
+        )
+
+    init_db(bind=legacy, shard=2)
+
+    db = sessionmaker(bind=legacy)()
+    try:
+        alert = mcp_tools.log_alert(db, provider_id=1, severity="info", window_days=30, message="new")
+        assert alert.id == 2 * shards.ALERT_ID_STRIDE + 1
+        assert shards.shard_for_alert(alert.id) == 2
+        # Ids stay unique once the newest alert is gone
+        db.query(Alert).filter(Alert.id == alert.id).delete()
+        db.commit()
+        again = mcp_tools.log_alert(db, provider_id=1, severity="info", window_days=30, message="again")
+        assert again.id == alert.id + 1
+        assert [a.message for a in mcp_tools.search_alerts(db, query="old").items] == ["old"]
+    finally:
+        db.close()
+        legacy.dispose()
+
+def test_sharded_storage_matches_single_database():
+    from src.alert_mcp import shards
+
+    shard_engines = [
+        create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        for _ in range(3)
+    ]
+    for index, shard_engine in enumerate(shard_engines):
+        init_db(bind=shard_engine, shard=index)
+    shard_set = shards.ShardSet([sessionmaker(bind=e) for e in shard_engines])
+    single = TestingSessionLocal()
+
+    def both(fn, **kwargs):
+        # The result cache does not tell the two apart
+        result_cache.clear()
+        sharded = fn(shard_set, **kwargs)
+        result_cache.clear()
+        return sharded, fn(single, **kwargs)
+
+    def strip(alerts):
+        return [(a.provider_id, a.severity, a.message) for a in alerts]
+
+    try:
+        severities = ["info", "warning", "critical"]
+        for i in range(24):
+            both(mcp_tools.log_alert, provider_id=i % 8, severity=severities[i % 3],
+                 window_days=30, message=f"DEA registration {i}")
+        sharded, plain = both(mcp_tools.log_alerts_bulk, alerts=[
+            {"provider_id": 5, "severity": "critical", "window_days": 30, "message": "Board certification"},
+            {"provider_id": 1, "severity": "bogus", "window_days": 30, "message": "x"},
+            {"severity": "info", "window_days": 30, "message": "no provider"},
+            {"provider_id": 6, "severity": "info", "window_days": 30, "message": "DEA registration 6"},
+        ])
+        assert [e.index for e in sharded.errors] == [e.index for e in plain.errors] == [1, 2]
+        assert sharded.coalesced == plain.coalesced == 1
+        assert len(sharded.created_ids) == 2
+
+        # Each alert lives on its provider's shard, in that shard's id range
+        for index, shard_engine in enumerate(shard_engines):
+            with shard_engine.connect() as conn:
+                for alert_id, provider_id in conn.exec_driver_sql("SELECT id, provider_id FROM alerts"):
+                    assert shards.shard_for_provider(provider_id, 3) == index
+                    assert shards.shard_for_alert(alert_id) == index
+
+        sharded, plain_all = both(mcp_tools.get_open_alerts)
+        assert strip(sharded) == strip(plain_all) and len(plain_all) == 25
+        assert strip(mcp_tools.iter_open_alerts(shard_set)) == strip(plain_all)
+        sharded, plain = both(mcp_tools.get_open_alert_rows, severity="critical")
+        assert [a["message"] for a in sharded] == [a["message"] for a in plain]
+
+        # Paging over the shards yields the same sequence
+        for fn, items in ((mcp_tools.get_open_alerts_page, lambda p: p.items),
+                          (mcp_tools.get_open_alert_rows_page, lambda p: p["items"])):
+            seen, cursor = [], None
+            while True:
+                result_cache.clear()
+                page = fn(shard_set, limit=4, cursor=cursor)
+                seen += [a.message if hasattr(a, "message") else a["message"] for a in items(page)]
+                cursor = page.next_cursor if hasattr(page, "next_cursor") else page["next_cursor"]
+                if cursor is None:
+                    break
+            assert seen == [a.message for a in plain_all]
+
+        # A provider-scoped read touches only that provider's shard
+        scoped = shards.ShardSet([sessionmaker(bind=e) for e in shard_engines])
+        result_cache.clear()
+        alerts = mcp_tools.get_open_alerts(scoped, provider_id=3)
+        assert {a.provider_id for a in alerts} == {3}
+        assert list(scoped._sessions) == [shards.shard_for_provider(3, 3)]
+        scoped.close()
+
+        sharded, plain = both(mcp_tools.summarize_alerts)
+        assert sharded == plain
+
+        target = mcp_tools.get_open_alerts(shard_set, provider_id=2)[0]
+        resolved = mcp_tools.mark_alert_resolved(shard_set, alert_id=target.id, resolution_note="Renewed")
+        assert resolved.resolved_at is not None
+        with pytest.raises(ValueError):
+            mcp_tools.mark_alert_resolved(shard_set, alert_id=5 * shards.ALERT_ID_STRIDE)
+        ids = [a.id for a in mcp_tools.get_open_alerts(shard_set, severity="critical")]
+        assert len({shards.shard_for_alert(i) for i in ids}) > 1
+        assert sorted(a.id for a in mcp_tools.mark_alerts_resolved(shard_set, alert_ids=ids)) == sorted(ids)
+        mcp_tools.mark_alert_resolved(single, alert_id=[a.id for a in mcp_tools.get_open_alerts(single, provider_id=2)][0],
+                                      resolution_note="Renewed")
+        mcp_tools.mark_alerts_resolved(single, severity="critical")
+
+        sharded, plain = both(mcp_tools.alert_analytics, group_by=["provider_id", "status"])
+        assert [(g.key, g.total_alerts, g.resolved_alerts) for g in sharded.groups] == \
+            [(g.key, g.total_alerts, g.resolved_alerts) for g in plain.groups]
+        for index in range(3):
+            db = shard_set.session(index)
+            assert counters.verify(db) == [] and rollups.verify(db) == []
+
+        # Search pages through every shard's matches exactly once
+        for order in ("relevance", "recent"):
+            seen, cursor = [], None
+            while True:
+                result_cache.clear()
+                page = mcp_tools.search_alerts(shard_set, query="dea", order=order, limit=5, cursor=cursor)
+                seen += [a.message for a in page.items]
+                cursor = page.next_cursor
+                if cursor is None:
+                    break
+            assert sorted(seen) == sorted(a.message for a in mcp_tools.search_alerts(single, query="dea", limit=100).items)
+        with pytest.raises(ValueError):
+            mcp_tools.search_alerts(shard_set, query="dea", cursor=mcp_tools._encode_search_cursor(["recent", 1]))
+    finally:
+        shard_set.close()
+        single.close()
+        for shard_engine in shard_engines:
+            shard_engine.dispose()
+
+def test_slow_tools_do_not_stall_the_event_loop(client, monkeypatch, tool_sessions):
+    def slow_summary(db, window_days=None, archive_db=None):
+        time.sleep(0.5)
+        return AlertSummary(window_days=window_days, total_alerts=0, by_severity={})
+
+    monkeypatch.setattr(mcp_tools, "summarize_alerts", slow_summary)
+    client.post("/mcp/tools/log_alert", json={"provider_id": 1, "severity": "info", "window_days": 30, "message": "a"})
+
+    async def load():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            # Cached from here on, so the fast calls below only wait on the event loop
+            await http.post("/mcp/tools/get_open_alerts")
+
+            async def fast_call():
+                start = time.perf_counter()
+                response = await http.post("/mcp/tools/get_open_alerts")
+                assert response.status_code == 200
+                return time.perf_counter() - start
+
+            async def loop_lag():
+                # How late the event loop wakes a sleeper while the slow calls run
+                worst = 0.0
+                for _ in range(40):
+                    start = time.perf_counter()
+                    await asyncio.sleep(0.01)
+                    worst = max(worst, time.perf_counter() - start - 0.01)
+                return worst
+
+            slow = [http.post("/mcp/tools/summarize_alerts"), main.summarize_alerts(), main.summarize_alerts()]
+            slow_tasks = [asyncio.ensure_future(call) for call in slow]
+            await asyncio.sleep(0.05)
+            lag_task = asyncio.ensure_future(loop_lag())
+            latencies = await asyncio.gather(*(fast_call() for _ in range(50)))
+            await asyncio.gather(*slow_tasks)
+            return sorted(latencies), await lag_task
+
+    latencies, lag = asyncio.run(load())
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    # Were the slow calls run on the event loop, everything would wait ~0.5s each
+    assert p99 < 0.25, latencies
+    assert lag < 0.25
+
+def test_stateless_streamable_http_mcp(monkeypatch, lifespan_databases, tool_sessions):
+    monkeypatch.setattr(
+        mcp_tools, "summarize_alerts",
+        lambda db, window_days=None, archive_db=None: AlertSummary(
+            window_days=window_days, total_alerts=3, by_severity={"critical": 3}
+        )
+    )
+    # FastMCP's DNS rebinding protection only admits localhost Host headers
+    headers = {"Accept": "application/json, text/event-stream"}
+
+    def rpc(client, id, method, params=None):
+        response = client.post(
+            "/mcp", headers=headers, json={"jsonrpc": "2.0", "id": id, "method": method, "params": params or {}}
+        )
+        assert response.status_code == 200, response.text
+        # No session to stick to: every request stands alone
+        assert "mcp-session-id" not in response.headers
+        return response.json()["result"]
+
+    with TestClient(app, base_url="http://localhost:8000") as client:
+        init = rpc(client, 1, "initialize", {
+            "protocolVersion": "2025-03-26", "capabilities": {}, "clientInfo": {"name": "test", "version": "1"}
+        })
+        assert init["serverInfo"]["name"]
+        tools = {tool["name"] for tool in rpc(client, 2, "tools/list")["tools"]}
+        assert {"log_alert", "get_open_alerts", "summarize_alerts"} <= tools
+        result = rpc(client, 3, "tools/call", {"name": "summarize_alerts", "arguments": {"window_days": 7}})
+        assert json.loads(result["content"][0]["text"])["total_alerts"] == 3
+        # The REST tool routes under /mcp/ are unaffected
+        assert client.post("/mcp/tools/summarize_alerts").json()["total_alerts"] == 3
+
+    # A new client (and event loop) starts a new session manager
+    with TestClient(app, base_url="http://localhost:8000") as client:
+        assert rpc(client, 1, "tools/list")["tools"]
@@ -0,0 +1,39 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from benchmarks import bench_startup
+from benchmarks.datagen import generate
+from src.alert_mcp import counters, mcp_tools
+from src.alert_mcp.cache import result_cache
+from src.alert_mcp.db import make_engine
+from src.alert_mcp.models import Alert
+
+def test_datagen_builds_a_consistent_realistic_table():
+    result_cache.clear()
+    engine = make_engine(":memory:")
+    generate(engine, 5000, seed=1, providers=50, batch_size=1000)
+
+    with Session(bind=engine) as db:
+        assert db.query(Alert).count() == 5000
+        assert counters.verify(db) == []
+
+        resolved = db.query(Alert).filter(Alert.resolved_at != None).count()
+        assert 0.75 < resolved / 5000 < 0.85
+        by_severity = dict(db.query(Alert.severity, func.count(Alert.id)).group_by(Alert.severity))
+        assert by_severity["info"] > by_severity["warning"] > by_severity["critical"]
+        # Zipf: the first provider owns more alerts than any other
+        by_provider = db.query(Alert.provider_id, func.count(Alert.id)).group_by(Alert.provider_id).all()
+        assert max(by_provider, key=lambda row: row[1])[0] == 1
+
+        # The generated rows read back through the tools like real ones
+        summary = mcp_tools.summarize_alerts(db)
+        assert summary.total_alerts == 5000
+        assert summary.resolved_alerts == resolved
+        assert len(mcp_tools.get_open_alert_rows(db)) == 5000 - resolved
+    engine.dispose()
+
+def test_startup_within_budget_and_lazy():
+    results = bench_startup.measure(repeat=1, budgets=bench_startup.BUDGETS_MS)
+    for result in results:
+        assert result["eagerly_loaded"] == [], result
+        assert not result["over_budget"], result
@@ -0,0 +1,198 @@
+"""
+Query-plan regression harness.
+
+Runs every statement (SELECT, UPDATE, INSERT and DELETE) issued by the tools
+in mcp_tools through EXPLAIN QUERY PLAN and fails if SQLite falls back to a
+full scan of the alerts table or a temporary B-tree sort. Scans *of an
+index* are fine: walking a partial index in order is exactly how the
+open-alert listing is meant to be served. alert_counters and alert_rollups
+hold rows per day (and provider), not per alert, so scanning them, and
+sorting them to group, is O(buckets) and allowed. So is grouping the
+alerts of the partial first day alert_analytics adds to the rollups, which
+a range search over ix_alerts_created_window bounds to less than a day.
+
+The plans are taken on a few thousand alerts across providers, severities
+and days, after ANALYZE, so the planner weighs the indexes as it would on a
+real database rather than on an empty one.
+"""
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.alert_mcp import counters, mcp_tools, retention, rollups
+from src.alert_mcp.cache import result_cache
+from src.alert_mcp.db import init_db
+from src.alert_mcp.models import Alert, ArchiveBase, SEVERITY_RANK
+
+BAD_PLAN = re.compile(r"^SCAN alerts$|USE TEMP B-TREE")
+GROUPED_READ = re.compile(
+    r"^(SCAN|SEARCH) (alert_counters|alert_rollups)\b"
+    r"|^SEARCH alerts USING INDEX ix_alerts_created_window \(created_at>\? AND created_at<\?\)$"
+)
+
+SEED_ALERTS = 3000
+SEED_PROVIDERS = 40
+SEED_DAYS = 60
+
+def _seed(db):
+    """SEED_ALERTS alerts over the last SEED_DAYS days; a third of them resolved."""
+    now = datetime.utcnow()
+    severities = list(SEVERITY_RANK)
+    rows = []
+    for i in range(SEED_ALERTS):
+        created_at = now - timedelta(days=i % SEED_DAYS, minutes=i)
+        resolved = i % 3 == 0
+        rows.append({
+            "provider_id": i % SEED_PROVIDERS,
+            "credential_id": i % 500,
+            "severity": severities[i % len(severities)],
+            "window_days": 30,
+            "message": f"License {i} expires soon",
+            "channel": "ui" if i % 2 else "email",
+            "created_at": created_at,
+            "last_seen_at": created_at,
+            "resolved_at": created_at + timedelta(hours=i % 72) if resolved else None,
+        })
+    db.execute(insert(Alert), rows)
+    counters.rebuild(db)
+    rollups.rebuild(db)
+    db.commit()
+
+@pytest.fixture(scope="module")
+def seeded():
+    """The seeded and analyzed database, copied into every test's own."""
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    init_db(bind=engine)
+    db = sessionmaker(bind=engine)()
+    _seed(db)
+    db.close()
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def captured(seeded):
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    source, target = seeded.raw_connection(), engine.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        source.close()
+        target.close()
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "INSERT", "DELETE")):
+            # An executemany's plan is the same for every parameter set (and
+            # an "insertmanyvalues" batch has already been made one statement)
+            statements.append((statement, parameters[0] if isinstance(parameters, list) else parameters))
+
+    db = sessionmaker(bind=engine)()
+    result_cache.clear()
+    yield db, engine, statements
+    db.close()
+    engine.dispose()
+
+def _plan(engine, statement, parameters):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [row[-1] for row in rows]
+
+TOOL_QUERIES = {
+    "get_open_alerts": lambda db: mcp_tools.get_open_alerts(db),
+    "get_open_alerts[provider]": lambda db: mcp_tools.get_open_alerts(db, provider_id=1),
+    "get_open_alerts[severity]": lambda db: mcp_tools.get_open_alerts(db, severity="critical"),
+    "get_open_alerts[provider,severity]": lambda db: mcp_tools.get_open_alerts(db, provider_id=1, severity="info"),
+    "get_open_alerts_page[cursor]": lambda db: mcp_tools.get_open_alerts_page(
+        db, limit=1, cursor=mcp_tools.get_open_alerts_page(db, limit=1).next_cursor
+    ),
+    "get_open_alerts_page[provider,cursor]": lambda db: mcp_tools.get_open_alerts_page(
+        db, provider_id=1, limit=1, cursor=mcp_tools.get_open_alerts_page(db, limit=1).next_cursor
+    ),
+    "get_open_alert_rows[provider,severity]": lambda db: mcp_tools.get_open_alert_rows(
+        db, provider_id=1, severity="critical"
+    ),
+    "get_open_alert_rows_page[cursor]": lambda db: mcp_tools.get_open_alert_rows_page(
+        db, limit=1, cursor=mcp_tools.get_open_alert_rows_page(db, limit=1)["next_cursor"]
+    ),
+    "iter_open_alert_rows": lambda db: list(mcp_tools.iter_open_alert_rows(db)),
+    "get_open_alert_rows_page[newest,cursor]": lambda db: mcp_tools.get_open_alert_rows_page(
+        db, limit=1, sort="newest", cursor=mcp_tools.get_open_alert_rows_page(db, limit=1, sort="newest")["next_cursor"]
+    ),
+    "get_open_alert_rows_page[oldest,cursor]": lambda db: mcp_tools.get_open_alert_rows_page(
+        db, limit=1, sort="oldest", cursor=mcp_tools.get_open_alert_rows_page(db, limit=1, sort="oldest")["next_cursor"]
+    ),
+    # Ranking by relevance has to sort the matches; ordering by recency must not
+    "search_alerts[recent]": lambda db: mcp_tools.search_alerts(db, query="a", order="recent"),
+    "search_alerts[recent,provider,cursor]": lambda db: mcp_tools.search_alerts(
+        db, query="a", provider_id=1, status="open", order="recent", limit=1,
+        cursor=mcp_tools._encode_search_cursor(["recent", 3])
+    ),
+    "count_open_alerts": lambda db: mcp_tools.count_open_alerts(db),
+    "count_open_alerts[provider]": lambda db: mcp_tools.count_open_alerts(db, provider_id=1),
+    "count_open_alerts[severity]": lambda db: mcp_tools.count_open_alerts(db, severity="warning"),
+    "summarize_alerts": lambda db: mcp_tools.summarize_alerts(db),
+    "summarize_alerts[window]": lambda db: mcp_tools.summarize_alerts(db, window_days=7),
+    "alert_analytics": lambda db: mcp_tools.alert_analytics(db),
+    "alert_analytics[severity,status]": lambda db: mcp_tools.alert_analytics(db, group_by=["severity", "status"]),
+    "alert_analytics[provider_id,window]": lambda db: mcp_tools.alert_analytics(
+        db, group_by=["provider_id"], window_days=7
+    ),
+    "alert_analytics[day,provider,window]": lambda db: mcp_tools.alert_analytics(
+        db, group_by=["day"], window_days=30, provider_id=1
+    ),
+    "log_alert": lambda db: mcp_tools.log_alert(db, provider_id=1, severity="critical", window_days=30, message="new"),
+    "log_alert[coalesce]": lambda db: mcp_tools.log_alert(
+        db, provider_id=1, severity="warning", window_days=30, message="License 1 expires soon"
+    ),
+    "log_alerts_bulk": lambda db: mcp_tools.log_alerts_bulk(db, alerts=[
+        {"provider_id": i, "severity": "info", "window_days": 30, "message": f"License {i} expires soon"}
+        for i in range(1, 30)
+    ]),
+    "mark_alert_resolved": lambda db: mcp_tools.mark_alert_resolved(db, alert_id=2),
+    "mark_alerts_resolved[ids]": lambda db: mcp_tools.mark_alerts_resolved(db, alert_ids=[2, 3, 5]),
+    "mark_alerts_resolved[provider]": lambda db: mcp_tools.mark_alerts_resolved(db, provider_id=1),
+    "mark_alerts_resolved[credential]": lambda db: mcp_tools.mark_alerts_resolved(db, credential_id=5),
+    "mark_alerts_resolved[severity]": lambda db: mcp_tools.mark_alerts_resolved(db, severity="info"),
+    "mark_alerts_resolved[created_before]": lambda db: mcp_tools.mark_alerts_resolved(
+        db, created_before=datetime.utcnow()
+    ),
+}
+
+def _archive(db):
+    archive_engine = create_engine("sqlite://", poolclass=StaticPool)
+    ArchiveBase.metadata.create_all(bind=archive_engine)
+    archive_db = sessionmaker(bind=archive_engine)()
+    try:
+        retention.archive_resolved_alerts(db, archive_db, older_than_days=0)
+    finally:
+        archive_db.close()
+        archive_engine.dispose()
+
+TOOL_QUERIES["archive_resolved_alerts"] = _archive
+
+@pytest.mark.parametrize("name", sorted(TOOL_QUERIES))
+def test_tool_query_plan(captured, name):
+    db, engine, statements = captured
+    TOOL_QUERIES[name](db)
+    assert statements, f"{name} issued no statements"
+
+    for statement, parameters in statements:
+        plan = _plan(engine, statement, parameters)
+        reads = [line for line in plan if line.startswith(("SCAN", "SEARCH"))]
+        may_group = bool(reads) and all(GROUPED_READ.match(line) for line in reads)
+        bad = [
+            line for line in plan
+            if BAD_PLAN.search(line) and not (may_group and line == "USE TEMP B-TREE FOR GROUP BY")
+        ]
+        assert not bad, f"{name}: {bad}\n{statement}\nplan: {plan}"